@@ -8,9 +8,15 @@ output file.  The script respects the Creative Commons Attribution
 ShareAlike 3.0 licence of Wikipedia; see
 https://dumps.wikimedia.org/legal.html for details.
 
+With `--streaming` the dump is streamed rather than downloaded in full,
+and articles are written into fixed‑size shards (`wikipedia-00000.txt`, …)
+with a checkpoint manifest so an interrupted run resumes after the last
+completed shard (see `shard_writer.py`).
+
 Example:
 
     python crawl_wikipedia.py --out data_raw/wikipedia.txt
+    python crawl_wikipedia.py --out data_raw/wikipedia.txt --streaming
 
 """
 import argparse
@@ -19,6 +25,8 @@ import os
 import re
 from datasets import load_dataset
 
+from shard_writer import ShardWriter
+
 def extract_plain_text(page: str) -> str:
     """Remove headings and extra whitespace from a Wikipedia article."""
     # Remove markup: headers (lines starting with =), templates etc.
@@ -31,20 +39,30 @@ def main():
     parser = argparse.ArgumentParser(description="Download Somali Wikipedia dump and extract plain text.")
     parser.add_argument("--out", type=str, required=True, help="Path to write the extracted articles (one per line).")
     parser.add_argument("--skip-on-error", action="store_true", help="Skip if Wikipedia data unavailable")
+    parser.add_argument("--streaming", action="store_true", help="Stream the dump into resumable fixed-size shards.")
+    parser.add_argument("--shard_size", type=int, default=10_000, help="Articles per output shard in --streaming mode.")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
 
     os.makedirs(os.path.dirname(args.out) if os.path.dirname(args.out) else ".", exist_ok=True)
 
+    writer = None
+    if args.streaming:
+        writer = ShardWriter(args.out, shard_size=args.shard_size)
+        if writer.finished:
+            logging.info("%s already complete (%d articles)", writer.manifest_path, writer.num_docs)
+            return
+
     dataset = None
     try:
         logging.info("Loading Somali Wikipedia dataset via HuggingFace…")
         # Try different Wikipedia dataset formats
         for attempt in [
-            lambda: load_dataset("wikimedia/wikipedia", "20231101.so", split="train"),
-            lambda: load_dataset("wikipedia", "20220301.so", split="train"),
-            lambda: load_dataset("wikipedia", "20220301.so", split="train", trust_remote_code=True),
+            lambda: load_dataset("wikimedia/wikipedia", "20231101.so", split="train", streaming=args.streaming),
+            lambda: load_dataset("wikipedia", "20220301.so", split="train", streaming=args.streaming),
+            lambda: load_dataset("wikipedia", "20220301.so", split="train", streaming=args.streaming,
+                                 trust_remote_code=True),
         ]:
             try:
                 dataset = attempt()
@@ -62,6 +80,15 @@ def main():
         logging.info("Created placeholder file at %s", args.out)
         return
 
+    if writer is not None:
+        if writer.records_to_skip:
+            dataset = dataset.skip(writer.records_to_skip)
+        for article in dataset:
+            writer.write(extract_plain_text(article.get("text", "")))
+        writer.close()
+        logging.info("Wrote %d Somali Wikipedia articles to shards of %s", writer.num_docs, args.out)
+        return
+
     count = 0
     with open(args.out, "w", encoding="utf-8") as f_out:
         for article in dataset:
@@ -7,9 +7,16 @@ information (released under CC0 1.0)【263184386926965†L96-L100】.  This scri
 downloads the Somali portion and writes one document per line to an
 output file.
 
+With `--streaming` the dataset is streamed instead of being materialised in
+the HuggingFace cache first, and documents are written into fixed‑size
+shards (`oscar-00000.txt`, …) with a checkpoint manifest (see
+`shard_writer.py`).  Re‑running the same command after a failure skips the
+completed shards.
+
 Example:
 
     python fetch_oscar.py --out data_raw/oscar.txt
+    python fetch_oscar.py --out data_raw/oscar.txt --streaming --shard_size 100000
 
 """
 import argparse
@@ -17,28 +24,50 @@ import logging
 import os
 from datasets import load_dataset
 
+from shard_writer import ShardWriter
+
+def clean_document(item) -> str:
+    # Replace newlines in the document to keep one document per line
+    return item.get("text", "").replace("\n", " ").strip()
+
+def fetch_streaming(dataset_name: str, subset_name: str, out_path: str, shard_size: int) -> int:
+    writer = ShardWriter(out_path, shard_size=shard_size)
+    if writer.finished:
+        logging.info("%s already complete (%d documents)", writer.manifest_path, writer.num_docs)
+        return writer.num_docs
+    dataset = load_dataset(dataset_name, subset_name, split="train", streaming=True)
+    if writer.records_to_skip:
+        dataset = dataset.skip(writer.records_to_skip)
+    for item in dataset:
+        writer.write(clean_document(item))
+    writer.close()
+    return writer.num_docs
+
 def main():
     parser = argparse.ArgumentParser(description="Download the Somali OSCAR or CC100 corpus from HuggingFace.")
     parser.add_argument("--out", type=str, required=True, help="Output text file (one document per line).")
     parser.add_argument("--dataset", type=str, default="oscar", choices=["oscar", "cc100"], help="Dataset to download: oscar or cc100")
+    parser.add_argument("--streaming", action="store_true", help="Stream the dataset into resumable fixed-size shards.")
+    parser.add_argument("--shard_size", type=int, default=100_000, help="Documents per output shard in --streaming mode.")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
     subset_name = "unshuffled_deduplicated_so" if args.dataset == "oscar" else "so"  # cc100 uses 'so'
     dataset_name = "oscar" if args.dataset == "oscar" else "cc100"
     logging.info("Loading %s subset %s…", dataset_name, subset_name)
+    if args.streaming:
+        count = fetch_streaming(dataset_name, subset_name, args.out, args.shard_size)
+        logging.info("Wrote %d documents from %s to shards of %s", count, dataset_name, args.out)
+        return
     dataset = load_dataset(dataset_name, subset_name, split="train")
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
     count = 0
     with open(args.out, "w", encoding="utf-8") as f_out:
         for item in dataset:
-            text = item.get("text", "")
+            text = clean_document(item)
             if text:
-                # Replace newlines in the document to keep one document per line
-                text = text.replace("\n", " ").strip()
-                if text:
-                    f_out.write(text + "\n")
-                    count += 1
+                f_out.write(text + "\n")
+                count += 1
     logging.info("Wrote %d documents from %s to %s", count, dataset_name, args.out)
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Resumable sharded text writer shared by the crawl scripts.  Documents are
+written one per line into fixed‑size shards named after the output file,
+e.g. `data_raw/oscar.txt` becomes `data_raw/oscar-00000.txt`,
+`data_raw/oscar-00001.txt`, ….  A shard is written as `<name>.partial` and
+only renamed to `.txt` once it is complete, so downstream `data_prep`
+stages (which only pick up `*.txt`) can start on finished shards while the
+download is still running.
+
+Progress is recorded in `<name>.manifest.json` next to the shards: the list
+of completed shards and the number of source records consumed so far.  On
+restart the writer reports how many records to skip and continues with the
+next shard number.
+"""
+import json
+import logging
+import os
+from typing import Dict, List
+
+
+class ShardWriter:
+    def __init__(self, out_path: str, shard_size: int = 100_000):
+        self.out_dir = os.path.dirname(out_path) or "."
+        self.prefix = os.path.splitext(os.path.basename(out_path))[0]
+        self.shard_size = shard_size
+        self.manifest_path = os.path.join(self.out_dir, f"{self.prefix}.manifest.json")
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self._f_out = None
+        self._docs_in_shard = 0
+        self._records_consumed = self.manifest["records_consumed"]
+
+    def _load_manifest(self) -> Dict:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("shard_size") != self.shard_size:
+                raise ValueError(f"{self.manifest_path} was written with shard_size={manifest.get('shard_size')}, "
+                                 f"got {self.shard_size}")
+            logging.info("Resuming from %s: %d shards complete, skipping %d records",
+                         self.manifest_path, len(manifest["shards"]), manifest["records_consumed"])
+            return manifest
+        return {"shard_size": self.shard_size, "records_consumed": 0, "shards": [], "finished": False}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def records_to_skip(self) -> int:
+        """Number of source records already covered by completed shards."""
+        return self.manifest["records_consumed"]
+
+    @property
+    def finished(self) -> bool:
+        return self.manifest["finished"]
+
+    @property
+    def shard_paths(self) -> List[str]:
+        return [os.path.join(self.out_dir, s["name"]) for s in self.manifest["shards"]]
+
+    def _shard_name(self) -> str:
+        return f"{self.prefix}-{len(self.manifest['shards']):05d}.txt"
+
+    def _partial_path(self) -> str:
+        return os.path.join(self.out_dir, self._shard_name() + ".partial")
+
+    def _close_shard(self):
+        self._f_out.close()
+        self._f_out = None
+        name = self._shard_name()
+        os.replace(self._partial_path(), os.path.join(self.out_dir, name))
+        self.manifest["shards"].append({"name": name, "docs": self._docs_in_shard})
+        self.manifest["records_consumed"] = self._records_consumed
+        self._docs_in_shard = 0
+        self._save_manifest()
+        logging.info("Completed shard %s (%d records consumed)", name, self._records_consumed)
+
+    def write(self, text: str):
+        """Record one consumed source record, writing `text` if it is non‑empty."""
+        self._records_consumed += 1
+        if not text:
+            return
+        if self._f_out is None:
+            self._f_out = open(self._partial_path(), "w", encoding="utf-8")
+        self._f_out.write(text + "\n")
+        self._docs_in_shard += 1
+        if self._docs_in_shard >= self.shard_size:
+            self._close_shard()
+
+    def close(self):
+        """Flush the final (possibly short) shard and mark the download finished."""
+        if self._f_out is not None:
+            self._close_shard()
+        self.manifest["records_consumed"] = self._records_consumed
+        self.manifest["finished"] = True
+        self._save_manifest()
+
+    @property
+    def num_docs(self) -> int:
+        return sum(s["docs"] for s in self.manifest["shards"])
@@ -4,16 +4,20 @@ Create a complete PL-BERT model with all required layers for StyleTTS2.
 """
 import torch
 import os
+from safetensors import safe_open
+from safetensors.torch import save_file
 from transformers import AlbertModel, AlbertConfig
 
 print("Creating complete PL-BERT model for StyleTTS2...")
 print("=" * 70)
 
-# Load current incomplete model
-current_model_path = 'runs/plbert_so/packaged/step_000001.pt'
+# Read the header of the current incomplete model (memory-mapped; tensors are read on demand)
+current_model_path = 'runs/plbert_so/packaged/step_000001.safetensors'
 if os.path.exists(current_model_path):
-    current_state = torch.load(current_model_path, map_location='cpu', weights_only=False)
-    print(f"Loaded current model with {len(current_state)} parameters")
+    with safe_open(current_model_path, framework="pt") as current_file:
+        current_shapes = {k: tuple(current_file.get_slice(k).get_shape()) for k in current_file.keys()}
+    current_keys = set(current_shapes)
+    print(f"Opened current model with {len(current_keys)} parameters")
 else:
     print("Current model not found!")
     exit(1)
@@ -67,8 +71,8 @@ reference_state = reference_model.state_dict()
 print(f"\nReference model has {len(reference_state)} parameters")
 
 # Compare what's missing
-missing_keys = set(reference_state.keys()) - set(current_state.keys())
-extra_keys = set(current_state.keys()) - set(reference_state.keys())
+missing_keys = set(reference_state.keys()) - current_keys
+extra_keys = current_keys - set(reference_state.keys())
 
 if missing_keys:
     print(f"\nMissing {len(missing_keys)} keys:")
@@ -90,20 +94,22 @@ complete_state = {}
 matched = 0
 initialized = 0
 
-for key in reference_state.keys():
-    if key in current_state:
-        # Check if shapes match
-        if current_state[key].shape == reference_state[key].shape:
-            complete_state[key] = current_state[key]
-            matched += 1
+with safe_open(current_model_path, framework="pt") as current_file:
+    for key in reference_state.keys():
+        if key in current_keys:
+            # Check if shapes match (from the header, before reading the tensor)
+            shape = current_shapes[key]
+            if shape == tuple(reference_state[key].shape):
+                complete_state[key] = current_file.get_tensor(key)
+                matched += 1
+            else:
+                print(f"Shape mismatch for {key}: got {shape}, expected {tuple(reference_state[key].shape)}")
+                complete_state[key] = reference_state[key]  # Use random initialization
+                initialized += 1
         else:
-            print(f"Shape mismatch for {key}: got {current_state[key].shape}, expected {reference_state[key].shape}")
-            complete_state[key] = reference_state[key]  # Use random initialization
+            # Use randomly initialized weights from reference model
+            complete_state[key] = reference_state[key]
             initialized += 1
-    else:
-        # Use randomly initialized weights from reference model
-        complete_state[key] = reference_state[key]
-        initialized += 1
 
 print(f"\nParameter summary:")
 print(f"  Matched from trained model: {matched}")
@@ -111,7 +117,7 @@ print(f"  Randomly initialized: {initialized}")
 print(f"  Total parameters: {len(complete_state)}")
 
 # Save the complete model
-output_path = 'runs/plbert_so/packaged/step_000001.pt'
+output_path = 'runs/plbert_so/packaged/step_000001.safetensors'
 
 # Backup current file
 backup_path = output_path + '.incomplete'
@@ -120,7 +126,7 @@ if os.path.exists(output_path):
     print(f"\nBacked up incomplete model to: {backup_path}")
 
 # Save complete model
-torch.save(complete_state, output_path)
+save_file({k: v.contiguous() for k, v in complete_state.items()}, output_path, metadata={'format': 'pt'})
 print(f"Saved complete model to: {output_path}")
 
 # Verify the model loads correctly
@@ -129,7 +135,8 @@ print("Verifying model...")
 
 try:
     test_model = AlbertModel(albert_config)
-    test_model.load_state_dict(torch.load(output_path, map_location='cpu', weights_only=False))
+    with safe_open(output_path, framework="pt") as f:
+        test_model.load_state_dict({k: f.get_tensor(k) for k in f.keys()})
     print("✓ Model loads successfully with AlbertModel!")
 
     # Test a forward pass
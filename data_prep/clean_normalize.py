@@ -10,28 +10,44 @@ collapses multiple whitespace characters into a single space.
 Note: Somali uses the Latin alphabet with a few digraphs (dh, kh, sh).  We
 retain case information and diacritics if present.
 
+With `--workers N` each input file is split into byte ranges aligned to line
+boundaries and the ranges are normalised in a process pool.  Every range is
+written to its own shard (`<name>-00000.txt`, `<name>-00001.txt`, …) so the
+output is deterministic and, read in shard order, identical to the serial
+output.  Both paths end lines at `\n` only; a lone carriage return inside a
+line becomes a space.
+
 Example:
 
     python clean_normalize.py --input data_raw --output data_clean
+    python clean_normalize.py --input data_raw --output data_clean --workers 16
 
 """
 import argparse
 import logging
 import os
 import re
+from multiprocessing import Pool
+from typing import List, Tuple
+
 from unidecode import unidecode
 
+WHITESPACE_RE = re.compile(r"\s+")
+CONTROL_RE = re.compile(r"[\x00-\x1F\x7F]")
+
+
 def normalise_text(text: str) -> str:
     # Convert to Unicode NFKC and ASCII fallback
     text = unidecode(text)
     # Replace non‑breaking spaces and other whitespace with normal space
-    text = re.sub(r"\s+", " ", text)
+    text = WHITESPACE_RE.sub(" ", text)
     # Remove control characters
-    text = re.sub(r"[\x00-\x1F\x7F]", "", text)
+    text = CONTROL_RE.sub("", text)
     return text.strip()
 
 def process_file(in_path: str, out_path: str):
-    with open(in_path, encoding="utf-8") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
+    # Lines end at "\n" only, as in the byte-range reader `process_chunk`.
+    with open(in_path, encoding="utf-8", newline="\n") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
         for line in f_in:
             line = line.strip()
             if not line:
@@ -40,17 +56,79 @@ def process_file(in_path: str, out_path: str):
             if cleaned:
                 f_out.write(cleaned + "\n")
 
+def find_chunk_boundaries(path: str, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Split `path` into (start, end) byte ranges of roughly `chunk_bytes`.
+
+    Every boundary is moved forward to the start of the next line so that no
+    line is split across two ranges.
+    """
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, "rb") as f:
+        pos = chunk_bytes
+        while pos < size:
+            f.seek(pos)
+            f.readline()
+            boundary = f.tell()
+            if boundary >= size:
+                break
+            offsets.append(boundary)
+            pos = boundary + chunk_bytes
+    offsets.append(size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+def process_chunk(task: Tuple[str, int, int, str]) -> int:
+    """Normalise the lines in one byte range and write them to a shard."""
+    in_path, start, end, out_path = task
+    written = 0
+    with open(in_path, "rb") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
+        f_in.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            raw = f_in.readline()
+            if not raw:
+                break
+            remaining -= len(raw)
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            cleaned = normalise_text(line)
+            if cleaned:
+                f_out.write(cleaned + "\n")
+                written += 1
+    return written
+
+def process_file_parallel(in_path: str, out_dir: str, pool: Pool, chunk_bytes: int) -> List[str]:
+    """Normalise `in_path` in parallel, one output shard per byte range."""
+    stem = os.path.splitext(os.path.basename(in_path))[0]
+    tasks = []
+    for idx, (start, end) in enumerate(find_chunk_boundaries(in_path, chunk_bytes)):
+        out_path = os.path.join(out_dir, f"{stem}-{idx:05d}.txt")
+        tasks.append((in_path, start, end, out_path))
+    written = sum(pool.imap(process_chunk, tasks))
+    logging.info("Normalised %s into %d shards (%d lines)", in_path, len(tasks), written)
+    return [task[3] for task in tasks]
+
 def main():
     parser = argparse.ArgumentParser(description="Clean and normalise Somali text files.")
     parser.add_argument("--input", type=str, required=True, help="Input directory containing raw text files.")
     parser.add_argument("--output", type=str, required=True, help="Output directory for cleaned text files.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (1 = serial, one output file per input).")
+    parser.add_argument("--chunk_mb", type=int, default=64, help="Approximate size of each parallel chunk/shard in MiB.")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
     os.makedirs(args.output, exist_ok=True)
-    for filename in os.listdir(args.input):
-        if not filename.endswith(".txt"):
-            continue
+    filenames = sorted(f for f in os.listdir(args.input) if f.endswith(".txt"))
+    if args.workers > 1:
+        chunk_bytes = max(1, args.chunk_mb) * 1024 * 1024
+        with Pool(processes=args.workers) as pool:
+            for filename in filenames:
+                in_path = os.path.join(args.input, filename)
+                logging.info("Normalising %s → %s (%d workers)", in_path, args.output, args.workers)
+                process_file_parallel(in_path, args.output, pool, chunk_bytes)
+        return
+    for filename in filenames:
         in_path = os.path.join(args.input, filename)
         out_path = os.path.join(args.output, filename)
         logging.info("Normalising %s → %s", in_path, out_path)
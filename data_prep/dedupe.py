@@ -1,26 +1,43 @@
 #!/usr/bin/env python
 """
 Deduplicate sentences using a simple hash set.  Optionally uses MinHash
-similarity from the `datasketch` library to filter near duplicates.  This
-module reads text files from the input directory and writes unique lines to
-the output directory.  A summary report of the number of total vs unique
+similarity to filter near duplicates.  This module reads text files from
+the input directory and writes unique lines to the output directory.  A summary report of the number of total vs unique
 sentences is printed.
 
+With `--index PATH` exact deduplication uses a persistent, global index of
+stable 64‑bit content hashes (see `dedup_index.py`), so duplicates across
+files and across runs are removed and new crawl batches can be
+deduplicated incrementally.
+
+`--use_minhash` runs the vectorised, multi‑process MinHash LSH engine in
+`minhash_dedup.py` over all input files together and can write a report of
+the duplicate clusters it found (`--report`).
+
+`--bloom` runs exact deduplication in fixed memory: a Bloom filter sized by
+`--bloom_capacity` (default: the number of input lines) and `--bloom_fpr`
+screens every line and only possible repeats are checked against an
+on‑disk hash spill (see `bloom_dedup.py`).
+
+`--index`, `--use_minhash` and `--bloom` are alternative engines and cannot
+be combined.
+
 Example:
 
     python dedupe.py --input data_clean_filtered --output data_unique
+    python dedupe.py --input data_clean_filtered --output data_unique --index data_index/dedup_index.npy
 
 """
 import argparse
 import logging
 import os
-from datasketch import MinHash, MinHashLSH
 
-def deduplicate_file(in_path: str, out_path: str, threshold: float = 0.8, use_minhash: bool = False):
+from bloom_dedup import BloomDeduplicator, count_lines, deduplicate_file_bloom
+from dedup_index import DedupIndex, stable_hash
+from minhash_dedup import deduplicate_minhash
+
+def deduplicate_file(in_path: str, out_path: str):
     seen_hashes = set()
-    if use_minhash:
-        lsh = MinHashLSH(threshold=threshold, num_perm=128)
-        minhashes = {}
     total = 0
     unique = 0
     with open(in_path, encoding="utf-8") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
@@ -29,28 +46,38 @@ def deduplicate_file(in_path: str, out_path: str, threshold: float = 0.8, use_mi
             text = line.strip()
             if not text:
                 continue
-            if use_minhash:
-                mh = MinHash(num_perm=128)
-                for token in text.split():
-                    mh.update(token.encode("utf-8"))
-                # Check for near duplicate
-                dup = False
-                for h in lsh.query(mh):
-                    dup = True
-                    break
-                if dup:
-                    continue
-                # Add new signature
-                lsh.insert(len(minhashes), mh)
-                minhashes[len(minhashes)] = text
+            h = hash(text)
+            if h not in seen_hashes:
+                seen_hashes.add(h)
                 f_out.write(text + "\n")
                 unique += 1
-            else:
-                h = hash(text)
-                if h not in seen_hashes:
-                    seen_hashes.add(h)
-                    f_out.write(text + "\n")
-                    unique += 1
+    logging.info("Deduplication %s: total %d → unique %d", in_path, total, unique)
+
+def deduplicate_file_indexed(in_path: str, out_path: str, index: DedupIndex, batch_size: int = 8192):
+    """Exact deduplication of `in_path` against a persistent `DedupIndex`."""
+    total = 0
+    unique = 0
+
+    def write_batch(batch):
+        nonlocal unique
+        for text, is_new in zip(batch, index.add_many(stable_hash(t) for t in batch)):
+            if is_new:
+                f_out.write(text + "\n")
+                unique += 1
+
+    with open(in_path, encoding="utf-8") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
+        batch = []
+        for line in f_in:
+            total += 1
+            text = line.strip()
+            if not text:
+                continue
+            batch.append(text)
+            if len(batch) >= batch_size:
+                write_batch(batch)
+                batch = []
+        if batch:
+            write_batch(batch)
     logging.info("Deduplication %s: total %d → unique %d", in_path, total, unique)
 
 def main():
@@ -58,15 +85,54 @@ def main():
     parser.add_argument("--input", type=str, required=True, help="Directory containing language‑filtered text files.")
     parser.add_argument("--output", type=str, required=True, help="Directory to write deduplicated files.")
     parser.add_argument("--use_minhash", action="store_true", help="Use MinHash LSH for near‑duplicate removal.")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Jaccard similarity threshold for MinHash near duplicates.")
+    parser.add_argument("--num_perm", type=int, default=128, help="Number of MinHash permutations.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for MinHash signatures and LSH bands.")
+    parser.add_argument("--report", type=str, default=None, help="Write MinHash duplicate clusters to this JSONL file.")
+    parser.add_argument("--index", type=str, default=None, help="Persistent dedup index (.npy) shared across files and runs.")
+    parser.add_argument("--max_pending", type=int, default=10_000_000, help="New hashes kept in RAM before merging into the index.")
+    parser.add_argument("--bloom", action="store_true", help="Fixed-memory exact dedup with a Bloom-filter prefilter.")
+    parser.add_argument("--bloom_capacity", type=int, default=None, help="Expected number of lines for sizing the Bloom filter (default: count the input lines).")
+    parser.add_argument("--bloom_fpr", type=float, default=0.01, help="Target Bloom filter false-positive rate.")
+    parser.add_argument("--spill", type=str, default=None, help="On-disk hash spill for --bloom, overwritten on each run (temporary file if unset).")
     args = parser.parse_args()
+    if sum(map(bool, (args.index, args.use_minhash, args.bloom))) > 1:
+        parser.error("--index, --use_minhash and --bloom cannot be combined")
     logging.basicConfig(level=logging.INFO)
     os.makedirs(args.output, exist_ok=True)
-    for filename in os.listdir(args.input):
-        if not filename.endswith(".txt"):
-            continue
+    index = None
+    if args.index:
+        index = DedupIndex(args.index, max_pending=args.max_pending)
+        logging.info("Loaded dedup index %s with %d hashes", args.index, len(index))
+    filenames = sorted(f for f in os.listdir(args.input) if f.endswith(".txt"))
+    if args.use_minhash:
+        deduplicate_minhash([os.path.join(args.input, f) for f in filenames],
+                            [os.path.join(args.output, f) for f in filenames],
+                            threshold=args.threshold, num_perm=args.num_perm,
+                            workers=args.workers, report_path=args.report)
+        return
+    if args.bloom:
+        capacity = args.bloom_capacity
+        if capacity is None:
+            capacity = count_lines(os.path.join(args.input, f) for f in filenames)
+            logging.info("Sizing the Bloom filter for %d input lines", capacity)
+        dedup = BloomDeduplicator(capacity, args.bloom_fpr, spill_path=args.spill)
+        try:
+            for filename in filenames:
+                deduplicate_file_bloom(os.path.join(args.input, filename),
+                                       os.path.join(args.output, filename), dedup)
+        finally:
+            dedup.close()
+        return
+    for filename in filenames:
         in_path = os.path.join(args.input, filename)
         out_path = os.path.join(args.output, filename)
-        deduplicate_file(in_path, out_path, use_minhash=args.use_minhash)
+        if index is not None:
+            deduplicate_file_indexed(in_path, out_path, index)
+        else:
+            deduplicate_file(in_path, out_path)
+    if index is not None:
+        index.flush()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,16 +7,31 @@ https://fasttext.cc/docs/en/language-identification.html.  Download it
 before running this script if not already present.  If the model is
 missing, the script will skip filtering.
 
+Lines are classified in batches (`--batch_size`, default 4096) with a single
+`model.predict(list)` call per batch.  With `--workers N` the batches are
+distributed over a process pool; the model is loaded once in the parent and
+inherited by the forked workers copy‑on‑write, so it is not duplicated in
+memory.  Filtering decisions are identical to the per‑line path.
+
 Example:
 
     python langid_filter.py --input data_clean --output data_clean_filtered
+    python langid_filter.py --input data_clean --output data_clean_filtered --workers 16
 
 """
 import argparse
 import logging
+import multiprocessing
 import os
+from collections import deque
+from typing import Iterator, List
+
 import fasttext
 
+# Model used by pool workers; set in the parent before forking or loaded by
+# `_init_worker` when the platform cannot fork.
+_WORKER_MODEL = None
+
 def load_model(model_path: str):
     try:
         return fasttext.load_model(model_path)
@@ -24,19 +39,92 @@ def load_model(model_path: str):
         logging.warning("Failed to load fastText model (%s). Language filtering disabled.", e)
         return None
 
+def is_somali(model, text: str, threshold: float = 0.8) -> bool:
+    """Return True if `model` predicts Somali for `text` with at least `threshold`."""
+    if model is None:
+        return True
+    label, prob = model.predict(text.replace("\n", " "))
+    lang = label[0].replace("__label__", "")
+    return lang == "so" and prob[0] >= threshold
+
 def filter_file(model, in_path: str, out_path: str, threshold: float = 0.8):
     with open(in_path, encoding="utf-8") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
         for line in f_in:
             text = line.strip()
             if not text:
                 continue
-            if model is None:
+            if is_somali(model, text, threshold):
                 f_out.write(text + "\n")
+
+def somali_mask(model, texts: List[str], threshold: float = 0.8) -> List[bool]:
+    """Batched `is_somali`: classify all `texts` with one `predict` call."""
+    if model is None:
+        return [True] * len(texts)
+    labels, probs = model.predict([text.replace("\n", " ") for text in texts])
+    return [label[0].replace("__label__", "") == "so" and prob[0] >= threshold
+            for label, prob in zip(labels, probs)]
+
+def _init_worker(model_path: str):
+    global _WORKER_MODEL
+    if _WORKER_MODEL is None:
+        _WORKER_MODEL = load_model(model_path)
+
+def _predict_batch(texts: List[str], threshold: float) -> List[bool]:
+    return somali_mask(_WORKER_MODEL, texts, threshold)
+
+def make_pool(model, model_path: str, workers: int):
+    """Create a pool whose workers share `model` through fork where possible."""
+    global _WORKER_MODEL
+    _WORKER_MODEL = model
+    if "fork" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("fork")
+    else:
+        ctx = multiprocessing.get_context()
+    return ctx.Pool(processes=workers, initializer=_init_worker, initargs=(model_path,))
+
+def iter_batches(in_path: str, batch_size: int) -> Iterator[List[str]]:
+    batch = []
+    with open(in_path, encoding="utf-8") as f_in:
+        for line in f_in:
+            text = line.strip()
+            if not text:
                 continue
-            label, prob = model.predict(text.replace("\n", " "))
-            lang = label[0].replace("__label__", "")
-            if lang == "so" and prob[0] >= threshold:
-                f_out.write(text + "\n")
+            batch.append(text)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def filter_file_batched(model, in_path: str, out_path: str, threshold: float = 0.8,
+                        batch_size: int = 4096, pool=None, max_inflight: int = 8):
+    """Same output as `filter_file`, classifying lines in batches.
+
+    If `pool` is given, batches are predicted by its workers with at most
+    `max_inflight` batches outstanding so memory stays bounded; results are
+    written in input order.
+    """
+    with open(out_path, "w", encoding="utf-8") as f_out:
+        if pool is None:
+            for batch in iter_batches(in_path, batch_size):
+                for text, keep in zip(batch, somali_mask(model, batch, threshold)):
+                    if keep:
+                        f_out.write(text + "\n")
+            return
+        pending = deque()
+
+        def write_oldest():
+            batch, result = pending.popleft()
+            for text, keep in zip(batch, result.get()):
+                if keep:
+                    f_out.write(text + "\n")
+
+        for batch in iter_batches(in_path, batch_size):
+            pending.append((batch, pool.apply_async(_predict_batch, (batch, threshold))))
+            if len(pending) >= max_inflight:
+                write_oldest()
+        while pending:
+            write_oldest()
 
 def main():
     parser = argparse.ArgumentParser(description="Filter Somali sentences using fastText language identification.")
@@ -44,17 +132,32 @@ def main():
     parser.add_argument("--output", type=str, required=True, help="Directory to write filtered text files.")
     parser.add_argument("--model", type=str, default="lid.176.bin", help="Path to fastText language id model.")
     parser.add_argument("--threshold", type=float, default=0.8, help="Probability threshold for Somali detection.")
+    parser.add_argument("--batch_size", type=int, default=4096, help="Lines per fastText predict call (1 = per-line).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes for batched prediction.")
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
     model = load_model(args.model)
     os.makedirs(args.output, exist_ok=True)
-    for filename in os.listdir(args.input):
-        if not filename.endswith(".txt"):
-            continue
-        in_path = os.path.join(args.input, filename)
-        out_path = os.path.join(args.output, filename)
-        logging.info("Language filtering %s → %s", in_path, out_path)
-        filter_file(model, in_path, out_path, threshold=args.threshold)
+    pool = None
+    if model is not None and args.workers > 1:
+        pool = make_pool(model, args.model, args.workers)
+    try:
+        for filename in os.listdir(args.input):
+            if not filename.endswith(".txt"):
+                continue
+            in_path = os.path.join(args.input, filename)
+            out_path = os.path.join(args.output, filename)
+            logging.info("Language filtering %s → %s", in_path, out_path)
+            if args.batch_size <= 1 and pool is None:
+                filter_file(model, in_path, out_path, threshold=args.threshold)
+            else:
+                filter_file_batched(model, in_path, out_path, threshold=args.threshold,
+                                    batch_size=max(1, args.batch_size), pool=pool,
+                                    max_inflight=2 * args.workers)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
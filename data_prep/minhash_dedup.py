@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+Vectorised, parallel MinHash LSH near‑duplicate detection.  This is the
+engine behind `dedupe.py --use_minhash`.  Instead of building one
+`datasketch.MinHash` per line and updating it token by token, signatures are
+computed with numpy for many lines at once and the work is spread over a
+process pool in three phases:
+
+1. **Signatures.**  Each input file is split into line‑aligned byte ranges
+   (as in `clean_normalize.py --workers`).  A worker hashes the whitespace
+   tokens of every line in its range (CRC32), applies all `num_perm`
+   universal hash permutations as one broadcast numpy operation and reduces
+   them to per‑line minima.  Signatures are saved as `uint32` `.npy` shards
+   in a work directory.
+2. **Banded LSH.**  Signatures are split into `bands` bands of `rows` rows,
+   and each band is processed by a separate worker: lines whose band slices
+   hash to the same bucket become candidate pairs, which are verified by
+   their estimated Jaccard similarity against `threshold`.
+3. **Clustering.**  Verified pairs are merged with union‑find into duplicate
+   clusters.  The first occurrence of each cluster is kept, the rest are
+   dropped, and a JSONL report lists every cluster with its representative
+   text and the `file:line` locations of its duplicates.
+
+Duplicates are detected across all input files.  The signature work
+directory needs `4 * num_perm` bytes per line (512 bytes with the default
+128 permutations).  Each band worker holds its band widened to uint64 for
+hashing, `8 * rows` bytes per line, plus a few 8‑byte arrays per line (band
+keys, sort order) while grouping buckets.
+
+Example:
+
+    python dedupe.py --input data_clean_filtered --output data_unique \
+      --use_minhash --workers 16 --report data_unique/minhash_clusters.jsonl
+
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import zlib
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from clean_normalize import find_chunk_boundaries
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# Number of (token, permutation) products computed per numpy block.
+BLOCK_ELEMENTS = 4_000_000
+
+
+def make_permutations(num_perm: int, seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the (a, b) coefficients of `num_perm` universal hash functions."""
+    gen = np.random.RandomState(seed)
+    a = gen.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = gen.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH S‑curve midpoint (1/b)^(1/r) is closest to `threshold`."""
+    best = (1, num_perm)
+    best_err = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        err = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+def compute_signatures(lines: List[str], perms: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """MinHash signatures of whitespace‑token sets, shape (len(lines), num_perm)."""
+    a, b = perms
+    num_perm = len(a)
+    sig = np.full((len(lines), num_perm), MAX_HASH, dtype=np.uint64)
+    token_hashes: List[int] = []
+    owners: List[int] = []
+    for i, text in enumerate(lines):
+        tokens = set(text.split())
+        token_hashes.extend(zlib.crc32(tok.encode("utf-8")) for tok in tokens)
+        owners.extend([i] * len(tokens))
+    if not token_hashes:
+        return sig.astype(np.uint32)
+    hv = np.array(token_hashes, dtype=np.uint64)
+    own = np.array(owners, dtype=np.int64)
+    step = max(1, BLOCK_ELEMENTS // num_perm)
+    with np.errstate(over="ignore"):
+        for lo in range(0, len(hv), step):
+            block_hv = hv[lo:lo + step]
+            block_own = own[lo:lo + step]
+            phv = ((block_hv[:, None] * a[None, :] + b[None, :]) % MERSENNE_PRIME) & MAX_HASH
+            starts = np.flatnonzero(np.r_[True, block_own[1:] != block_own[:-1]])
+            rows = block_own[starts]
+            sig[rows] = np.minimum(sig[rows], np.minimum.reduceat(phv, starts, axis=0))
+    return sig.astype(np.uint32)
+
+
+def _read_lines(in_path: str, start: int, end: int) -> Iterator[str]:
+    """Stripped text of every line in the byte range; lines end at a newline only.
+
+    Both the signature pass and the final pass read lines this way, so line
+    ids agree even if the text contains a lone carriage return.
+    """
+    with open(in_path, "rb") as f_in:
+        f_in.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            raw = f_in.readline()
+            if not raw:
+                break
+            remaining -= len(raw)
+            yield raw.decode("utf-8").strip()
+
+
+def _signature_chunk(task) -> int:
+    in_path, start, end, sig_path, num_perm, seed, batch_size = task
+    perms = make_permutations(num_perm, seed)
+    parts = []
+    batch: List[str] = []
+    for text in _read_lines(in_path, start, end):
+        if not text:
+            continue
+        batch.append(text)
+        if len(batch) >= batch_size:
+            parts.append(compute_signatures(batch, perms))
+            batch = []
+    if batch:
+        parts.append(compute_signatures(batch, perms))
+    sig = np.concatenate(parts) if parts else np.empty((0, num_perm), dtype=np.uint32)
+    np.save(sig_path, sig)
+    return len(sig)
+
+
+def _gather_rows(sigs: List[np.ndarray], offsets: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Fetch full signatures for global line `ids` from the per‑chunk shards."""
+    out = np.empty((len(ids), sigs[0].shape[1] if sigs else 0), dtype=np.uint32)
+    chunk = np.searchsorted(offsets, ids, side="right") - 1
+    for c in np.unique(chunk):
+        sel = chunk == c
+        out[sel] = sigs[c][ids[sel] - offsets[c]]
+    return out
+
+
+def _band_candidates(task) -> Tuple[np.ndarray, np.ndarray]:
+    sig_paths, offsets, band_start, band_end, threshold = task
+    sigs = [np.load(p, mmap_mode="r") for p in sig_paths]
+    band = np.concatenate([s[:, band_start:band_end] for s in sigs]).astype(np.uint64)
+    key = np.zeros(len(band), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(band.shape[1]):
+            key = (key * np.uint64(0x100000001B3)) ^ band[:, j]
+    del band
+    if len(key) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    ids = np.arange(len(key), dtype=np.int64)
+    order = np.lexsort((ids, key))
+    sorted_key = key[order]
+    starts = np.r_[True, sorted_key[1:] != sorted_key[:-1]]
+    roots = order[np.flatnonzero(starts)][np.cumsum(starts) - 1]
+    members = order[~starts]
+    roots = roots[~starts]
+    if len(members) == 0:
+        return members, roots
+    # Verify candidates by estimated Jaccard similarity on the full signature.
+    similarity = (_gather_rows(sigs, offsets, members) == _gather_rows(sigs, offsets, roots)).mean(axis=1)
+    keep = similarity >= threshold
+    return members[keep], roots[keep]
+
+
+def _cluster_roots(n: int, members: np.ndarray, roots: np.ndarray) -> np.ndarray:
+    """Connected components of the candidate pairs; each line maps to the smallest id in its cluster.
+
+    Vectorised union‑find: every pair pulls both of its ends' parents down
+    to the smaller one, then parents are shortcut by pointer jumping, until
+    nothing changes.  Needs 8 bytes per line.
+    """
+    parent = np.arange(n, dtype=np.int64)
+    while True:
+        low = np.minimum(parent[members], parent[roots])
+        np.minimum.at(parent, parent[members], low)
+        np.minimum.at(parent, parent[roots], low)
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        if np.array_equal(parent[members], parent[roots]):
+            return parent
+
+
+def deduplicate_minhash(in_paths: List[str], out_paths: List[str], threshold: float = 0.8,
+                        num_perm: int = 128, workers: int = 1, chunk_mb: int = 64,
+                        report_path: Optional[str] = None, work_dir: Optional[str] = None,
+                        seed: int = 1, batch_size: int = 2048) -> Dict[str, int]:
+    """Remove near duplicates across all `in_paths`, writing survivors to `out_paths`."""
+    bands, rows = optimal_bands(threshold, num_perm)
+    logging.info("MinHash LSH: %d permutations, %d bands x %d rows, threshold %.2f", num_perm, bands, rows, threshold)
+    own_work_dir = work_dir is None
+    work_dir = tempfile.mkdtemp(prefix="minhash_") if own_work_dir else work_dir
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        tasks = []
+        chunk_bytes = max(1, chunk_mb) * 1024 * 1024
+        for file_idx, in_path in enumerate(in_paths):
+            for chunk_idx, (start, end) in enumerate(find_chunk_boundaries(in_path, chunk_bytes)):
+                sig_path = os.path.join(work_dir, f"sig-{file_idx:05d}-{chunk_idx:05d}.npy")
+                tasks.append((in_path, start, end, sig_path, num_perm, seed, batch_size))
+        with Pool(processes=workers) as pool:
+            counts = list(pool.imap(_signature_chunk, tasks))
+            sig_paths = [task[3] for task in tasks]
+            offsets = np.r_[0, np.cumsum(counts)].astype(np.int64)
+            total = int(offsets[-1])
+            logging.info("MinHash LSH: computed signatures for %d lines in %d chunks", total, len(tasks))
+            band_tasks = [(sig_paths, offsets[:-1], b * rows, (b + 1) * rows, threshold) for b in range(bands)]
+            pairs = list(pool.imap_unordered(_band_candidates, band_tasks))
+        members = np.concatenate([p[0] for p in pairs]) if pairs else np.empty(0, dtype=np.int64)
+        roots = np.concatenate([p[1] for p in pairs]) if pairs else np.empty(0, dtype=np.int64)
+        cluster = _cluster_roots(total, members, roots)
+    finally:
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    clustered = np.flatnonzero(np.bincount(cluster, minlength=total) > 1) if total else np.empty(0, dtype=np.int64)
+    cluster_ids = set(clustered.tolist())
+    clusters: Dict[int, Dict] = {}
+    line_id = 0
+    unique = 0
+    for in_path, out_path in zip(in_paths, out_paths):
+        name = os.path.basename(in_path)
+        lines = (text for start, end in find_chunk_boundaries(in_path, chunk_bytes)
+                 for text in _read_lines(in_path, start, end))
+        with open(out_path, "w", encoding="utf-8") as f_out:
+            for lineno, text in enumerate(lines, start=1):
+                if not text:
+                    continue
+                root = int(cluster[line_id])
+                if root == line_id:
+                    f_out.write(text + "\n")
+                    unique += 1
+                    if line_id in cluster_ids:
+                        clusters[line_id] = {"representative": f"{name}:{lineno}", "text": text, "duplicates": []}
+                else:
+                    clusters[root]["duplicates"].append(f"{name}:{lineno}")
+                line_id += 1
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f_rep:
+            for entry in clusters.values():
+                entry["size"] = 1 + len(entry["duplicates"])
+                f_rep.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    logging.info("MinHash dedup: total %d → unique %d (%d duplicate clusters)", total, unique, len(clusters))
+    return {"total": total, "unique": unique, "clusters": len(clusters)}
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Fused streaming data preparation.  Runs normalisation, language filtering,
+exact deduplication and sentence splitting as a chain of generator stages,
+reading every raw text file once and writing only the final sentences.  The
+result is identical to running `clean_normalize.py`, `langid_filter.py`,
+`dedupe.py` and `split_sentences.py` one after another, but without the
+three intermediate copies of the corpus on disk.
+
+Pass `--debug_dir` to additionally dump the output of each stage into
+`<debug_dir>/clean`, `<debug_dir>/clean_filtered` and `<debug_dir>/unique`
+(mirroring `data_clean/`, `data_clean_filtered/` and `data_unique/`).
+
+Example:
+
+    python stream_pipeline.py --input data_raw --output data_sentences
+
+"""
+import argparse
+import logging
+import os
+from contextlib import ExitStack
+from typing import Iterable, Iterator, Optional, TextIO
+
+from clean_normalize import normalise_text
+from langid_filter import load_model, somali_mask
+from split_sentences import split_line_to_sentences
+
+DEBUG_STAGES = ("clean", "clean_filtered", "unique")
+
+
+def read_lines(path: str) -> Iterator[str]:
+    # Same line splitting as clean_normalize.py ("\n" only).
+    with open(path, encoding="utf-8", newline="\n") as f_in:
+        for line in f_in:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def normalise_stage(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        cleaned = normalise_text(line)
+        if cleaned:
+            yield cleaned
+
+
+def langid_stage(lines: Iterable[str], model, threshold: float, batch_size: int = 4096) -> Iterator[str]:
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield from (text for text, keep in zip(batch, somali_mask(model, batch, threshold)) if keep)
+            batch = []
+    if batch:
+        yield from (text for text, keep in zip(batch, somali_mask(model, batch, threshold)) if keep)
+
+
+def dedupe_stage(lines: Iterable[str]) -> Iterator[str]:
+    seen_hashes = set()
+    for line in lines:
+        h = hash(line)
+        if h not in seen_hashes:
+            seen_hashes.add(h)
+            yield line
+
+
+def split_stage(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        yield from split_line_to_sentences(line)
+
+
+def tap(lines: Iterable[str], f_out: Optional[TextIO]) -> Iterator[str]:
+    """Pass `lines` through unchanged, copying them to `f_out` if given."""
+    for line in lines:
+        if f_out is not None:
+            f_out.write(line + "\n")
+        yield line
+
+
+def process_file(in_path: str, out_path: str, model, threshold: float = 0.8,
+                 debug_dir: Optional[str] = None) -> int:
+    filename = os.path.basename(in_path)
+    with ExitStack() as stack:
+        debug_files = {}
+        for stage in DEBUG_STAGES:
+            if debug_dir is None:
+                debug_files[stage] = None
+                continue
+            stage_dir = os.path.join(debug_dir, stage)
+            os.makedirs(stage_dir, exist_ok=True)
+            debug_files[stage] = stack.enter_context(
+                open(os.path.join(stage_dir, filename), "w", encoding="utf-8"))
+        f_out = stack.enter_context(open(out_path, "w", encoding="utf-8"))
+        lines = read_lines(in_path)
+        lines = tap(normalise_stage(lines), debug_files["clean"])
+        lines = tap(langid_stage(lines, model, threshold), debug_files["clean_filtered"])
+        lines = tap(dedupe_stage(lines), debug_files["unique"])
+        count = 0
+        for sent in split_stage(lines):
+            f_out.write(sent + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalise, language-filter, deduplicate and sentence-split Somali text in one pass.")
+    parser.add_argument("--input", type=str, required=True, help="Directory containing raw text files.")
+    parser.add_argument("--output", type=str, required=True, help="Directory to write sentence files.")
+    parser.add_argument("--model", type=str, default="lid.176.bin", help="Path to fastText language id model.")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Probability threshold for Somali detection.")
+    parser.add_argument("--debug_dir", type=str, default=None, help="If set, also write each intermediate stage under this directory.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    model = load_model(args.model)
+    os.makedirs(args.output, exist_ok=True)
+    for filename in sorted(os.listdir(args.input)):
+        if not filename.endswith(".txt"):
+            continue
+        in_path = os.path.join(args.input, filename)
+        out_path = os.path.join(args.output, filename)
+        count = process_file(in_path, out_path, model, threshold=args.threshold, debug_dir=args.debug_dir)
+        logging.info("Processed %s → %s (%d sentences)", in_path, out_path, count)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ import os
 import torch
 import glob
 
+from safetensors import safe_open
+from safetensors.torch import save_file
+
 print("Searching for PL-BERT model files...")
 print("=" * 70)
 
@@ -61,56 +64,51 @@ if found_files:
 
     print(f"\nTrying to load {largest_file}...")
     try:
-        data = torch.load(largest_file, map_location='cpu', weights_only=False)
+        if largest_file.endswith('.safetensors'):
+            # Memory-mapped: tensors are only read when requested
+            with safe_open(largest_file, framework='pt') as f:
+                data = {k: f.get_tensor(k) for k in f.keys()}
+        else:
+            # Tensors and plain containers only; no arbitrary pickled objects
+            data = torch.load(largest_file, map_location='cpu', weights_only=True)
 
         if isinstance(data, dict):
             print(f"✓ Loaded successfully - it's a dictionary")
             print(f"  Keys: {list(data.keys())[:10]}")  # First 10 keys
 
-            # Check if it contains model weights
-            if 'model' in data or 'state_dict' in data or 'net' in data:
+            # Extract the actual state dict
+            if 'model' in data:
+                state_dict = data['model']
+            elif 'state_dict' in data:
+                state_dict = data['state_dict']
+            elif 'net' in data:
+                state_dict = data['net']
+            else:
+                state_dict = data
+            if state_dict is not data:
                 print("  This looks like a checkpoint with model weights")
+            print(f"  State dict has {len(state_dict)} parameters")
+            print(f"  Sample keys: {list(state_dict.keys())[:5]}")
 
-                # Extract the actual state dict
-                if 'model' in data:
-                    state_dict = data['model']
-                elif 'state_dict' in data:
-                    state_dict = data['state_dict']
-                elif 'net' in data:
-                    state_dict = data['net']
-                else:
-                    state_dict = data
-
-                print(f"  State dict has {len(state_dict)} parameters")
-
-                # Save to packaged directory
-                output_path = 'runs/plbert_so/packaged/step_000001.pt'
-
-                # Backup old file if exists
-                if os.path.exists(output_path):
-                    os.rename(output_path, output_path + '.bak')
-                    print(f"\n  Backed up old file to {output_path}.bak")
-
-                # Save just the state dict (not wrapped in another dict)
-                torch.save(state_dict, output_path)
-                print(f"\n✓ Saved model weights to {output_path}")
-
-            elif all(isinstance(k, str) and '.' in k for k in list(data.keys())[:5]):
-                # It's likely a state dict directly
-                print("  This looks like a state dict directly")
-                print(f"  Has {len(data)} parameters")
-                print(f"  Sample keys: {list(data.keys())[:5]}")
+            # The packaged model holds the AlbertModel encoder only: no 'albert.' prefix, no MLM head
+            encoder = {(k[len('albert.'):] if k.startswith('albert.') else k): v.contiguous().clone()
+                       for k, v in state_dict.items()
+                       if isinstance(v, torch.Tensor) and k.startswith(('albert.', 'embeddings.', 'encoder.', 'pooler.'))}
 
+            if encoder:
                 # Save to packaged directory
-                output_path = 'runs/plbert_so/packaged/step_000001.pt'
+                output_path = 'runs/plbert_so/packaged/step_000001.safetensors'
 
                 # Backup old file if exists
                 if os.path.exists(output_path):
                     os.rename(output_path, output_path + '.bak')
                     print(f"\n  Backed up old file to {output_path}.bak")
 
-                torch.save(data, output_path)
-                print(f"\n✓ Saved model weights to {output_path}")
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                save_file(encoder, output_path, metadata={'format': 'pt'})
+                print(f"\n✓ Saved {len(encoder)} encoder tensors to {output_path}")
+            else:
+                print("  No ALBERT encoder weights in this file")
 
         else:
             print(f"Loaded data is of type: {type(data)}")
@@ -4,6 +4,8 @@ Fix the checkpoint format to match what StyleTTS2 expects.
 """
 import torch
 import os
+from safetensors import safe_open
+from safetensors.torch import save_file
 
 def convert_checkpoint_format():
     """Convert checkpoint to expected format."""
@@ -33,22 +35,30 @@ def convert_checkpoint_format():
     return output_path
 
 def fix_plbert_checkpoint():
-    """Fix the PL-BERT checkpoint format."""
+    """Write the PL-BERT encoder as the packaged safetensors checkpoint."""
 
     # Load the model from from_scratch
-    model_path = "runs/plbert_so/from_scratch/pytorch_model.bin"
-    output_path = "runs/plbert_so/packaged/step_000001.pt"
+    model_dir = "runs/plbert_so/from_scratch"
+    output_path = "runs/plbert_so/packaged/step_000001.safetensors"
 
-    if os.path.exists(model_path):
-        print(f"Loading PL-BERT model from {model_path}")
-        state_dict = torch.load(model_path, map_location='cpu', weights_only=False)
-
-        # Make sure it's just the state dict
-        if hasattr(state_dict, 'state_dict'):
-            state_dict = state_dict.state_dict()
+    safetensors_path = os.path.join(model_dir, "model.safetensors")
+    bin_path = os.path.join(model_dir, "pytorch_model.bin")
+    if os.path.exists(safetensors_path):
+        print(f"Loading PL-BERT model from {safetensors_path}")
+        # Memory-mapped; only the encoder tensors are read
+        with safe_open(safetensors_path, framework="pt") as f:
+            state_dict = {k: f.get_tensor(k) for k in f.keys() if k.startswith("albert.")}
+    elif os.path.exists(bin_path):
+        print(f"Loading PL-BERT model from {bin_path}")
+        state_dict = torch.load(bin_path, map_location='cpu', weights_only=True)
+    else:
+        return
 
-        torch.save(state_dict, output_path)
-        print(f"Saved PL-BERT state dict to {output_path}")
+    # StyleTTS2 loads AlbertModel keys (no "albert." prefix, no MLM head)
+    state_dict = {k[len("albert."):]: v.contiguous().clone() for k, v in state_dict.items() if k.startswith("albert.")}
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    save_file(state_dict, output_path, metadata={"format": "pt"})
+    print(f"Saved PL-BERT encoder ({len(state_dict)} tensors) to {output_path}")
 
 if __name__ == "__main__":
     # Fix both checkpoints
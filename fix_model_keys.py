@@ -2,40 +2,43 @@
 """
 Fix the model key names to match what StyleTTS2 expects.
 """
-import torch
 import os
 
+from safetensors import safe_open
+from safetensors.torch import save_file
+
 print("Fixing PL-BERT model key names...")
 print("=" * 70)
 
-# Load the current model
-model_path = 'runs/plbert_so/packaged/step_000001.pt'
+# The packaged model (safetensors, memory-mapped: only the header is read until tensors are needed)
+model_path = 'runs/plbert_so/packaged/step_000001.safetensors'
 
 if os.path.exists(model_path):
-    print(f"Loading model from: {model_path}")
-    state_dict = torch.load(model_path, map_location='cpu', weights_only=False)
-
-    print(f"Current model has {len(state_dict)} parameters")
-    print("Sample keys (current):")
-    for i, key in enumerate(list(state_dict.keys())[:5]):
-        print(f"  {key}")
-
-    # Check if keys have 'albert.' prefix
-    if any(k.startswith('albert.') for k in state_dict.keys()):
-        print("\nRemoving 'albert.' prefix from keys...")
+    print(f"Opening model: {model_path}")
+    with safe_open(model_path, framework="pt") as f:
+        keys = list(f.keys())
 
-        # Remove the 'albert.' prefix
-        new_state_dict = {}
-        for key, value in state_dict.items():
-            if key.startswith('albert.'):
-                new_key = key[7:]  # Remove 'albert.' prefix
-            else:
-                new_key = key
-            new_state_dict[new_key] = value
+        print(f"Current model has {len(keys)} parameters")
+        print("Sample keys (current):")
+        for key in keys[:5]:
+            print(f"  {key}")
 
-        print(f"\nNew model has {len(new_state_dict)} parameters")
+        # StyleTTS2 wants AlbertModel keys: no 'albert.' prefix and no MLM 'predictions' head
+        has_prefix = any(k.startswith('albert.') for k in keys)
+        has_head = any('predictions' in k for k in keys)
+        new_state_dict = None
+        if has_prefix or has_head:
+            if has_prefix:
+                print("\nRemoving 'albert.' prefix from keys...")
+            if has_head:
+                print("Removing 'predictions' layer (not needed for PL-BERT in StyleTTS2)...")
+            new_state_dict = {(k[len('albert.'):] if k.startswith('albert.') else k): f.get_tensor(k).clone()
+                              for k in keys if 'predictions' not in k}
+
+    if new_state_dict is not None:
+        print(f"\nNew model has {len(new_state_dict)} parameters (was {len(keys)})")
         print("Sample keys (fixed):")
-        for i, key in enumerate(list(new_state_dict.keys())[:5]):
+        for key in list(new_state_dict.keys())[:5]:
             print(f"  {key}")
 
         # Backup the old file
@@ -44,33 +47,21 @@ if os.path.exists(model_path):
         print(f"\nBacked up original to: {backup_path}")
 
         # Save the fixed model
-        torch.save(new_state_dict, model_path)
+        save_file(new_state_dict, model_path, metadata={'format': 'pt'})
         print(f"Saved fixed model to: {model_path}")
 
-    # Also check for 'predictions' keys that might not be needed
-    state_dict = torch.load(model_path, map_location='cpu', weights_only=False)
-    if any('predictions' in k for k in state_dict.keys()):
-        print("\nRemoving 'predictions' layer (not needed for PL-BERT in StyleTTS2)...")
-
-        filtered_dict = {k: v for k, v in state_dict.items() if 'predictions' not in k}
-
-        print(f"Filtered model has {len(filtered_dict)} parameters (was {len(state_dict)})")
-
-        # Save the filtered model
-        torch.save(filtered_dict, model_path)
-        print(f"Saved filtered model to: {model_path}")
-
-    # Final verification
-    final_state = torch.load(model_path, map_location='cpu', weights_only=False)
+    # Final verification (header only)
+    with safe_open(model_path, framework="pt") as f:
+        final_keys = list(f.keys())
     print("\n" + "=" * 70)
     print("Final model structure:")
-    print(f"  Total parameters: {len(final_state)}")
+    print(f"  Total parameters: {len(final_keys)}")
 
     # Group keys by component
-    embeddings_keys = [k for k in final_state.keys() if 'embeddings' in k]
-    encoder_keys = [k for k in final_state.keys() if 'encoder' in k]
-    pooler_keys = [k for k in final_state.keys() if 'pooler' in k]
-    other_keys = [k for k in final_state.keys() if k not in embeddings_keys + encoder_keys + pooler_keys]
+    embeddings_keys = [k for k in final_keys if 'embeddings' in k]
+    encoder_keys = [k for k in final_keys if 'encoder' in k]
+    pooler_keys = [k for k in final_keys if 'pooler' in k]
+    other_keys = [k for k in final_keys if k not in embeddings_keys + encoder_keys + pooler_keys]
 
     print(f"  Embedding layers: {len(embeddings_keys)}")
     print(f"  Encoder layers: {len(encoder_keys)}")
@@ -84,4 +75,4 @@ if os.path.exists(model_path):
 else:
     print(f"✗ Model file not found: {model_path}")
 
-print("=" * 70)
\ No newline at end of file
+print("=" * 70)
@@ -4,7 +4,8 @@ Fix the PL-BERT checkpoint to have the correct format for StyleTTS2.
 """
 import os
 import torch
-import pickle
+from safetensors import safe_open
+from safetensors.torch import save_file
 
 print("Fixing Somali PL-BERT checkpoint...")
 
@@ -14,26 +15,28 @@ plbert_dir = 'runs/plbert_so/packaged'
 files = os.listdir(plbert_dir)
 print(f"Files in {plbert_dir}: {files}")
 
-# Load the existing step_000001.pt to see what's in it
-checkpoint_path = os.path.join(plbert_dir, 'step_000001.pt')
+# Look at the existing step_000001.safetensors (header only; tensors are memory-mapped)
+checkpoint_path = os.path.join(plbert_dir, 'step_000001.safetensors')
 if os.path.exists(checkpoint_path):
-    print(f"\nLoading {checkpoint_path}...")
-    data = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
-    print(f"Type of loaded data: {type(data)}")
-
-    if hasattr(data, '__dict__'):
-        print(f"Attributes: {list(data.__dict__.keys())[:10]}")  # First 10 attributes
+    print(f"\nOpening {checkpoint_path}...")
+    with safe_open(checkpoint_path, framework="pt") as f:
+        keys = list(f.keys())
+    print(f"Contains {len(keys)} tensors")
+    print(f"Sample keys: {keys[:10]}")  # First 10 keys
 
 # Look for the actual model file in various locations
 print("\nSearching for model weights...")
 
 possible_paths = [
+    os.path.join(plbert_dir, 'model.safetensors'),
     os.path.join(plbert_dir, 'pytorch_model.bin'),
+    'runs/plbert_so/model.safetensors',
     'runs/plbert_so/pytorch_model.bin',
     'runs/plbert_so/model.pt',
     'runs/plbert_so/best_model.pt',
     'runs/plbert_so/final_model.pt',
     # Check checkpoint directories
+    'runs/plbert_so/checkpoint-5000/model.safetensors',
     'runs/plbert_so/checkpoint-1000/pytorch_model.bin',
     'runs/plbert_so/checkpoint-2000/pytorch_model.bin',
     'runs/plbert_so/checkpoint-3000/pytorch_model.bin',
@@ -63,9 +66,14 @@ if not model_path:
             else:
                 print(f"  File: {item}")
 
-if model_path and os.path.exists(model_path):
+if model_path:
     print(f"\nLoading model from {model_path}...")
-    model_state = torch.load(model_path, map_location='cpu', weights_only=False)
+    if model_path.endswith('.safetensors'):
+        with safe_open(model_path, framework="pt") as f:
+            model_state = {k: f.get_tensor(k) for k in f.keys()}
+    else:
+        # Tensors and plain containers only; no arbitrary pickled objects
+        model_state = torch.load(model_path, map_location='cpu', weights_only=True)
 
     print(f"Model state type: {type(model_state)}")
     if isinstance(model_state, dict):
@@ -77,76 +85,30 @@ if model_path and os.path.exists(model_path):
         else:
             actual_state = model_state
 
-        # Create a proper checkpoint for StyleTTS2
-        proper_checkpoint = {
-            'model': actual_state,
-            'iteration': 1,
-            'optimizer': None,
-            'learning_rate': 1e-5
-        }
-
-        # Save it
-        new_checkpoint_path = os.path.join(plbert_dir, 'step_000001.pt')
+        # StyleTTS2 loads AlbertModel keys: no 'albert.' prefix and no MLM 'predictions' head
+        encoder_state = {(k[len('albert.'):] if k.startswith('albert.') else k): v.contiguous().clone()
+                         for k, v in actual_state.items() if not k.startswith('predictions.')}
 
         # Backup the old one if it exists
-        if os.path.exists(new_checkpoint_path):
-            backup_path = new_checkpoint_path + '.bak'
-            os.rename(new_checkpoint_path, backup_path)
+        if os.path.exists(checkpoint_path):
+            backup_path = checkpoint_path + '.bak'
+            os.rename(checkpoint_path, backup_path)
             print(f"Backed up old checkpoint to {backup_path}")
 
-        torch.save(actual_state, new_checkpoint_path)  # Save just the state dict
-        print(f"\n✓ Saved fixed checkpoint to {new_checkpoint_path}")
+        save_file(encoder_state, checkpoint_path, metadata={'format': 'pt'})
+        print(f"\n✓ Saved fixed checkpoint to {checkpoint_path}")
 
-        # Verify it loads correctly
-        test_load = torch.load(new_checkpoint_path, map_location='cpu', weights_only=False)
-        if isinstance(test_load, dict):
-            print(f"✓ Checkpoint verified - contains {len(test_load)} parameters")
-            # Show a few parameter names to verify it's the model
-            param_names = list(test_load.keys())[:5]
-            print(f"  Sample parameters: {param_names}")
+        # Verify it opens correctly
+        with safe_open(checkpoint_path, framework="pt") as f:
+            param_names = list(f.keys())
+        print(f"✓ Checkpoint verified - contains {len(param_names)} parameters")
+        # Show a few parameter names to verify it's the model
+        print(f"  Sample parameters: {param_names[:5]}")
     else:
         print(f"Unexpected model state type: {type(model_state)}")
-        print("Trying to save as-is...")
-        torch.save(model_state, os.path.join(plbert_dir, 'step_000001.pt'))
+        print("Not a state dict; leaving the checkpoint unchanged.")
 else:
     print("\n✗ Could not find model weights")
-    print("\nLet's check if there's a model.safetensors file:")
-
-    # Check for safetensors format
-    safetensor_paths = [
-        os.path.join(plbert_dir, 'model.safetensors'),
-        'runs/plbert_so/model.safetensors',
-        'runs/plbert_so/checkpoint-5000/model.safetensors',
-    ]
-
-    for path in safetensor_paths:
-        if os.path.exists(path):
-            print(f"Found safetensors model at: {path}")
-            print("Note: This needs to be converted to .pt format")
-            # Try to load with safetensors
-            try:
-                from safetensors import safe_open
-                from safetensors.torch import load_file
-
-                state_dict = load_file(path)
-                print(f"Loaded safetensors model with {len(state_dict)} parameters")
-
-                # Save as .pt file
-                new_checkpoint_path = os.path.join(plbert_dir, 'step_000001.pt')
-                if os.path.exists(new_checkpoint_path):
-                    backup_path = new_checkpoint_path + '.bak'
-                    os.rename(new_checkpoint_path, backup_path)
-                    print(f"Backed up old checkpoint to {backup_path}")
-
-                torch.save(state_dict, new_checkpoint_path)
-                print(f"\n✓ Converted and saved model to {new_checkpoint_path}")
-                model_path = new_checkpoint_path  # Set this so we don't show error
-            except ImportError:
-                print("safetensors library not installed. Install with: pip install safetensors")
-            break
-
-    if not model_path:
-        print("\nCould not find any model weights.")
-        print("Please check if the model was properly trained and saved.")
-
-print("\nDone!")
\ No newline at end of file
+    print("Please check if the model was properly trained and saved.")
+
+print("\nDone!")
@@ -65,26 +65,36 @@ def create_plbert_config():
 
     # Also need to ensure the model checkpoint is in the right format
     import torch
+    from safetensors import safe_open
+    from safetensors.torch import save_file
 
-    # Load our checkpoint
-    checkpoint_path = "runs/plbert_so/packaged/step_000001.pt"
+    # The packaged encoder checkpoint (safetensors, AlbertModel keys)
+    checkpoint_path = "runs/plbert_so/packaged/step_000001.safetensors"
     if not os.path.exists(checkpoint_path):
-        # Try to find the actual model file
-        model_path = "runs/plbert_so/from_scratch/pytorch_model.bin"
-        if os.path.exists(model_path):
-            print(f"Copying model from {model_path} to {checkpoint_path}")
-            import shutil
-            shutil.copy(model_path, checkpoint_path)
+        # Try to find the actual model file and extract the encoder
+        for model_path in ["runs/plbert_so/from_scratch/model.safetensors",
+                           "runs/plbert_so/from_scratch/pytorch_model.bin"]:
+            if not os.path.exists(model_path):
+                continue
+            print(f"Extracting the encoder from {model_path} to {checkpoint_path}")
+            if model_path.endswith(".safetensors"):
+                with safe_open(model_path, framework="pt") as f:
+                    state = {k: f.get_tensor(k) for k in f.keys() if k.startswith("albert.")}
+            else:
+                state = torch.load(model_path, map_location='cpu', weights_only=True)
+            state = {k[len("albert."):]: v.contiguous().clone() for k, v in state.items() if k.startswith("albert.")}
+            save_file(state, checkpoint_path, metadata={"format": "pt"})
+            break
 
-    # Also create the expected util.py in our packaged directory
+    # Also add the helpers StyleTTS2 expects to util.py in our packaged directory.
+    # pack.py's util.py (token map helpers, load_weights) is kept; missing helpers are appended.
     util_content = '''
-import torch
-import pickle
 
 def load_plbert(ckpt_path):
-    """Load PL-BERT model for StyleTTS2."""
-    checkpoint = torch.load(ckpt_path, weights_only=False)
-    return checkpoint
+    """Load the PL-BERT state dict for StyleTTS2 (memory-mapped safetensors, no pickle)."""
+    from safetensors import safe_open
+    with safe_open(ckpt_path, framework="pt") as f:
+        return {k: f.get_tensor(k) for k in f.keys()}
 
 def load_config(config_path):
     """Load config file."""
@@ -94,10 +104,16 @@ def load_config(config_path):
 '''
 
     util_path = "runs/plbert_so/packaged/util.py"
-    with open(util_path, 'w') as f:
-        f.write(util_content)
-
-    print(f"Created util.py at {util_path}")
+    existing = ""
+    if os.path.exists(util_path):
+        with open(util_path) as f:
+            existing = f.read()
+    if "def load_plbert(" not in existing:
+        with open(util_path, 'a') as f:
+            f.write(util_content)
+        print(f"Added load_plbert/load_config to {util_path}")
+    else:
+        print(f"{util_path} already provides load_plbert")
 
 if __name__ == "__main__":
     create_plbert_config()
@@ -64,11 +64,11 @@ def load_plbert(log_dir):
     # Create model
     bert = AlbertModel(albert_base_configuration)
 
-    # Try to load checkpoint
-    checkpoint_path = os.path.join(log_dir, "step_000001.pt")
+    # Try to load checkpoint (safetensors first: memory-mapped, nothing is unpickled)
+    checkpoint_path = os.path.join(log_dir, "step_000001.safetensors")
     if not os.path.exists(checkpoint_path):
         # Try alternative paths
-        for alt_path in ["pytorch_model.bin", "model.pt", "best_model.pt"]:
+        for alt_path in ["step_000001.pt", "pytorch_model.bin", "model.pt", "best_model.pt"]:
             full_path = os.path.join(log_dir, alt_path)
             if os.path.exists(full_path):
                 checkpoint_path = full_path
@@ -76,18 +76,42 @@ def load_plbert(log_dir):
 
     if os.path.exists(checkpoint_path):
         try:
-            checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
-            if isinstance(checkpoint, dict):
-                if 'model_state_dict' in checkpoint:
-                    bert.load_state_dict(checkpoint['model_state_dict'])
-                elif 'state_dict' in checkpoint:
-                    bert.load_state_dict(checkpoint['state_dict'])
+            if checkpoint_path.endswith(".safetensors"):
+                from safetensors import safe_open
+                # Copy tensor by tensor into the model's parameters; the file is never fully resident
+                state = bert.state_dict()
+                with safe_open(checkpoint_path, framework="pt") as f:
+                    names = {(key[len("albert."):] if key.startswith("albert.") else key): key
+                             for key in f.keys() if not key.startswith("predictions.")}
+                    # Check keys and shapes before copying, as load_state_dict(strict=True) does;
+                    # the pooler (absent from the MLM model) and position/token type id buffers are optional
+                    optional = {k for k in set(names) | set(state)
+                                if k.startswith("pooler.") or k.startswith("embeddings.") and k.endswith("_ids")}
+                    missing = sorted(set(state) - set(names) - optional)
+                    unexpected = sorted(set(names) - set(state) - optional)
+                    if missing or unexpected:
+                        raise ValueError(f"missing keys {missing}, unexpected keys {unexpected}")
+                    loaded = [name for name in names if name in state]
+                    for name in loaded:
+                        shape = tuple(f.get_slice(names[name]).get_shape())
+                        if shape != tuple(state[name].shape):
+                            raise ValueError(f"{names[name]}: checkpoint shape {shape} does not match model "
+                                             f"{tuple(state[name].shape)}")
+                    for name in loaded:
+                        state[name].copy_(f.get_tensor(names[name]))
+            else:
+                checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=True)
+                if isinstance(checkpoint, dict):
+                    if 'model_state_dict' in checkpoint:
+                        bert.load_state_dict(checkpoint['model_state_dict'])
+                    elif 'state_dict' in checkpoint:
+                        bert.load_state_dict(checkpoint['state_dict'])
+                    else:
+                        # Try to load directly
+                        bert.load_state_dict(checkpoint)
                 else:
-                    # Try to load directly
+                    # Assume it's the state dict directly
                     bert.load_state_dict(checkpoint)
-            else:
-                # Assume it's the state dict directly
-                bert.load_state_dict(checkpoint)
         except Exception as e:
             print(f"Warning: Could not load checkpoint from {checkpoint_path}: {e}")
             print("Using randomly initialized model")
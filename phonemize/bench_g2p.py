@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for the Somali G2P word tokenizer.  Compares the compiled
+single‑scan `tokenize_word` in `phonemizer_somali.py` against the original
+character‑by‑character loops (kept below as the reference implementation),
+checks that both produce identical phoneme and grapheme tokens for every
+word, and reports the per‑word time of each.  The word cache is bypassed so
+only tokenisation is measured.
+
+Words are read from `--input` (one sentence per line) if given, otherwise a
+built‑in list of common Somali words is used.
+
+Example:
+
+    python phonemize/bench_g2p.py --input data_sentences/wikipedia.txt --max_words 200000
+
+"""
+import argparse
+import time
+from typing import List, Tuple
+
+from phonemizer_somali import DIGRAPHS, LONG_VOWELS, PHONEME_MAP, tokenize_word
+
+SAMPLE_WORDS = (
+    "Soo dhawoow Sidee tahay Waan fiicanahay mahadsanid Magacaygu waa Cali Subax "
+    "wanaagsan Galab Habeen Iska warran maxay magacaaga Ka bax halkan Muqdisho "
+    "Soomaaliya dhaqaalaha xukuumadda shirka qaranka caafimaadka waxbarashada "
+    "ciyaaraha kooxda dalka Hargeysa Kismaayo Boosaaso khudbad sheekh dhallinyarada"
+).split()
+
+
+def reference_tokenize(word: str) -> Tuple[List[str], List[str]]:
+    """The original per‑character loops from `phonemizer_somali.py`."""
+    lower = word.lower()
+    phonemes = []
+    i = 0
+    while i < len(lower):
+        if i + 1 < len(lower) and lower[i:i+2] in LONG_VOWELS:
+            phonemes.append(LONG_VOWELS[lower[i:i+2]])
+            i += 2
+            continue
+        if i + 1 < len(lower) and lower[i:i+2] in DIGRAPHS:
+            phonemes.append(PHONEME_MAP.get(lower[i:i+2], lower[i:i+2]))
+            i += 2
+            continue
+        char = lower[i]
+        if i + 1 < len(lower) and lower[i+1] == char:
+            phone = PHONEME_MAP.get(char, char)
+            phonemes.extend([phone, phone])
+            i += 2
+            continue
+        phonemes.append(PHONEME_MAP.get(char, char))
+        i += 1
+    graphemes = []
+    i = 0
+    while i < len(word):
+        if i + 1 < len(word) and word[i:i+2] in LONG_VOWELS:
+            graphemes.append(word[i:i+2])
+            i += 2
+            continue
+        if i + 1 < len(word) and word[i:i+2] in DIGRAPHS:
+            graphemes.append(word[i:i+2])
+            i += 2
+            continue
+        graphemes.append(word[i])
+        i += 1
+    return phonemes, graphemes
+
+
+def time_per_word(fns, words: List[str], repeat: int) -> List[float]:
+    """Best per‑word time of each function; runs are interleaved to reduce noise."""
+    best = [float("inf")] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            start = time.perf_counter()
+            for word in words:
+                fn(word)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return [b / len(words) for b in best]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compiled G2P tokenizer against the reference loops.")
+    parser.add_argument("--input", type=str, default=None, help="Text file with one sentence per line.")
+    parser.add_argument("--max_words", type=int, default=100_000, help="Maximum number of words to benchmark.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported).")
+    args = parser.parse_args()
+    if args.input:
+        words = []
+        with open(args.input, encoding="utf-8") as f:
+            for line in f:
+                words.extend(line.split())
+                if len(words) >= args.max_words:
+                    break
+        words = words[:args.max_words]
+    else:
+        words = (SAMPLE_WORDS * (args.max_words // len(SAMPLE_WORDS) + 1))[:args.max_words]
+
+    mismatches = [w for w in words if reference_tokenize(w) != tokenize_word(w)]
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} words differ, e.g. {mismatches[:5]}")
+    ref, new = time_per_word([reference_tokenize, tokenize_word], words, args.repeat)
+    print(f"words:      {len(words)} (outputs identical)")
+    print(f"reference:  {ref * 1e6:.2f} µs/word")
+    print(f"compiled:   {new * 1e6:.2f} µs/word")
+    print(f"speedup:    {ref / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
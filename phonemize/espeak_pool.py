@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Persistent eSpeak NG phonemisation workers.  Running `espeak-ng` once per
+sentence spends most of the time starting the process, so this module keeps
+a pool of long‑lived worker processes (one per core by default).  Each
+worker loads the eSpeak NG shared library once through `ctypes` and calls
+`espeak_TextToPhonemes` in‑process, which yields the same mnemonics as
+`espeak-ng -q -v so -x`.  If the library cannot be loaded in a worker it
+falls back to one `espeak-ng` subprocess per sentence.
+
+Sentences are sent to the workers in batches.  A batch that does not finish
+within `timeout` seconds (a hung or crashed worker) causes the pool to be
+restarted, and that batch is phonemised with the rule‑based G2P in
+`phonemizer_somali.py` instead.  Sentences for which eSpeak returns nothing
+fall back to the G2P individually.  Throughput is tracked in sentences/sec.
+
+Example:
+
+    with EspeakPool(workers=8) as pool:
+        phones = pool.phonemize(["Salaan!", "Sidee tahay?"])
+        logging.info("eSpeak: %.1f sentences/sec", pool.sentences_per_sec)
+"""
+import ctypes
+import ctypes.util
+import logging
+import multiprocessing
+import os
+import subprocess
+import time
+from typing import List, Optional, Tuple
+
+from phonemizer_somali import phonemize_sentence
+
+AUDIO_OUTPUT_SYNCHRONOUS = 0x02
+ESPEAK_INITIALIZE_DONT_EXIT = 0x8000
+ESPEAK_CHARS_UTF8 = 1
+
+# Per‑process eSpeak binding, created lazily in each worker.
+_ESPEAK = None
+
+
+def clean_phonemes(phon_str: str) -> List[str]:
+    """Remove stress/tone digits and split eSpeak mnemonics into tokens."""
+    phon_str = ''.join(ch for ch in phon_str if not ch.isdigit())
+    return phon_str.split()
+
+
+class EspeakLibrary:
+    """In‑process binding to `libespeak-ng` for text → phoneme mnemonics."""
+
+    def __init__(self, voice: str = "so", library: Optional[str] = None):
+        library = library or os.environ.get("PHONEMIZER_ESPEAK_LIBRARY") or ctypes.util.find_library("espeak-ng")
+        if not library:
+            raise OSError("libespeak-ng not found")
+        self._lib = ctypes.cdll.LoadLibrary(library)
+        self._lib.espeak_Initialize.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        self._lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        self._lib.espeak_TextToPhonemes.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.c_int, ctypes.c_int]
+        self._lib.espeak_TextToPhonemes.restype = ctypes.c_char_p
+        if self._lib.espeak_Initialize(AUDIO_OUTPUT_SYNCHRONOUS, 0, None, ESPEAK_INITIALIZE_DONT_EXIT) <= 0:
+            raise OSError("espeak_Initialize failed")
+        if self._lib.espeak_SetVoiceByName(voice.encode("utf-8")) != 0:
+            raise OSError(f"eSpeak voice {voice!r} not available")
+
+    def phonemize(self, text: str) -> str:
+        buf = ctypes.create_string_buffer(text.encode("utf-8"))
+        ptr = ctypes.c_void_p(ctypes.addressof(buf))
+        clauses = []
+        # espeak_TextToPhonemes handles one clause per call and advances ptr.
+        while ptr.value:
+            out = self._lib.espeak_TextToPhonemes(ctypes.byref(ptr), ESPEAK_CHARS_UTF8, 0)
+            if out:
+                clauses.append(out.decode("utf-8"))
+        return " ".join(clauses)
+
+
+def espeak_subprocess(text: str) -> str:
+    proc = subprocess.run(["espeak-ng", "-q", "-v", "so", "-x", text], capture_output=True, text=True, check=True)
+    return proc.stdout.strip()
+
+
+def init_espeak(voice: str = "so"):
+    """Load the eSpeak binding for the current process (pool initializer)."""
+    global _ESPEAK
+    try:
+        _ESPEAK = EspeakLibrary(voice)
+    except OSError as e:
+        logging.warning("eSpeak library unavailable in worker (%s); using espeak-ng subprocesses.", e)
+        _ESPEAK = None
+
+
+def _phonemize_batch(sentences: List[str]) -> List[List[str]]:
+    """eSpeak tokens per sentence; an empty list marks a failure."""
+    results = []
+    for sentence in sentences:
+        try:
+            raw = _ESPEAK.phonemize(sentence) if _ESPEAK is not None else espeak_subprocess(sentence)
+            results.append(clean_phonemes(raw))
+        except Exception:
+            results.append([])
+    return results
+
+
+def fallback_phonemes(sentence: str) -> List[str]:
+    """Rule‑based phonemes for `sentence` from `phonemizer_somali`."""
+    return phonemize_sentence(sentence)[0].split()
+
+
+def phonemize_batch(sentences: List[str]) -> Tuple[List[List[str]], int]:
+    """Phonemise `sentences` in the current process (after `init_espeak`), with G2P fallback.
+
+    Returns the tokens per sentence and the number of sentences that fell back to the G2P.
+    """
+    raw = _phonemize_batch(sentences)
+    return [toks or fallback_phonemes(sentence) for sentence, toks in zip(sentences, raw)], sum(not t for t in raw)
+
+
+class EspeakPool:
+    """Pool of persistent eSpeak NG workers with timeouts, restarts and G2P fallback."""
+
+    def __init__(self, workers: Optional[int] = None, voice: str = "so", batch_size: int = 256,
+                 timeout: float = 60.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.voice = voice
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.sentences = 0
+        self.fallbacks = 0
+        self.restarts = 0
+        self.elapsed = 0.0
+        self._pool = None
+        self._start()
+
+    def _start(self):
+        self._pool = multiprocessing.Pool(processes=self.workers, initializer=init_espeak, initargs=(self.voice,))
+
+    def _restart(self):
+        self._pool.terminate()
+        self._pool.join()
+        self.restarts += 1
+        self._start()
+
+    def phonemize(self, sentences: List[str]) -> List[List[str]]:
+        """Phonemise `sentences` in order, returning a token list per sentence."""
+        start = time.perf_counter()
+        batches = [sentences[i:i + self.batch_size] for i in range(0, len(sentences), self.batch_size)]
+        pending = [self._pool.apply_async(_phonemize_batch, (batch,)) for batch in batches]
+        results: List[List[str]] = []
+        for i, batch in enumerate(batches):
+            try:
+                phones = pending[i].get(timeout=self.timeout)
+            except multiprocessing.TimeoutError:
+                logging.warning("eSpeak batch timed out after %.0fs; restarting workers.", self.timeout)
+                self._restart()
+                phones = [[] for _ in batch]
+                # Batches queued on the old pool are lost; resubmit the rest.
+                for j in range(i + 1, len(batches)):
+                    pending[j] = self._pool.apply_async(_phonemize_batch, (batches[j],))
+            for sentence, toks in zip(batch, phones):
+                if not toks:
+                    toks = fallback_phonemes(sentence)
+                    self.fallbacks += 1
+                results.append(toks)
+        self.sentences += len(sentences)
+        self.elapsed += time.perf_counter() - start
+        return results
+
+    @property
+    def sentences_per_sec(self) -> float:
+        return self.sentences / self.elapsed if self.elapsed else 0.0
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -15,16 +15,41 @@ Use the `--output` argument to specify the target JSONL file.  If
 `espeak-ng` is installed and supports Somali, phonemes are generated by
 running `espeak-ng -q -v so -x`.  Otherwise the fallback in
 `phonemizer_somali.py` is used【371023369836432†L88-L104】.
+
+eSpeak NG is driven through a pool of persistent workers (`--espeak_workers`,
+one per core by default) that keep the eSpeak library loaded, rather than
+one `espeak-ng` process per sentence; see `espeak_pool.py`.  Sentences that
+eSpeak fails on fall back to the rule‑based G2P, and the achieved throughput
+is logged in sentences/sec.
+
+With `--workers N` sentences are phonemised in chunks by a process pool.
+Output goes either to the single JSONL file, in input order, or with
+`--shard_output` to one JSONL shard per chunk in the `--output` directory.
+Progress is logged periodically and saved to `<output>.manifest.json`; an
+interrupted run restarted with the same arguments and unchanged input
+files continues after the last chunk written.  The manifest is removed
+once a run completes.  Each chunk worker runs eSpeak in‑process (so
+`--espeak_workers` only applies to serial runs); a chunk that takes longer
+than `--espeak_timeout` restarts the pool and is phonemised with the G2P
+instead.  New G2P cache entries of the workers are merged and saved to
+`--g2p_cache` as in a serial run.
 """
 import argparse
 import json
 import logging
+import multiprocessing
 import os
 import subprocess
+import time
+from collections import deque
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
+
+from espeak_pool import EspeakPool, init_espeak, phonemize_batch
+from phonemizer_somali import WORD_CACHE, phonemize_sentence
 
-from phonemizer_somali import phonemize_sentence
+# Set in each pool worker by `_init_worker`.
+_WORKER_USE_ESPEAK = False
 
 
 def has_espeak_so() -> bool:
@@ -57,42 +82,307 @@ def espeak_phonemize(text: str) -> list[str]:
         return []
 
 
-def process_file(path: Path, use_espeak: bool, out_f):
-    """Process a single text file and write JSONL entries."""
+def make_entry(sentence: str, source: str, phones: Optional[list[str]] = None) -> dict:
+    """Build a JSONL entry; `phones` overrides the rule‑based phonemes (e.g. from eSpeak)."""
+    phon_str, graphemes = phonemize_sentence(sentence)
+    if phones is not None:
+        # Graphemes still come from rule‑based parser to guarantee alignment
+        phon_str = " ".join(phones)
+    return {"phonemes": phon_str, "graphemes": graphemes, "source": source}
+
+
+def process_file(path: Path, use_espeak: bool, out_f, espeak_pool: Optional[EspeakPool] = None,
+                 chunk_size: int = 8192):
+    """Process a single text file and write JSONL entries.
+
+    If `espeak_pool` is given, sentences are phonemised by its persistent
+    workers in chunks of `chunk_size` instead of one subprocess each.
+    """
     with path.open(encoding="utf-8") as f_in:
+        if use_espeak and espeak_pool is not None:
+            chunk: list[str] = []
+            for line in f_in:
+                sentence = line.strip()
+                if not sentence:
+                    continue
+                chunk.append(sentence)
+                if len(chunk) >= chunk_size:
+                    write_espeak_chunk(chunk, path.name, espeak_pool, out_f)
+                    chunk = []
+            if chunk:
+                write_espeak_chunk(chunk, path.name, espeak_pool, out_f)
+            return
         for line in f_in:
             sentence = line.strip()
             if not sentence:
                 continue
-            if use_espeak:
-                phones = espeak_phonemize(sentence)
-                # Graphemes still come from rule‑based parser to guarantee alignment
-                _, graphemes = phonemize_sentence(sentence)
-                phon_str = " ".join(phones)
-            else:
-                phon_str, graphemes = phonemize_sentence(sentence)
-            entry = {"phonemes": phon_str, "graphemes": graphemes, "source": path.name}
+            phones = espeak_phonemize(sentence) if use_espeak else None
+            entry = make_entry(sentence, path.name, phones)
             out_f.write(json.dumps(entry, ensure_ascii=False) + "\n")
 
 
+def write_espeak_chunk(sentences: list[str], source: str, espeak_pool: EspeakPool, out_f):
+    for sentence, phones in zip(sentences, espeak_pool.phonemize(sentences)):
+        entry = make_entry(sentence, source, phones)
+        out_f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def iter_tasks(input_dir: Path, filenames: list[str], chunk_size: int) -> Iterator[tuple[int, str, list[str]]]:
+    """Yield (task_id, source, sentences) chunks in a deterministic order."""
+    task_id = 0
+    for filename in filenames:
+        chunk: list[str] = []
+        with (input_dir / filename).open(encoding="utf-8") as f_in:
+            for line in f_in:
+                sentence = line.strip()
+                if not sentence:
+                    continue
+                chunk.append(sentence)
+                if len(chunk) >= chunk_size:
+                    yield task_id, filename, chunk
+                    task_id += 1
+                    chunk = []
+        if chunk:
+            yield task_id, filename, chunk
+            task_id += 1
+
+
+def _init_worker(use_espeak: bool, g2p_cache: Optional[str], g2p_cache_size: int):
+    global _WORKER_USE_ESPEAK
+    _WORKER_USE_ESPEAK = use_espeak
+    if use_espeak:
+        init_espeak()
+    WORD_CACHE.maxsize = g2p_cache_size
+    if g2p_cache:
+        WORD_CACHE.load(g2p_cache)
+    # New words are handed back with every chunk so the parent can save one merged cache.
+    WORD_CACHE.new_entries = []
+
+
+def _phonemize_task(task: tuple[int, str, list[str]], shard_dir: Optional[str]) -> tuple[int, list[str], dict]:
+    """Phonemise one chunk.
+
+    Returns the sentence count, the JSONL lines (empty if they were written
+    to a shard in `shard_dir`) and the chunk's eSpeak fallbacks and G2P
+    cache hits, misses and new entries.
+    """
+    task_id, source, sentences = task
+    hits, misses = WORD_CACHE.hits, WORD_CACHE.misses
+    if _WORKER_USE_ESPEAK:
+        all_phones, fallbacks = phonemize_batch(sentences)
+    else:
+        all_phones, fallbacks = [None] * len(sentences), 0
+    lines = [json.dumps(make_entry(sentence, source, phones), ensure_ascii=False) + "\n"
+             for sentence, phones in zip(sentences, all_phones)]
+    new_entries = WORD_CACHE.new_entries or []
+    if WORD_CACHE.new_entries is not None:
+        WORD_CACHE.new_entries = []
+    stats = {"fallbacks": fallbacks, "hits": WORD_CACHE.hits - hits, "misses": WORD_CACHE.misses - misses,
+             "new_entries": new_entries}
+    if shard_dir is None:
+        return len(sentences), lines, stats
+    shard_path = os.path.join(shard_dir, f"part-{task_id:06d}.jsonl")
+    with open(shard_path + ".tmp", "w", encoding="utf-8") as f_out:
+        f_out.writelines(lines)
+    os.replace(shard_path + ".tmp", shard_path)
+    return len(sentences), [], stats
+
+
+class ResumeManifest:
+    """Tracks how many chunks of a parallel run are safely on disk."""
+
+    def __init__(self, path: str, config: dict):
+        self.path = path
+        self.state = {"config": config, "tasks_done": 0, "sentences": 0, "output_bytes": 0}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("config") == config:
+                self.state = saved
+                logging.info("Resuming from %s: %d chunks (%d sentences) already done",
+                             path, saved["tasks_done"], saved["sentences"])
+            else:
+                logging.warning("Ignoring %s: written with different settings", path)
+
+    def reset(self):
+        self.state.update(tasks_done=0, sentences=0, output_bytes=0)
+
+    def update(self, tasks_done: int, sentences: int, output_bytes: int = 0):
+        self.state.update(tasks_done=tasks_done, sentences=sentences, output_bytes=output_bytes)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def finish(self):
+        """Forget the run once it is complete, so the next run starts over."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _output_intact(output: str, shard_output: bool, state: dict) -> bool:
+    """Whether everything the manifest records as done is still on disk."""
+    if shard_output:
+        return all(os.path.exists(os.path.join(output, f"part-{i:06d}.jsonl")) for i in range(state["tasks_done"]))
+    return os.path.exists(output) and os.path.getsize(output) >= state["output_bytes"]
+
+
+def run_parallel(input_dir: Path, filenames: list[str], output: str, use_espeak: bool, workers: int,
+                 chunk_size: int = 2000, shard_output: bool = False, g2p_cache: Optional[str] = None,
+                 g2p_cache_size: int = 200_000, timeout: float = 60.0, log_every: int = 50):
+    """Phonemise `filenames` in a process pool.
+
+    Results are written either as one JSONL shard per chunk (`shard_output`)
+    or to the single file `output` in input order, holding finished chunks in
+    a reorder buffer until all earlier chunks have been written.  Progress is
+    recorded in `<output>.manifest.json` so an interrupted run resumes after
+    the last chunk that reached disk; the manifest is keyed on the size and
+    modification time of every input file and removed when the run completes.
+
+    A chunk that has not finished `timeout` seconds after it became the
+    oldest outstanding one (a hung eSpeak call or a dead worker) causes the
+    pool to be restarted; that chunk is phonemised with the rule‑based G2P
+    in this process and the chunks queued behind it are resubmitted.  New
+    G2P cache entries of the workers are merged into `WORD_CACHE`.
+    """
+    files = [[name, (input_dir / name).stat().st_size, (input_dir / name).stat().st_mtime_ns] for name in filenames]
+    config = {"files": files, "chunk_size": chunk_size, "shard_output": shard_output, "espeak": use_espeak}
+    manifest = ResumeManifest(output.rstrip("/") + ".manifest.json", config)
+    if manifest.state["tasks_done"] and not _output_intact(output, shard_output, manifest.state):
+        logging.warning("Output %s is missing or shorter than recorded in the manifest; starting over", output)
+        manifest.reset()
+    skip = manifest.state["tasks_done"]
+    sentences = manifest.state["sentences"]
+    shard_dir = output if shard_output else None
+    if shard_output:
+        os.makedirs(output, exist_ok=True)
+        out_f = None
+    else:
+        out_f = open(output, "r+b" if skip else "wb")
+        out_f.seek(manifest.state["output_bytes"])
+        out_f.truncate()
+    start = time.perf_counter()
+    done = skip
+    fallbacks = restarts = 0
+    pending: deque = deque()
+    max_inflight = 4 * workers
+    ctx = multiprocessing.get_context()
+
+    def start_pool():
+        return ctx.Pool(processes=workers, initializer=_init_worker,
+                        initargs=(use_espeak, g2p_cache, g2p_cache_size))
+
+    def write_next():
+        nonlocal done, sentences, fallbacks, restarts, pool
+        task, result = pending.popleft()
+        try:
+            count, lines, stats = result.get(timeout=timeout)
+            # Worker cache counters are deltas; the parent's own counters are not involved.
+            WORD_CACHE.hits += stats["hits"]
+            WORD_CACHE.misses += stats["misses"]
+        except multiprocessing.TimeoutError:
+            logging.warning("Chunk %d did not finish within %.0fs; restarting workers and using the G2P for it.",
+                            task[0], timeout)
+            pool.terminate()
+            pool.join()
+            restarts += 1
+            pool = start_pool()
+            # Chunks queued on the old pool are lost; resubmit them.
+            for i, (queued, _) in enumerate(pending):
+                pending[i] = (queued, pool.apply_async(_phonemize_task, (queued, shard_dir)))
+            # _WORKER_USE_ESPEAK is False in this process, so this is the G2P path;
+            # it counts its cache hits and misses on WORD_CACHE directly.
+            count, lines, stats = _phonemize_task(task, shard_dir)
+            if use_espeak:
+                fallbacks += count
+        fallbacks += stats["fallbacks"]
+        for word, entry in stats["new_entries"]:
+            WORD_CACHE.put(word, entry)
+        if out_f is not None:
+            out_f.write("".join(lines).encode("utf-8"))
+            out_f.flush()
+        done += 1
+        sentences += count
+        manifest.update(done, sentences, out_f.tell() if out_f is not None else 0)
+        if done % log_every == 0:
+            elapsed = time.perf_counter() - start
+            logging.info("Phonemized %d chunks, %d sentences (%.1f sentences/sec)",
+                         done, sentences, (sentences - manifest_start) / elapsed if elapsed else 0.0)
+
+    manifest_start = sentences
+    pool = start_pool()
+    try:
+        for task in iter_tasks(input_dir, filenames, chunk_size):
+            if task[0] < skip:
+                continue
+            pending.append((task, pool.apply_async(_phonemize_task, (task, shard_dir))))
+            if len(pending) >= max_inflight:
+                write_next()
+        while pending:
+            write_next()
+        pool.close()
+        manifest.finish()
+    finally:
+        pool.terminate()
+        pool.join()
+        if out_f is not None:
+            out_f.close()
+    elapsed = time.perf_counter() - start
+    logging.info("Phonemized %d sentences in %d chunks (%.1f sentences/sec, %d G2P fallbacks, %d worker restarts)",
+                 sentences, done, (sentences - manifest_start) / elapsed if elapsed else 0.0, fallbacks, restarts)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Phonemize Somali sentences into phoneme/grapheme JSONL.")
     parser.add_argument("--input", type=str, required=True, help="Directory containing sentence‑split text files.")
     parser.add_argument("--output", type=str, required=True, help="Path to output JSONL file.")
+    parser.add_argument("--g2p_cache", type=str, default=None, help="Pickle file to load/save the word-level G2P cache across runs.")
+    parser.add_argument("--workers", type=int, default=1, help="Phonemize chunks in this many processes (1 = serial).")
+    parser.add_argument("--chunk_size", type=int, default=2000, help="Sentences per parallel work chunk.")
+    parser.add_argument("--shard_output", action="store_true", help="With --workers, treat --output as a directory of per-chunk JSONL shards.")
+    parser.add_argument("--espeak_workers", type=int, default=None, help="Persistent eSpeak NG workers for serial runs (default: one per core; 0 = one subprocess per sentence).  With --workers, each chunk worker runs eSpeak itself.")
+    parser.add_argument("--espeak_timeout", type=float, default=60.0, help="Seconds before a stuck eSpeak batch (or, with --workers, chunk) is restarted and falls back to the G2P.")
+    parser.add_argument("--g2p_cache_size", type=int, default=200_000, help="Maximum number of words kept in the G2P cache (0 disables it).")
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
+    WORD_CACHE.maxsize = args.g2p_cache_size
+    if args.g2p_cache:
+        WORD_CACHE.load(args.g2p_cache)
     use_espeak = has_espeak_so()
     logging.info("Using eSpeak NG: %s", use_espeak)
-    input_dir = Path(args.input)
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    with open(args.output, "w", encoding="utf-8") as out_f:
-        for filename in os.listdir(input_dir):
-            if not filename.endswith(".txt"):
-                continue
-            file_path = input_dir / filename
-            logging.info("Phonemizing %s", file_path)
-            process_file(file_path, use_espeak, out_f)
-    logging.info("Wrote phonemized JSONL to %s", args.output)
+    filenames = sorted(f for f in os.listdir(args.input) if f.endswith(".txt"))
+    if args.workers > 1:
+        if use_espeak and args.espeak_workers is not None and args.espeak_workers != args.workers:
+            logging.warning("--espeak_workers is ignored with --workers: each of the %d chunk workers runs eSpeak",
+                            args.workers)
+        out_parent = args.output if args.shard_output else os.path.dirname(args.output)
+        os.makedirs(out_parent or ".", exist_ok=True)
+        run_parallel(Path(args.input), filenames, args.output, use_espeak, args.workers,
+                     chunk_size=args.chunk_size, shard_output=args.shard_output,
+                     g2p_cache=args.g2p_cache, g2p_cache_size=args.g2p_cache_size, timeout=args.espeak_timeout)
+    else:
+        espeak_workers = args.espeak_workers if args.espeak_workers is not None else os.cpu_count() or 1
+        espeak_pool = None
+        if use_espeak and espeak_workers > 0:
+            espeak_pool = EspeakPool(workers=espeak_workers, timeout=args.espeak_timeout)
+        input_dir = Path(args.input)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        try:
+            with open(args.output, "w", encoding="utf-8") as out_f:
+                for filename in filenames:
+                    file_path = input_dir / filename
+                    logging.info("Phonemizing %s", file_path)
+                    process_file(file_path, use_espeak, out_f, espeak_pool=espeak_pool)
+        finally:
+            if espeak_pool is not None:
+                espeak_pool.close()
+        logging.info("Wrote phonemized JSONL to %s", args.output)
+        if espeak_pool is not None:
+            logging.info("eSpeak: %d sentences at %.1f sentences/sec (%d G2P fallbacks, %d worker restarts)",
+                         espeak_pool.sentences, espeak_pool.sentences_per_sec, espeak_pool.fallbacks,
+                         espeak_pool.restarts)
+    logging.info("G2P cache: %s", WORD_CACHE.stats())
+    if args.g2p_cache:
+        WORD_CACHE.save(args.g2p_cache)
 
 
 if __name__ == "__main__":
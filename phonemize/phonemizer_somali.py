@@ -15,8 +15,12 @@ cannot produce Somali phonemes.
 """
 from __future__ import annotations
 
+import logging
+import os
+import pickle
 import re
-from typing import List
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 
 PHONEME_MAP = {
     # vowels (short)
@@ -37,64 +41,182 @@ LONG_VOWELS = {
 DIGRAPHS = {"dh", "kh", "sh"}
 
 
+# Multi‑character graphemes, matched before single characters.
+SPECIAL_GRAPHEMES = tuple(LONG_VOWELS) + tuple(sorted(DIGRAPHS))
+_SPECIAL_ALTERNATION = "|".join(re.escape(g) for g in SPECIAL_GRAPHEMES)
+# Phoneme tokenizer: long vowel, digraph, geminate pair, or any single
+# character, tried in that order at each position (leftmost alternative wins).
+PHONE_TOKEN_RE = re.compile("(" + _SPECIAL_ALTERNATION + r"|(.)\2|.)", re.DOTALL)
+# Grapheme tokenizer: long vowels and digraphs stay whole, everything else
+# (including geminates) is split into single characters.
+GRAPHEME_TOKEN_RE = re.compile(_SPECIAL_ALTERNATION + r"|.", re.DOTALL)
+# A letter followed by the same letter starting a long vowel/digraph, e.g. the
+# "s" of "ssh".  Phoneme scanning treats "ss" as a geminate but grapheme
+# scanning keeps "sh" whole, so the two token streams diverge there.
+_DIVERGENT_RE = re.compile(r"(.)(?=\1)(?=" + _SPECIAL_ALTERNATION + ")", re.DOTALL)
+
+
+def _compile_token(tok: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Return (phonemes, graphemes) for a `PHONE_TOKEN_RE` match."""
+    if tok in LONG_VOWELS:
+        return (LONG_VOWELS[tok],), (tok,)
+    if tok in DIGRAPHS:
+        return (PHONEME_MAP.get(tok, tok),), (tok,)
+    if len(tok) == 2:
+        phone = PHONEME_MAP.get(tok[0], tok[0])
+        return (phone, phone), (tok[0], tok[1])
+    return (PHONEME_MAP.get(tok, tok),), (tok,)
+
+
+# Token table compiled once from the maps above; other characters are added
+# lazily the first time they are seen.
+TOKEN_TABLE = {tok: _compile_token(tok) for tok in SPECIAL_GRAPHEMES}
+for _ch in PHONEME_MAP:
+    if len(_ch) == 1:
+        TOKEN_TABLE[_ch] = _compile_token(_ch)
+        TOKEN_TABLE[_ch * 2] = _compile_token(_ch * 2)
+
+
+def _lookup(tok: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    entry = TOKEN_TABLE.get(tok)
+    if entry is None:
+        entry = TOKEN_TABLE[tok] = _compile_token(tok)
+    return entry
+
+
+def tokenize_word(word: str) -> Tuple[List[str], List[str]]:
+    """Tokenise a Somali word into aligned (phoneme tokens, grapheme tokens).
+
+    Both streams come from a single scan of the lower‑cased word.  Graphemes
+    are re‑scanned separately only when that would differ from grapheme
+    tokenisation of the original word: when the word has upper‑case letters,
+    or when the second letter of a geminate starts a long vowel or digraph
+    (e.g. ``ssh`` → phonemes ``s s h`` but graphemes ``s sh``).
+    """
+    lower = word.lower()
+    phones: List[str] = []
+    graphemes: List[str] = []
+    for tok, _ in PHONE_TOKEN_RE.findall(lower):
+        entry = TOKEN_TABLE.get(tok) or _lookup(tok)
+        phones.extend(entry[0])
+        graphemes.extend(entry[1])
+    if lower != word or _DIVERGENT_RE.search(lower):
+        graphemes = GRAPHEME_TOKEN_RE.findall(word)
+    return phones, graphemes
+
+
 def grapheme_to_phonemes(word: str) -> List[str]:
     """Convert a Somali word into a list of phoneme tokens."""
-    word = word.lower()
-    phonemes = []
-    i = 0
-    while i < len(word):
-        # handle long vowels
-        if i + 1 < len(word) and word[i:i+2] in LONG_VOWELS:
-            phonemes.append(LONG_VOWELS[word[i:i+2]])
-            i += 2
-            continue
-        # handle consonant digraphs
-        if i + 1 < len(word) and word[i:i+2] in DIGRAPHS:
-            phonemes.append(PHONEME_MAP.get(word[i:i+2], word[i:i+2]))
-            i += 2
-            continue
-        char = word[i]
-        # gemination: if same letter repeated, duplicate the phoneme
-        if i + 1 < len(word) and word[i+1] == char:
-            # treat as geminate; double the phoneme
-            phone = PHONEME_MAP.get(char, char)
-            phonemes.extend([phone, phone])
-            i += 2
-            continue
-        # simple mapping
-        phonemes.append(PHONEME_MAP.get(char, char))
-        i += 1
+    phonemes: List[str] = []
+    for tok, _ in PHONE_TOKEN_RE.findall(word.lower()):
+        phonemes.extend((TOKEN_TABLE.get(tok) or _lookup(tok))[0])
     return phonemes
 
 
-def phonemize_sentence(sentence: str) -> tuple[str, str]:
+def word_to_graphemes(word: str) -> List[str]:
+    """Split a Somali word into grapheme tokens aligned with its phonemes."""
+    # Long vowels and digraphs are single tokens; geminates are two tokens.
+    return GRAPHEME_TOKEN_RE.findall(word)
+
+
+WordEntry = Tuple[Tuple[str, ...], Tuple[str, ...]]
+
+
+class WordCache:
+    """Bounded LRU cache of word → (phoneme tokens, grapheme tokens).
+
+    Somali text is Zipfian, so a cache of the most recent word types covers
+    most tokens.  Entries are keyed by the surface form: phonemes only depend
+    on the lower‑cased word, but grapheme tokens keep the original case.
+    """
+
+    def __init__(self, maxsize: int = 200_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, WordEntry]" = OrderedDict()
+        # Set to a list (in pool workers) to collect new entries for the parent process.
+        self.new_entries: Optional[List[Tuple[str, WordEntry]]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, word: str) -> WordEntry:
+        entry = self._entries.get(word)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(word)
+            return entry
+        self.misses += 1
+        phones, graphemes = tokenize_word(word)
+        entry = (tuple(phones), tuple(graphemes))
+        self.put(word, entry)
+        if self.new_entries is not None:
+            self.new_entries.append((word, entry))
+        return entry
+
+    def put(self, word: str, entry: WordEntry):
+        """Insert `entry` as most recently used, evicting the oldest entry if full."""
+        if self.maxsize > 0:
+            self._entries[word] = entry
+            self._entries.move_to_end(word)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, path: str):
+        """Pickle the cached entries (most recently used last) to `path`."""
+        with open(path, "wb") as f:
+            pickle.dump({"maxsize": self.maxsize, "entries": list(self._entries.items())}, f)
+
+    def load(self, path: str) -> bool:
+        """Load entries saved by `save`; returns False if `path` does not exist."""
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        for word, entry in data["entries"][-self.maxsize:] if self.maxsize > 0 else []:
+            self._entries[word] = entry
+        logging.info("Loaded %d cached G2P entries from %s", len(self._entries), path)
+        return True
+
+
+# Process‑wide cache used by `phonemize_sentence` unless another is passed.
+WORD_CACHE = WordCache()
+
+
+def phonemize_sentence(sentence: str, cache: Optional[WordCache] = WORD_CACHE) -> tuple[str, str]:
     """Phonemize a sentence, returning (phonemes_string, graphemes_string).  Words
     are separated by spaces in the input.  Graphemes are tokenised as
     characters separated by spaces with an underscore marking the end of each
     word.  Digraphs and long vowels are treated as single tokens to align
-    with the phoneme tokens.
+    with the phoneme tokens.  Per‑word results are memoised in `cache`; pass
+    `cache=None` to disable memoisation.
     """
     words = sentence.strip().split()
     phone_tokens: list[str] = []
     grapheme_tokens: list[str] = []
     for word in words:
-        # generate phonemes
-        phs = grapheme_to_phonemes(word)
-        phone_tokens.extend(phs + ["_"])  # use '_' as word separator
-        # grapheme tokens: treat digraphs and long vowels as single tokens
-        i = 0
-        while i < len(word):
-            if i + 1 < len(word) and word[i:i+2] in LONG_VOWELS:
-                grapheme_tokens.append(word[i:i+2])
-                i += 2
-                continue
-            if i + 1 < len(word) and word[i:i+2] in DIGRAPHS:
-                grapheme_tokens.append(word[i:i+2])
-                i += 2
-                continue
-            # gemination: handle double letters as two separate tokens (for grapheme level)
-            grapheme_tokens.append(word[i])
-            i += 1
+        if cache is not None:
+            phs, graphs = cache.get(word)
+        else:
+            phs, graphs = tokenize_word(word)
+        phone_tokens.extend(phs)
+        phone_tokens.append("_")  # use '_' as word separator
+        grapheme_tokens.extend(graphs)
         grapheme_tokens.append("_")
     # Remove trailing separator
     if phone_tokens and phone_tokens[-1] == "_":
@@ -163,7 +163,7 @@ def create_styletts2_config(data_dir):
 
         # PL-BERT settings - pointing to our Somali model
         "PLBERT_dir": "runs/plbert_so/packaged",
-        "PLBERT_checkpoint": "runs/plbert_so/packaged/step_000001.pt",
+        "PLBERT_checkpoint": "runs/plbert_so/packaged/step_000001.safetensors",
 
         # Model parameters
         "decoder": {
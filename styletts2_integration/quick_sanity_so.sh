@@ -1,29 +1,42 @@
 #!/usr/bin/env bash
 # Run a quick sanity check by synthesising a handful of Somali sentences.
-# Ensure that `styletts2_integration/tts_infer_so.py` is executable and that
-# you have trained StyleTTS2 with the provided configs.  Modify the
-# --styletts2_checkpoint path to point to your trained checkpoint.
+# The sentences are sent to the resident TTS server
+# (`styletts2_integration/tts_server_so.py`), so PL-BERT, the token map and
+# StyleTTS2 are loaded only once.  If no server is answering on $PORT, one is
+# started here and stopped again at the end.  Modify the CHECKPOINT path to
+# point to your trained StyleTTS2 checkpoint.
 
 set -e
 
 PLBERT_DIR="runs/plbert_so/packaged"
 CHECKPOINT="path/to/your/styletts2_stage2_checkpoint.pt"
 OUT_DIR="out/sanity_test"
+PORT="${PORT:-8765}"
+URL="http://127.0.0.1:$PORT"
 
-python styletts2_integration/tts_infer_so.py \
-  --text "Salaan! Sidee tahay?" \
-  --plbert_dir "$PLBERT_DIR" \
-  --styletts2_checkpoint "$CHECKPOINT" \
-  --out "$OUT_DIR"
+mkdir -p "$OUT_DIR"
 
-python styletts2_integration/tts_infer_so.py \
-  --text "Waxaan jeclahay buugaagta." \
-  --plbert_dir "$PLBERT_DIR" \
-  --styletts2_checkpoint "$CHECKPOINT" \
-  --out "$OUT_DIR"
+if ! curl -sf "$URL/health" > /dev/null; then
+  PYTHONPATH=".${PYTHONPATH:+:$PYTHONPATH}" python styletts2_integration/tts_server_so.py \
+    --plbert_dir "$PLBERT_DIR" \
+    --styletts2_checkpoint "$CHECKPOINT" \
+    --port "$PORT" &
+  SERVER_PID=$!
+  trap 'kill $SERVER_PID 2> /dev/null' EXIT
+  # Wait for the model to load.
+  until curl -sf "$URL/health" > /dev/null; do
+    kill -0 $SERVER_PID 2> /dev/null || { echo "TTS server failed to start" >&2; exit 1; }
+    sleep 1
+  done
+fi
 
-python styletts2_integration/tts_infer_so.py \
-  --text "Tani waa imtixaan degdeg ah." \
-  --plbert_dir "$PLBERT_DIR" \
-  --styletts2_checkpoint "$CHECKPOINT" \
-  --out "$OUT_DIR"
\ No newline at end of file
+i=0
+for text in "Salaan! Sidee tahay?" "Waxaan jeclahay buugaagta." "Tani waa imtixaan degdeg ah."; do
+  out="$OUT_DIR/sample_$(printf %03d $i).wav"
+  curl -sf --data-binary "$text" -H "Content-Type: text/plain; charset=utf-8" "$URL/synthesize" -o "$out"
+  echo "Synthesised $out"
+  i=$((i + 1))
+done
+
+curl -sf "$URL/stats"
+echo
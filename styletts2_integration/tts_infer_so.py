@@ -19,18 +19,25 @@ Example:
 If `--text_file` is provided instead of `--text`, the script will read
 multiple sentences (one per line) and synthesise each to a separate WAV.
 
+`Synthesizer` loads the PL‑BERT helper module, token map and StyleTTS2
+model once and is shared with the resident server `tts_server_so.py`,
+which avoids paying that start‑up cost for every request.
+
 Note: This script assumes that you have installed the `styletts2` Python
 package and trained the acoustic models.  See the docs for instructions.
 """
 import argparse
-import json
+import importlib.util
+import io
 import logging
 import os
-import uuid
+
 import soundfile as sf
 
 from phonemize.phonemizer_somali import phonemize_sentence
 
+SAMPLE_RATE = 22050
+
 
 def load_plbert(plbert_dir: str):
     """Placeholder for loading PL‑BERT.  In practice, StyleTTS2's code will
@@ -51,24 +58,43 @@ def load_styletts2(checkpoint_path: str, plbert_dir: str):
     return model
 
 
-def synthesize_sentences(sentences, model, plbert_dir, out_dir):
-    os.makedirs(out_dir, exist_ok=True)
-    for idx, sentence in enumerate(sentences):
+def load_plbert_util(plbert_dir: str):
+    """Import the `util.py` helper module written into the PL‑BERT package by `pack.py`."""
+    util_spec = importlib.util.spec_from_file_location("plbert_util", os.path.join(plbert_dir, "util.py"))
+    util = importlib.util.module_from_spec(util_spec)
+    util_spec.loader.exec_module(util)
+    return util
+
+
+class Synthesizer:
+    """PL‑BERT helpers, token map and StyleTTS2 model, loaded once and reused for every sentence."""
+
+    def __init__(self, plbert_dir: str, checkpoint_path: str):
+        self.util = load_plbert_util(plbert_dir)
+        self.token_map = self.util.load_token_map(os.path.join(plbert_dir, "token_maps.pkl"))
+        self.model = load_styletts2(checkpoint_path, load_plbert(plbert_dir))
+
+    def synthesize(self, text: str):
         # Phonemize sentence; returns phoneme string and grapheme string (we use phonemes)
-        phonemes, _ = phonemize_sentence(sentence)
+        phonemes, _ = phonemize_sentence(text)
         # Convert phoneme string into integer IDs using token map
-        # util.py in PL‑BERT package provides helper functions
-        import importlib.util
-        util_spec = importlib.util.spec_from_file_location("plbert_util", os.path.join(plbert_dir, "util.py"))
-        util = importlib.util.module_from_spec(util_spec)
-        util_spec.loader.exec_module(util)
-        token_map = util.load_token_map(os.path.join(plbert_dir, "token_maps.pkl"))
-        ids = util.map_tokens(phonemes, token_map)
+        ids = self.util.map_tokens(phonemes, self.token_map)
         # Generate speech
-        wav = model.tts(ids)
+        return self.model.tts(ids)
+
+    def wav_bytes(self, text: str) -> bytes:
+        buf = io.BytesIO()
+        sf.write(buf, self.synthesize(text), SAMPLE_RATE, format="WAV")
+        return buf.getvalue()
+
+
+def synthesize_sentences(sentences, synthesizer: Synthesizer, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for idx, sentence in enumerate(sentences):
+        wav = synthesizer.synthesize(sentence)
         # Save to file
         out_path = os.path.join(out_dir, f"sample_{idx:03d}.wav")
-        sf.write(out_path, wav, 22050)
+        sf.write(out_path, wav, SAMPLE_RATE)
         logging.info("Synthesised %s", out_path)
 
 
@@ -84,8 +110,7 @@ def main():
     if not (args.text or args.text_file):
         parser.error("Please provide --text or --text_file")
     # Load model
-    plbert = load_plbert(args.plbert_dir)
-    model = load_styletts2(args.styletts2_checkpoint, plbert)
+    synthesizer = Synthesizer(args.plbert_dir, args.styletts2_checkpoint)
     # Collect sentences
     sentences = []
     if args.text:
@@ -93,7 +118,7 @@ def main():
     if args.text_file:
         with open(args.text_file, encoding="utf-8") as f:
             sentences.extend([line.strip() for line in f if line.strip()])
-    synthesize_sentences(sentences, model, args.plbert_dir, args.out)
+    synthesize_sentences(sentences, synthesizer, args.out)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Resident Somali TTS server.  Loads the packaged PL‑BERT helpers, token map
+and StyleTTS2 model once (see `Synthesizer` in `tts_infer_so.py`) and
+serves a small local HTTP API, on a TCP port or a unix socket:
+
+* `POST /synthesize` – body is the Somali text (plain UTF‑8, or JSON
+  `{"text": "..."}`); the reply is a WAV file (`audio/wav`), with the
+  server‑side latency in the `X-Latency-Ms` header;
+* `GET /stats` – number of requests and p50/p95/mean latency (ms) over the
+  last `--latency_window` requests, as JSON;
+* `GET /health` – `{"status": "ok"}` once the model is loaded.
+
+Latency covers phonemisation, synthesis and WAV encoding.  Requests are
+synthesised one at a time; `/stats` and `/health` are answered while a
+synthesis is running.
+
+Example:
+
+    python styletts2_integration/tts_server_so.py \
+      --plbert_dir runs/plbert_so/packaged \
+      --styletts2_checkpoint path/to/styletts2.ckpt --port 8765
+
+    curl -s --data-binary "Salaan! Sidee tahay?" http://127.0.0.1:8765/synthesize -o salaan.wav
+    curl -s http://127.0.0.1:8765/stats
+
+With `--unix_socket /tmp/tts_so.sock`, use `curl --unix-socket /tmp/tts_so.sock http://localhost/...`.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socketserver
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from tts_infer_so import Synthesizer
+
+
+class LatencyStats:
+    """Rolling request latencies (seconds) over the last `window` requests."""
+
+    def __init__(self, window: int = 1000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.requests += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            latencies = np.asarray(self._latencies) * 1e3
+            requests = self.requests
+        if not len(latencies):
+            return {"requests": requests}
+        p50, p95 = np.percentile(latencies, [50, 95])
+        return {"requests": requests, "window": len(latencies), "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2), "mean_ms": round(float(latencies.mean()), 2)}
+
+
+class TTSRequestHandler(BaseHTTPRequestHandler):
+    server_version = "SomaliTTS/1.0"
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send(self, status: int, body: bytes, content_type: str, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: dict):
+        self._send(status, json.dumps(payload).encode(), "application/json")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.stats.summary())
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def _read_text(self) -> str:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return str(json.loads(body).get("text", ""))
+        return body
+
+    def do_POST(self):
+        if self.path != "/synthesize":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            text = self._read_text().strip()
+        except (UnicodeDecodeError, ValueError, AttributeError) as e:
+            self._send_json(400, {"error": f"could not read text: {e}"})
+            return
+        if not text:
+            self._send_json(400, {"error": "empty text"})
+            return
+        start = time.perf_counter()
+        try:
+            with self.server.synth_lock:
+                wav = self.server.synthesizer.wav_bytes(text)
+        except Exception as e:
+            logging.exception("Synthesis failed for %r", text)
+            self._send_json(500, {"error": str(e)})
+            return
+        latency = time.perf_counter() - start
+        self.server.stats.record(latency)
+        self._send(200, wav, "audio/wav", {"X-Latency-Ms": f"{1e3 * latency:.2f}"})
+        summary = self.server.stats.summary()
+        logging.info("Synthesised %d chars in %.1f ms (p50 %.1f ms, p95 %.1f ms over %d requests)",
+                     len(text), 1e3 * latency, summary["p50_ms"], summary["p95_ms"], summary["window"])
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(synthesizer: Synthesizer, host: str = "127.0.0.1", port: int = 8765, unix_socket: str = None,
+                latency_window: int = 1000):
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, TTSRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), TTSRequestHandler)
+        server.daemon_threads = True
+    server.synthesizer = synthesizer
+    server.synth_lock = threading.Lock()
+    server.stats = LatencyStats(latency_window)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident Somali TTS server (StyleTTS2 + PL‑BERT).")
+    parser.add_argument("--plbert_dir", type=str, required=True, help="Path to packaged PL‑BERT directory")
+    parser.add_argument("--styletts2_checkpoint", type=str, required=True, help="Trained StyleTTS2 checkpoint file")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix_socket", type=str, default=None, help="Serve on this unix socket instead of TCP.")
+    parser.add_argument("--latency_window", type=int, default=1000, help="Requests covered by the p50/p95 stats.")
+    parser.add_argument("--threads", type=int, default=0, help="Torch intra-op threads (0 = default).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    start = time.perf_counter()
+    synthesizer = Synthesizer(args.plbert_dir, args.styletts2_checkpoint)
+    logging.info("Loaded PL‑BERT package and StyleTTS2 model in %.1f s", time.perf_counter() - start)
+    server = make_server(synthesizer, args.host, args.port, args.unix_socket, args.latency_window)
+    # Stop cleanly (and report the latency summary) on SIGTERM as well as Ctrl-C.
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    logging.info("Serving on %s", args.unix_socket or f"http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+        logging.info("Latency summary: %s", json.dumps(server.stats.summary()))
+
+
+if __name__ == "__main__":
+    main()
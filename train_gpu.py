@@ -40,27 +40,19 @@ if os.path.exists(plbert_dir):
     all_files = os.listdir(plbert_dir)
     print(f"  Files in directory: {all_files}")
 
-    # Create a proper checkpoint if needed
-    if 'pytorch_model.bin' in all_files and 'step_000001.pt' not in all_files:
-        print("  Converting pytorch_model.bin to step_000001.pt format...")
-        import torch
-        # Load the model weights
-        model_path = os.path.join(plbert_dir, 'pytorch_model.bin')
-        state_dict = torch.load(model_path, map_location='cpu', weights_only=False)
-
-        # Save in the expected format for StyleTTS2
-        checkpoint = {
-            'model': state_dict,
-            'iteration': 1,
-            'optimizer': None,
-            'learning_rate': 1e-5,
-            'config': {}
-        }
-        checkpoint_path = os.path.join(plbert_dir, 'step_000001.pt')
-        torch.save(checkpoint, checkpoint_path)
+    # Create a proper checkpoint if needed (safetensors: memory-mapped, no pickle)
+    if 'pytorch_model.bin' in all_files and 'step_000001.safetensors' not in all_files:
+        print("  Converting pytorch_model.bin to step_000001.safetensors format...")
+        from safetensors.torch import save_file
+        sys.path.insert(0, 'training')
+        from pack import WEIGHTS_NAME, load_encoder_state
+        # Encoder weights only ('albert.' prefix stripped, MLM head dropped), exactly as training/pack.py writes them
+        state_dict = load_encoder_state(plbert_dir)
+        checkpoint_path = os.path.join(plbert_dir, WEIGHTS_NAME)
+        save_file(state_dict, checkpoint_path, metadata={'format': 'pt'})
         print(f"  ✓ Created {checkpoint_path}")
-    elif 'step_000001.pt' in all_files:
-        print("  ✓ Found step_000001.pt checkpoint")
+    elif 'step_000001.safetensors' in all_files:
+        print("  ✓ Found step_000001.safetensors checkpoint")
 else:
     print("✗ Somali PL-BERT not found!")
     sys.exit(1)
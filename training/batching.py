@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""
+Length‑bucketed batching for PL‑BERT masked LM training.  Padding every
+example to `max_length` wastes most attention FLOPs on Somali sentences,
+which are usually far shorter than 256 phonemes.  This module provides:
+
+* `LengthGroupedSampler` – shuffles the data, then sorts each window of
+  `mega_batch_mult` batches by length so every batch holds sequences of
+  similar length.  Batch order is shuffled again, so training still sees
+  a random mix of lengths from step to step.
+* `CustomMLMDataCollator` – pads only to the longest sequence in the batch,
+  rounded up to a multiple of 8, and builds the tensors directly in torch.
+  Masking is done by `masking.MLMMasker`, either in the collator or, with
+  `apply_mask=False`, by the trainer on the model's device.
+* `BucketedTrainer` – a HuggingFace `Trainer` that uses the sampler above,
+  applies an optional `MLMMasker` to batches once they are on the device,
+  and drives the same `step_callbacks` as the lean engine (`metrics.py`),
+  e.g. for tokens/sec, padding ratio and data‑wait logging.
+* `padding_report` – the padding ratio of fixed‑length batches versus
+  bucketed batches for a dataset, logged once before training.
+"""
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+from transformers import Trainer, TrainerCallback
+
+from masking import MLMMasker, fixed_mask_seed
+from metrics import call_callbacks
+
+
+def sequence_lengths(dataset) -> np.ndarray:
+    """Length of every `input_ids` sequence in `dataset`."""
+    if hasattr(dataset, "lengths"):
+        return np.asarray(dataset.lengths())
+    return np.fromiter((len(ids) for ids in dataset["input_ids"]), dtype=np.int64, count=len(dataset))
+
+
+def round_up(n: int, multiple: int) -> int:
+    return -(-n // multiple) * multiple
+
+
+class LengthGroupedSampler(Sampler):
+    """Yield indices so that consecutive `batch_size` runs have similar lengths."""
+
+    def __init__(self, lengths: Sequence[int], batch_size: int, shuffle: bool = True,
+                 seed: int = 0, mega_batch_mult: int = 50, num_replicas: int = 1, rank: int = 0):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.mega_batch_mult = mega_batch_mult
+        # With num_replicas > 1 every rank builds the same global batch order
+        # and keeps every num_replicas-th batch starting at its rank.
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+        # Batches of the current epoch already consumed before a resume.
+        self.skip_batches = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        if self.num_replicas == 1 and not self.skip_batches:
+            return len(self.lengths)
+        return sum(len(batch) for batch in self.batches())
+
+    def batches(self) -> List[np.ndarray]:
+        """Index batches (of this rank) in the order they are yielded."""
+        batches = self._global_batches()
+        if self.num_replicas > 1:
+            if self.shuffle:
+                # Every rank must run the same number of training steps.
+                batches = batches[:len(batches) - len(batches) % self.num_replicas]
+            batches = batches[self.rank::self.num_replicas]
+        return batches[self.skip_batches:]
+
+    def _global_batches(self) -> List[np.ndarray]:
+        n = len(self.lengths)
+        if not self.shuffle:
+            order = np.argsort(self.lengths, kind="stable")
+            return [order[i:i + self.batch_size] for i in range(0, n, self.batch_size)]
+        rng = np.random.default_rng((self.seed, self.epoch))
+        perm = rng.permutation(n)
+        mega = self.batch_size * self.mega_batch_mult
+        batches = []
+        for start in range(0, n, mega):
+            chunk = perm[start:start + mega]
+            chunk = chunk[np.argsort(-self.lengths[chunk], kind="stable")]
+            batches.extend(chunk[i:i + self.batch_size] for i in range(0, len(chunk), self.batch_size))
+        # Only the very last batch can be short; keep it last so the
+        # DataLoader's fixed-size batching stays aligned with ours.
+        tail = [batches.pop()] if batches and len(batches[-1]) < self.batch_size else []
+        return [batches[i] for i in rng.permutation(len(batches))] + tail
+
+    def __iter__(self):
+        batches = self.batches()
+        if not batches:
+            return iter(())
+        return iter(np.concatenate(batches).tolist())
+
+
+def padding_report(lengths: Sequence[int], batch_size: int, max_length: int,
+                   sampler: Optional[LengthGroupedSampler] = None, pad_to_multiple_of: int = 8) -> Dict[str, float]:
+    """Fraction of padding tokens with fixed `max_length` batches vs bucketed dynamic padding."""
+    lengths = np.minimum(np.asarray(lengths), max_length)
+    real = int(lengths.sum())
+    fixed = len(lengths) * max_length
+    sampler = sampler or LengthGroupedSampler(lengths, batch_size)
+    dynamic = 0
+    for batch in sampler.batches():
+        if len(batch):
+            width = min(round_up(int(lengths[batch].max()), pad_to_multiple_of), max_length)
+            dynamic += len(batch) * width
+    return {
+        "fixed_padding_ratio": 1 - real / fixed if fixed else 0.0,
+        "bucketed_padding_ratio": 1 - real / dynamic if dynamic else 0.0,
+    }
+
+
+class CustomMLMDataCollator:
+    """Pad a batch to its longest sequence (multiple of 8) and apply MLM masking."""
+
+    # Per-position fields of packed examples (see `packing.py`) and their padding values.
+    extra_fields = {"sequence_ids": -1, "position_ids": 0}
+
+    def __init__(self, token_to_id, mlm_probability=0.15, max_length=256, pad_to_multiple_of=8,
+                 whole_word_mask=False, apply_mask=True, p2g=False):
+        self.token_to_id = token_to_id
+        self.mlm_probability = mlm_probability
+        self.max_length = max_length
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.pad_token_id = token_to_id["<pad>"]
+        self.mask_token_id = token_to_id["<mask>"]
+        self.masker = MLMMasker(token_to_id, mlm_probability, whole_word=whole_word_mask)
+        # With apply_mask=False batches are returned unmasked and the trainer
+        # masks them after moving them to the model's device.
+        self.apply_mask = apply_mask
+        # With p2g=True, `grapheme_ids` are padded and returned as `p2g_labels`.
+        self.p2g = p2g
+
+    def pad(self, sequences, extra: Optional[Dict[str, list]] = None) -> Dict[str, torch.Tensor]:
+        lengths = torch.tensor([min(len(seq), self.max_length) for seq in sequences], dtype=torch.long)
+        width = int(lengths.max()) if len(sequences) else 0
+        width = min(round_up(max(width, 1), self.pad_to_multiple_of), self.max_length)
+        batch = {"input_ids": self.pad_rows(sequences, lengths, width, self.pad_token_id)}
+        batch["attention_mask"] = (torch.arange(width) < lengths[:, None]).long()
+        for key, rows in (extra or {}).items():
+            batch[key] = self.pad_rows(rows, lengths, width, self.extra_fields.get(key, self.pad_token_id))
+        return batch
+
+    @staticmethod
+    def pad_rows(rows, lengths: torch.Tensor, width: int, value: int) -> torch.Tensor:
+        out = torch.full((len(rows), width), value, dtype=torch.long)
+        for i, (row, n) in enumerate(zip(rows, lengths.tolist())):
+            out[i, :n] = torch.as_tensor(row[:n])
+        return out
+
+    def __call__(self, examples):
+        extra = {key: [example[key] for example in examples] for key in self.extra_fields if key in examples[0]}
+        if self.p2g:
+            extra["grapheme_ids"] = [example["grapheme_ids"] for example in examples]
+        batch = self.pad([example["input_ids"] for example in examples], extra)
+        if self.p2g:
+            graphemes = batch.pop("grapheme_ids")
+            batch["p2g_labels"] = graphemes.masked_fill_(graphemes == self.pad_token_id, -100)
+        return self.masker.apply(batch) if self.apply_mask else batch
+
+
+class _StepCallbackBridge(TrainerCallback):
+    """Forward `Trainer` events to the `step_callbacks` of a `BucketedTrainer`."""
+
+    def __init__(self, callbacks):
+        self.callbacks = callbacks
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        call_callbacks(self.callbacks, "on_train_begin")
+
+    def on_substep_end(self, args, state, control, **kwargs):
+        # Micro-batch inside a gradient accumulation: the next batch is fetched right away.
+        call_callbacks(self.callbacks, "on_fetch_begin")
+
+    def on_step_end(self, args, state, control, **kwargs):
+        call_callbacks(self.callbacks, "on_step_end", state.global_step)
+
+    def on_train_end(self, args, state, control, **kwargs):
+        call_callbacks(self.callbacks, "on_train_end")
+
+
+class BucketedTrainer(Trainer):
+    """`Trainer` with length‑grouped batches, on‑device masking and step callbacks."""
+
+    def __init__(self, *args, train_lengths=None, eval_lengths=None, masker=None, step_callbacks=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.train_lengths = train_lengths
+        self.eval_lengths = eval_lengths
+        self.masker = masker
+        self.step_callbacks = list(step_callbacks or [])
+        self.add_callback(_StepCallbackBridge(self.step_callbacks))
+
+    def _get_train_sampler(self):
+        if self.train_lengths is None:
+            self.train_lengths = sequence_lengths(self.train_dataset)
+        return LengthGroupedSampler(self.train_lengths, self._train_batch_size, seed=self.args.seed)
+
+    def _get_eval_sampler(self, eval_dataset):
+        lengths = self.eval_lengths if eval_dataset is self.eval_dataset else None
+        if lengths is None:
+            lengths = sequence_lengths(eval_dataset)
+        return LengthGroupedSampler(lengths, self.args.eval_batch_size, shuffle=False)
+
+    def _prepare_inputs(self, inputs):
+        inputs = super()._prepare_inputs(inputs)
+        if self.masker is not None and "labels" not in inputs:
+            inputs = self.masker.apply(inputs)
+        return inputs
+
+    def evaluate(self, *args, **kwargs):
+        with fixed_mask_seed(self.args.seed, self.args.device):
+            metrics = super().evaluate(*args, **kwargs)
+        # Evaluation between steps is not data-loading time.
+        call_callbacks(self.step_callbacks, "on_fetch_begin")
+        return metrics
+
+    def _save_checkpoint(self, *args, **kwargs):
+        super()._save_checkpoint(*args, **kwargs)
+        call_callbacks(self.step_callbacks, "on_fetch_begin")
+
+    def prediction_step(self, model, inputs, prediction_loss_only, ignore_keys=None):
+        # Mask before the parent checks for labels to decide whether to compute the loss.
+        return super().prediction_step(model, self._prepare_inputs(inputs), prediction_loss_only, ignore_keys)
+
+    def training_step(self, model, inputs):
+        call_callbacks(self.step_callbacks, "on_batch_ready", inputs)
+        return super().training_step(model, inputs)
+
+    def log(self, logs: Dict[str, float]) -> None:
+        call_callbacks(self.step_callbacks, "on_log", logs, self.state.global_step)
+        super().log(logs)
+        call_callbacks(self.step_callbacks, "on_fetch_begin")
+
+
+def log_padding_report(lengths, batch_size: int, max_length: int, seed: int = 0):
+    report = padding_report(lengths, batch_size, max_length, LengthGroupedSampler(lengths, batch_size, seed=seed))
+    logging.info("Padding ratio: %.1f%% with fixed max_length=%d, %.1f%% with length-bucketed batches",
+                 100 * report["fixed_padding_ratio"], max_length, 100 * report["bucketed_padding_ratio"])
+    return report
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Benchmark the MLM data collator against the training step it feeds.  Times,
+per batch of `--batch_size` sentences:
+
+* the original collator (fixed `max_length` padding with Python lists and a
+  `torch.full` probability matrix, kept below as the reference);
+* the current `CustomMLMDataCollator` padding to the batch's longest
+  sequence, with `MLMMasker` applied in the collator;
+* one forward/backward pass of the 6‑layer ALBERT from `train_plbert_so.py`
+  on the current collator's batches.
+
+The collator is a data‑loader bottleneck when its time per batch
+approaches the step time; the report prints both and their ratio.
+
+Example:
+
+    python training/bench_collator.py --data data_plbert/dev_tok --token_maps phonemize/token_maps.pkl
+
+"""
+import argparse
+import pickle
+import time
+
+import torch
+from transformers import AlbertConfig, AlbertForMaskedLM
+
+from batching import CustomMLMDataCollator, LengthGroupedSampler, sequence_lengths
+from train_plbert_so import load_split
+
+
+class ReferenceCollator:
+    """The collator `train_plbert_so.py` used before dynamic padding."""
+
+    def __init__(self, token_to_id, mlm_probability=0.15, max_length=256):
+        self.mlm_probability = mlm_probability
+        self.max_length = max_length
+        self.pad_token_id = token_to_id["<pad>"]
+        self.mask_token_id = token_to_id["<mask>"]
+
+    def __call__(self, examples):
+        padded_inputs = []
+        attention_masks = []
+        for example in examples:
+            input_ids = list(example["input_ids"][:self.max_length])
+            padding_length = self.max_length - len(input_ids)
+            padded_inputs.append(input_ids + [self.pad_token_id] * padding_length)
+            attention_masks.append([1] * len(input_ids) + [0] * padding_length)
+        input_ids = torch.tensor(padded_inputs, dtype=torch.long)
+        attention_mask = torch.tensor(attention_masks, dtype=torch.long)
+        labels = input_ids.clone()
+        probability_matrix = torch.full(input_ids.shape, self.mlm_probability)
+        probability_matrix.masked_fill_(input_ids == self.pad_token_id, value=0.0)
+        masked_indices = torch.bernoulli(probability_matrix).bool()
+        labels[~masked_indices] = -100
+        input_ids[masked_indices] = self.mask_token_id
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+def time_collator(collator, batches) -> float:
+    start = time.perf_counter()
+    for examples in batches:
+        collator(examples)
+    return (time.perf_counter() - start) / len(batches)
+
+
+def time_steps(model, collator, batches) -> float:
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
+    start = time.perf_counter()
+    for examples in batches:
+        loss = model(**collator(examples)).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+    return (time.perf_counter() - start) / len(batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MLM collator against the training step.")
+    parser.add_argument("--data", type=str, required=True, help="JSONL file or pre-tokenised directory.")
+    parser.add_argument("--token_maps", type=str, required=True, help="Pickled token_to_id mapping.")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--max_len", type=int, default=256)
+    parser.add_argument("--batches", type=int, default=50, help="Batches timed for each collator.")
+    parser.add_argument("--steps", type=int, default=5, help="Training steps timed.")
+    parser.add_argument("--whole_word_mask", action="store_true")
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    with open(args.token_maps, "rb") as f:
+        token_to_id = pickle.load(f)
+    dataset = load_split(args.data, token_to_id)
+    sampler = LengthGroupedSampler(sequence_lengths(dataset), args.batch_size)
+    index_batches = sampler.batches()[:args.batches]
+    batches = [[dataset[int(i)] for i in batch] for batch in index_batches]
+
+    reference = ReferenceCollator(token_to_id, max_length=args.max_len)
+    collator = CustomMLMDataCollator(token_to_id, max_length=args.max_len, whole_word_mask=args.whole_word_mask)
+    ref_time = time_collator(reference, batches)
+    new_time = time_collator(collator, batches)
+
+    config = AlbertConfig(vocab_size=len(token_to_id), embedding_size=128, hidden_size=512, num_hidden_layers=6,
+                          num_attention_heads=8, intermediate_size=2048, max_position_embeddings=args.max_len,
+                          pad_token_id=token_to_id["<pad>"])
+    model = AlbertForMaskedLM(config)
+    step_time = time_steps(model, collator, batches[:args.steps])
+
+    print(f"batches:              {len(batches)} x {args.batch_size} sentences")
+    print(f"reference collator:   {ref_time * 1e3:.2f} ms/batch")
+    print(f"current collator:     {new_time * 1e3:.2f} ms/batch ({ref_time / new_time:.1f}x faster)")
+    print(f"train step:           {step_time * 1e3:.1f} ms/batch")
+    print(f"collator / step:      {100 * new_time / step_time:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
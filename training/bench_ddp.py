@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Single‑machine scaling benchmark for data‑parallel PL‑BERT training on CPU.
+For every process count in `--procs` it starts that many ranks (gloo
+backend, cores split evenly between them, as `torchrun` does with
+`distributed.init_distributed`), trains the 6‑layer ALBERT from
+`train_plbert_so.py` with the lean engine for `--warmup` + `--steps`
+optimisation steps, and reports the global tokens/sec over the timed steps
+and the scaling efficiency relative to one process:
+
+    efficiency(N) = tokens_per_sec(N) / (N * tokens_per_sec(1))
+
+The per‑rank batch size is fixed, so the global batch grows with N.
+
+Example:
+
+    python training/bench_ddp.py --data data_plbert/train_tok --token_maps phonemize/token_maps.pkl \
+        --procs 1 2 4 8 --output runs/bench_ddp.json
+
+"""
+import argparse
+import json
+import os
+import pickle
+import socket
+import tempfile
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from transformers import AlbertConfig, AlbertForMaskedLM
+
+from batching import CustomMLMDataCollator, sequence_lengths
+from bench_engines import TimedLeanTrainer
+from distributed import init_distributed, threads_per_rank
+from lean_loop import LeanArguments
+from metrics import ThroughputMetrics
+from train_plbert_so import load_split
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_rank(rank: int, world_size: int, port: int, args, result_path: str):
+    os.environ.update({"RANK": str(rank), "LOCAL_RANK": str(rank), "WORLD_SIZE": str(world_size),
+                       "LOCAL_WORLD_SIZE": str(world_size), "MASTER_ADDR": "127.0.0.1", "MASTER_PORT": str(port)})
+    dist_info = init_distributed(threads_per_rank(world_size))
+    torch.manual_seed(0)
+    with open(args.token_maps, "rb") as f:
+        token_to_id = pickle.load(f)
+    dataset = load_split(args.data, token_to_id)
+    collator = CustomMLMDataCollator(token_to_id, max_length=args.max_len, apply_mask=False)
+    config = AlbertConfig(vocab_size=len(token_to_id), embedding_size=128, hidden_size=512, num_hidden_layers=6,
+                          num_attention_heads=8, intermediate_size=2048, max_position_embeddings=args.max_len,
+                          pad_token_id=token_to_id["<pad>"])
+    total = args.warmup + args.steps
+    with tempfile.TemporaryDirectory() as out_dir:
+        training_args = LeanArguments(output_dir=out_dir, max_steps=total, per_device_train_batch_size=args.batch_size,
+                                      logging_steps=1, save_strategy="no", evaluation_strategy="no", seed=0)
+        trainer = TimedLeanTrainer(AlbertForMaskedLM(config), training_args, train_dataset=dataset,
+                                   data_collator=collator, train_lengths=sequence_lengths(dataset),
+                                   masker=collator.masker, dist_info=dist_info,
+                                   step_callbacks=[ThroughputMetrics(window=args.steps, is_main=dist_info.is_main)])
+        trainer.train()
+    if dist_info.is_main:
+        # The metrics window covers exactly the timed steps; tokens are summed over ranks.
+        tokens_per_sec = trainer.log_history[total - 1]["tokens_per_sec"]
+        elapsed = trainer.times[total - 1] - trainer.times[args.warmup - 1]
+        with open(result_path, "w") as f:
+            json.dump({"procs": world_size, "threads_per_rank": torch.get_num_threads(),
+                       "tokens_per_sec": tokens_per_sec, "steps_per_sec": args.steps / elapsed}, f)
+    if dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens/sec scaling of CPU data-parallel PL-BERT training.")
+    parser.add_argument("--data", type=str, required=True, help="JSONL file or pre-tokenised directory.")
+    parser.add_argument("--token_maps", type=str, required=True, help="Pickled token_to_id mapping.")
+    parser.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4, 8], help="Process counts to run.")
+    parser.add_argument("--batch_size", type=int, default=32, help="Batch size per rank.")
+    parser.add_argument("--max_len", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=20, help="Timed optimisation steps.")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed steps before timing.")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.procs:
+            result_path = os.path.join(tmp, f"procs{n}.json")
+            mp.spawn(run_rank, args=(n, free_port(), args, result_path), nprocs=n, join=True)
+            with open(result_path) as f:
+                results.append(json.load(f))
+    base = next((r["tokens_per_sec"] for r in results if r["procs"] == 1), None)
+    print(f"{'procs':>5} {'threads/rank':>12} {'tokens/sec':>12} {'steps/sec':>10} {'efficiency':>10}")
+    for r in results:
+        r["efficiency"] = r["tokens_per_sec"] / (r["procs"] * base) if base else None
+        eff = f"{100 * r['efficiency']:.0f}%" if base else "-"
+        print(f"{r['procs']:>5} {r['threads_per_rank']:>12} {r['tokens_per_sec']:>12.1f} "
+              f"{r['steps_per_sec']:>10.3f} {eff:>10}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
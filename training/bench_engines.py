@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Reproducible steps/sec comparison of the two training engines in
+`train_plbert_so.py`: the HuggingFace `Trainer` path (`BucketedTrainer`)
+and the lean PyTorch loop (`LeanTrainer`), optionally with bf16 autocast
+and `torch.compile`.  Every variant trains the same freshly initialised
+6‑layer ALBERT (fixed seed) on the same length‑grouped batches for
+`--steps` optimisation steps in its own process; the reported rate is
+measured after `--warmup` steps, so one‑off costs such as compilation are
+excluded.
+
+Example:
+
+    python training/bench_engines.py --data data_plbert/train_tok --token_maps phonemize/token_maps.pkl \
+        --variants trainer lean lean+bf16 lean+compile
+
+"""
+import argparse
+import multiprocessing
+import pickle
+import tempfile
+import time
+
+import torch
+from transformers import AlbertConfig, AlbertForMaskedLM, TrainerCallback, TrainingArguments
+
+from batching import BucketedTrainer, CustomMLMDataCollator, sequence_lengths
+from lean_loop import LeanArguments, LeanTrainer
+from train_plbert_so import load_split
+
+
+class StepTimer(TrainerCallback):
+    def __init__(self):
+        self.times = []
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.times.append(time.perf_counter())
+
+
+class TimedLeanTrainer(LeanTrainer):
+    """`LeanTrainer` recording the time at which every optimisation step finishes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.times = []
+
+    def log(self, logs):
+        self.times.append(time.perf_counter())
+        super().log(logs)
+
+
+def run_variant(variant: str, args) -> float:
+    torch.manual_seed(0)
+    torch.set_num_threads(args.threads or torch.get_num_threads())
+    with open(args.token_maps, "rb") as f:
+        token_to_id = pickle.load(f)
+    dataset = load_split(args.data, token_to_id)
+    lengths = sequence_lengths(dataset)
+    collator = CustomMLMDataCollator(token_to_id, max_length=args.max_len, apply_mask=False)
+    config = AlbertConfig(vocab_size=len(token_to_id), embedding_size=128, hidden_size=512, num_hidden_layers=6,
+                          num_attention_heads=8, intermediate_size=2048, max_position_embeddings=args.max_len,
+                          pad_token_id=token_to_id["<pad>"])
+    model = AlbertForMaskedLM(config)
+    engine, *options = variant.split("+")
+    total = args.warmup + args.steps
+    with tempfile.TemporaryDirectory() as out_dir:
+        if engine == "trainer":
+            training_args = TrainingArguments(
+                output_dir=out_dir, max_steps=total, per_device_train_batch_size=args.batch_size,
+                learning_rate=5e-5, logging_steps=10 ** 9, save_strategy="no", report_to=[],
+                no_cuda=not torch.cuda.is_available(), remove_unused_columns=False, bf16="bf16" in options,
+                disable_tqdm=True, seed=0)
+            timer = StepTimer()
+            trainer = BucketedTrainer(model=model, args=training_args, train_dataset=dataset,
+                                      data_collator=collator, train_lengths=lengths, masker=collator.masker,
+                                      callbacks=[timer])
+            trainer.train()
+            times = timer.times
+        else:
+            training_args = LeanArguments(
+                output_dir=out_dir, max_steps=total, per_device_train_batch_size=args.batch_size,
+                logging_steps=1, save_strategy="no", evaluation_strategy="no",
+                bf16="bf16" in options, compile="compile" in options, seed=0)
+            trainer = TimedLeanTrainer(model, training_args, train_dataset=dataset, data_collator=collator,
+                                       train_lengths=lengths, masker=collator.masker)
+            trainer.train()
+            times = trainer.times[:total]
+    return args.steps / (times[total - 1] - times[args.warmup - 1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare steps/sec of the Trainer and lean training engines.")
+    parser.add_argument("--data", type=str, required=True, help="JSONL file or pre-tokenised directory.")
+    parser.add_argument("--token_maps", type=str, required=True, help="Pickled token_to_id mapping.")
+    parser.add_argument("--variants", nargs="+", default=["trainer", "lean"],
+                        help="Engines to run: trainer, lean, with optional +bf16 / +compile (e.g. lean+bf16).")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--max_len", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=20, help="Timed optimisation steps.")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed steps before timing.")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads per run (0 = default).")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for variant in args.variants:
+        with ctx.Pool(1) as pool:
+            results[variant] = pool.apply(run_variant, (variant, args))
+        print(f"{variant:<16} {results[variant]:.3f} steps/sec")
+    if "trainer" in results:
+        for variant, rate in results.items():
+            if variant != "trainer":
+                print(f"{variant} vs trainer: {rate / results['trainer']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
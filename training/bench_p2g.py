@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Cost of the P2G objective relative to MLM alone.  Runs the same batches
+through the 6‑layer ALBERT from `train_plbert_so.py` once as
+`AlbertForMaskedLM` (MLM only) and once as `AlbertForMLMAndP2G` (joint
+objective), each in a fresh process, and reports the time per training
+step and the peak memory of each: CUDA peak allocation on a GPU, otherwise
+the process's peak resident set size.
+
+Example:
+
+    python training/bench_p2g.py --data data_plbert/dev_tok --token_maps phonemize/token_maps.pkl
+
+"""
+import argparse
+import multiprocessing
+import pickle
+import resource
+import time
+
+import torch
+from transformers import AlbertConfig, AlbertForMaskedLM
+
+from batching import CustomMLMDataCollator, LengthGroupedSampler, sequence_lengths
+from p2g import AlbertForMLMAndP2G
+from train_plbert_so import load_split
+
+
+def run_mode(p2g: bool, args) -> dict:
+    torch.manual_seed(0)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    with open(args.token_maps, "rb") as f:
+        token_to_id = pickle.load(f)
+    dataset = load_split(args.data, token_to_id, p2g=True)
+    sampler = LengthGroupedSampler(sequence_lengths(dataset), args.batch_size, seed=0)
+    collator = CustomMLMDataCollator(token_to_id, max_length=args.max_len, p2g=p2g)
+    batches = [collator([dataset[int(i)] for i in batch]) for batch in sampler.batches()[:args.warmup + args.steps]]
+    config = AlbertConfig(vocab_size=len(token_to_id), embedding_size=128, hidden_size=512, num_hidden_layers=6,
+                          num_attention_heads=8, intermediate_size=2048, max_position_embeddings=args.max_len,
+                          pad_token_id=token_to_id["<pad>"])
+    model = (AlbertForMLMAndP2G(config) if p2g else AlbertForMaskedLM(config)).to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
+    elapsed = 0.0
+    for step, batch in enumerate(batches):
+        batch = {k: v.to(device) for k, v in batch.items()}
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        model(**batch).loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        if step >= args.warmup:
+            elapsed += time.perf_counter() - start
+    if device.type == "cuda":
+        peak_mb = torch.cuda.max_memory_allocated() / 2**20
+    else:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"step_ms": 1e3 * elapsed / args.steps, "peak_mb": peak_mb,
+            "params": sum(p.numel() for p in model.parameters())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare step time and memory of MLM vs MLM+P2G.")
+    parser.add_argument("--data", type=str, required=True, help="JSONL file or pre-tokenised directory with graphemes.")
+    parser.add_argument("--token_maps", type=str, required=True, help="Pickled token_to_id mapping.")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--max_len", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=10, help="Timed training steps per mode.")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed steps before timing.")
+    args = parser.parse_args()
+
+    # A fresh process per mode keeps the peak memory figures independent.
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for name, p2g in (("MLM", False), ("MLM+P2G", True)):
+        with ctx.Pool(1) as pool:
+            results[name] = pool.apply(run_mode, (p2g, args))
+    base = results["MLM"]
+    memory = "CUDA peak allocated" if torch.cuda.is_available() else "peak RSS"
+    print(f"{'objective':<10} {'step (ms)':>10} {memory + ' (MB)':>24} {'params':>12}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['step_ms']:>10.1f} {r['peak_mb']:>24.1f} {r['params']:>12,}")
+    joint = results["MLM+P2G"]
+    print(f"P2G overhead: {100 * (joint['step_ms'] / base['step_ms'] - 1):+.1f}% step time, "
+          f"{joint['peak_mb'] - base['peak_mb']:+.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
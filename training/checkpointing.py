@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""
+Step‑level training checkpoints for the lean engine (`lean_loop.py`).
+
+A checkpoint `checkpoint-<step>/` holds everything needed to continue a run
+exactly where it stopped:
+
+* `model.safetensors` + `config.json` – also loadable with `from_pretrained`;
+* `optimizer.safetensors` – the optimiser state tensors, with the parameter
+  groups as JSON in the file's metadata;
+* `rng.safetensors` – the torch CPU (and CUDA) generator state of every rank;
+* `trainer_state.json` – global step, epoch, number of batches already
+  consumed in that epoch, scheduler state, Python/NumPy RNG state and the
+  log history.
+
+`AsyncCheckpointer.save` only copies the state to CPU memory on the calling
+thread; serialisation happens on a background thread while training
+continues.  At most one write is in flight (the next save waits for the
+previous one), files are written to `checkpoint-<step>.tmp` and renamed
+when complete, so a crash never leaves a half‑written checkpoint behind,
+and only the newest `save_total_limit` checkpoints are kept.
+"""
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+import torch.distributed as dist
+from safetensors import safe_open
+from safetensors.torch import load_file, save_file
+
+TRAINER_STATE = "trainer_state.json"
+
+
+def list_checkpoints(output_dir: str) -> List[str]:
+    """Complete `checkpoint-<step>` directories in `output_dir`, oldest first."""
+    if not os.path.isdir(output_dir):
+        return []
+    names = [d for d in os.listdir(output_dir) if d.startswith("checkpoint-") and d.split("-")[-1].isdigit()]
+    return [os.path.join(output_dir, d) for d in sorted(names, key=lambda d: int(d.split("-")[-1]))]
+
+
+def latest_checkpoint(output_dir: str) -> Optional[str]:
+    checkpoints = list_checkpoints(output_dir)
+    return checkpoints[-1] if checkpoints else None
+
+
+def _cpu_copy(tensor: torch.Tensor) -> torch.Tensor:
+    return tensor.detach().to("cpu", copy=True).contiguous()
+
+
+def rng_state(device: torch.device) -> Dict:
+    state = {"cpu": torch.get_rng_state(), "python": random.getstate(), "numpy": np.random.get_state()}
+    if device.type == "cuda":
+        state["cuda"] = torch.cuda.get_rng_state(device)
+    return state
+
+
+def set_rng_state(state: Dict, device: torch.device):
+    torch.set_rng_state(state["cpu"])
+    if device.type == "cuda" and "cuda" in state:
+        torch.cuda.set_rng_state(state["cuda"], device)
+    version, internal, gauss = state["python"]
+    random.setstate((version, tuple(internal), gauss))
+    name, keys, pos, has_gauss, cached = state["numpy"]
+    np.random.set_state((name, np.asarray(keys, dtype=np.uint32), pos, has_gauss, cached))
+
+
+def _optimizer_tensors(optimizer: torch.optim.Optimizer):
+    """Split an optimiser state dict into CPU tensors and JSON‑serialisable metadata."""
+    state_dict = optimizer.state_dict()
+    tensors, scalars = {}, {}
+    for idx, param_state in state_dict["state"].items():
+        for key, value in param_state.items():
+            if torch.is_tensor(value):
+                tensors[f"state.{idx}.{key}"] = _cpu_copy(value)
+            else:
+                scalars[f"{idx}.{key}"] = value
+    metadata = {"param_groups": json.dumps(state_dict["param_groups"]), "scalars": json.dumps(scalars)}
+    return tensors, metadata
+
+
+def load_optimizer(optimizer: torch.optim.Optimizer, path: str):
+    with safe_open(path, framework="pt") as f:
+        metadata = f.metadata()
+        state = {}
+        for name in f.keys():
+            _, idx, key = name.split(".", 2)
+            state.setdefault(int(idx), {})[key] = f.get_tensor(name)
+    for name, value in json.loads(metadata["scalars"]).items():
+        idx, key = name.split(".", 1)
+        state.setdefault(int(idx), {})[key] = value
+    optimizer.load_state_dict({"state": state, "param_groups": json.loads(metadata["param_groups"])})
+
+
+class AsyncCheckpointer:
+    def __init__(self, output_dir: str, save_total_limit: Optional[int] = None, is_main: bool = True):
+        self.output_dir = output_dir
+        self.save_total_limit = save_total_limit
+        self.is_main = is_main
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+    def save(self, step: int, model, optimizer, scheduler, device: torch.device, trainer_state: Dict):
+        """Snapshot the training state to CPU and write it in the background (rank 0)."""
+        rng = rng_state(device)
+        if dist.is_available() and dist.is_initialized():
+            # Every rank has its own RNG stream; model and optimiser are replicas.
+            ranks = [None] * dist.get_world_size()
+            dist.all_gather_object(ranks, rng)
+        else:
+            ranks = [rng]
+        if not self.is_main:
+            return
+        self.wait()
+        model_state = {k: _cpu_copy(v) for k, v in model.state_dict().items()}
+        optim_tensors, optim_meta = _optimizer_tensors(optimizer)
+        rng_tensors = {}
+        for r, state in enumerate(ranks):
+            rng_tensors[f"rank{r}.cpu"] = state.pop("cpu")
+            if "cuda" in state:
+                rng_tensors[f"rank{r}.cuda"] = state.pop("cuda")
+            state["numpy"] = [v.tolist() if isinstance(v, np.ndarray) else v for v in state["numpy"]]
+        trainer_state = dict(trainer_state, global_step=step, scheduler=scheduler.state_dict(), rng=ranks)
+        self._thread = threading.Thread(
+            target=self._write, name=f"checkpoint-{step}",
+            args=(step, model.config, model_state, optim_tensors, optim_meta, rng_tensors, trainer_state))
+        self._thread.start()
+
+    def _write(self, step, config, model_state, optim_tensors, optim_meta, rng_tensors, trainer_state):
+        try:
+            final = os.path.join(self.output_dir, f"checkpoint-{step}")
+            tmp = final + ".tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            config.save_pretrained(tmp)
+            save_file(model_state, os.path.join(tmp, "model.safetensors"), metadata={"format": "pt"})
+            save_file(optim_tensors, os.path.join(tmp, "optimizer.safetensors"), metadata=optim_meta)
+            save_file(rng_tensors, os.path.join(tmp, "rng.safetensors"))
+            with open(os.path.join(tmp, TRAINER_STATE), "w") as f:
+                json.dump(trainer_state, f, indent=2)
+            shutil.rmtree(final, ignore_errors=True)
+            os.replace(tmp, final)
+            if self.save_total_limit:
+                for old in list_checkpoints(self.output_dir)[:-self.save_total_limit]:
+                    shutil.rmtree(old, ignore_errors=True)
+            logging.info("Saved checkpoint %s", final)
+        except BaseException as e:
+            self._error = e
+
+    def wait(self):
+        """Block until the pending write (if any) has finished; re‑raise its error."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing checkpoint failed") from error
+
+
+def load_checkpoint(path: str, model, optimizer, scheduler, device: torch.device, rank: int = 0) -> Dict:
+    """Restore model, optimiser and scheduler from `path` and return its trainer state.
+
+    The RNG state of this rank is returned under "rng" (to be applied with
+    `set_rng_state` right before training resumes).
+    """
+    model.load_state_dict(load_file(os.path.join(path, "model.safetensors"), device=str(device)))
+    load_optimizer(optimizer, os.path.join(path, "optimizer.safetensors"))
+    with open(os.path.join(path, TRAINER_STATE)) as f:
+        state = json.load(f)
+    scheduler.load_state_dict(state.pop("scheduler"))
+    rng_tensors = load_file(os.path.join(path, "rng.safetensors"))
+    rng = state["rng"][rank]
+    rng["cpu"] = rng_tensors[f"rank{rank}.cpu"]
+    if f"rank{rank}.cuda" in rng_tensors:
+        rng["cuda"] = rng_tensors[f"rank{rank}.cuda"]
+    state["rng"] = rng
+    return state
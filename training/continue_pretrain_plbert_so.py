@@ -18,6 +18,14 @@ Example:
       --model_name papercup-ai/multilingual-pl-bert \
       --out_dir runs/plbert_so/continue
 
+`--train` and `--dev` also accept directories compiled by
+`training/pretokenize.py`.  Batching and masking are shared with
+`train_plbert_so.py` (see `training/batching.py`).  As there, the default
+`--engine lean` runs the plain PyTorch loop of `training/lean_loop.py`,
+which writes step checkpoints as safetensors on a background thread and
+resumes bit‑exactly (`--resume`); `--engine trainer` uses the HuggingFace
+`Trainer`.
+
 """
 import argparse
 import json
@@ -28,8 +36,13 @@ from typing import Dict, List
 
 import torch
 from datasets import Dataset
-from transformers import (AlbertForMaskedLM, Trainer, TrainingArguments,
-                          DataCollatorForLanguageModeling)
+from transformers import AlbertForMaskedLM, TrainingArguments
+
+from batching import BucketedTrainer, CustomMLMDataCollator, log_padding_report, sequence_lengths
+from distributed import init_distributed
+from lean_loop import LeanArguments, LeanTrainer
+from metrics import make_step_callbacks
+from pretokenize import PretokenizedDataset, is_pretokenized
 
 
 def load_jsonl(path: str) -> List[Dict]:
@@ -46,18 +59,48 @@ def encode_data(data: List[Dict], token_to_id: Dict[str, int]) -> List[List[int]
     return encoded
 
 
+def load_split(path: str, token_to_id: Dict[str, int]):
+    """Memory‑map a pre‑tokenised directory, or encode a JSONL file into a Dataset."""
+    if is_pretokenized(path):
+        return PretokenizedDataset(path, token_to_id)
+    return Dataset.from_dict({"input_ids": encode_data(load_jsonl(path), token_to_id)})
+
+
 def main():
     parser = argparse.ArgumentParser(description="Continue pretraining multilingual PL‑BERT on Somali.")
-    parser.add_argument("--train", type=str, required=True)
-    parser.add_argument("--dev", type=str, required=True)
+    parser.add_argument("--train", type=str, required=True, help="Training JSONL file or pre-tokenised directory.")
+    parser.add_argument("--dev", type=str, required=True, help="Dev JSONL file or pre-tokenised directory.")
     parser.add_argument("--token_maps", type=str, required=True)
     parser.add_argument("--model_name", type=str, default="papercup-ai/multilingual-pl-bert")
     parser.add_argument("--out_dir", type=str, required=True)
     parser.add_argument("--epochs", type=int, default=1)
     parser.add_argument("--batch_size", type=int, default=64)
     parser.add_argument("--lr", type=float, default=1e-5)
+    parser.add_argument("--max_len", type=int, default=256, help="Maximum sequence length.")
+    parser.add_argument("--mlm_probability", type=float, default=0.15, help="Fraction of tokens to predict.")
+    parser.add_argument("--whole_word_mask", action="store_true", help="Mask whole '_'-delimited words.")
+    parser.add_argument("--engine", choices=["trainer", "lean"], default="lean",
+                        help="HuggingFace Trainer or the lean PyTorch loop in lean_loop.py.")
+    parser.add_argument("--grad_accum", type=int, default=1, help="Gradient accumulation steps.")
+    parser.add_argument("--bf16", action="store_true", help="bf16 autocast (CPU or GPU).")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the model (lean engine only).")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="torch threads per process (default: cores divided between local ranks under torchrun).")
+    parser.add_argument("--logging_steps", type=int, default=100, help="Log every N optimisation steps.")
+    parser.add_argument("--metrics_file", type=str, default=None,
+                        help="JSONL file for every log record (default: <out_dir>/metrics.jsonl).")
+    parser.add_argument("--metrics_window", type=int, default=100,
+                        help="Steps averaged for the logged throughput and timing metrics.")
+    parser.add_argument("--profile_steps", type=int, default=0,
+                        help="Record N steps with torch.profiler and write a Chrome trace to <out_dir>/profile.")
+    parser.add_argument("--profile_start", type=int, default=10, help="Step after which profiling starts.")
+    parser.add_argument("--save_steps", type=int, default=500,
+                        help="Checkpoint every N optimisation steps (0 = at the end of every epoch).")
+    parser.add_argument("--resume", nargs="?", const=True, default=None,
+                        help="Resume from a checkpoint directory (without a value: the latest in --out_dir).")
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
+    dist_info = init_distributed(args.threads)
 
     # Load token map
     with open(args.token_maps, "rb") as f:
@@ -73,42 +116,68 @@ def main():
         logging.info("Resizing embeddings: pretrained vocab %d → new vocab %d", current_vocab, vocab_size)
         model.resize_token_embeddings(vocab_size)
     # Load data
-    train_data = load_jsonl(args.train)
-    dev_data = load_jsonl(args.dev)
-    train_enc = encode_data(train_data, token_to_id)
-    dev_enc = encode_data(dev_data, token_to_id)
-    train_ds = Dataset.from_dict({"input_ids": train_enc})
-    dev_ds = Dataset.from_dict({"input_ids": dev_enc})
-    # Data collator
-    data_collator = DataCollatorForLanguageModeling(
-        tokenizer=None,
-        mlm=True,
-        mlm_probability=0.15,
-        pad_token_id=token_to_id["<pad>"],
-    )
+    train_ds = load_split(args.train, token_to_id)
+    dev_ds = load_split(args.dev, token_to_id)
+    # Data collator: pads each length-grouped batch to its longest sequence
+    max_len = min(args.max_len, model.config.max_position_embeddings)
+    data_collator = CustomMLMDataCollator(token_to_id=token_to_id, mlm_probability=args.mlm_probability,
+                                          max_length=max_len, whole_word_mask=args.whole_word_mask,
+                                          apply_mask=False)
     # Training arguments
     os.makedirs(args.out_dir, exist_ok=True)
-    training_args = TrainingArguments(
-        output_dir=args.out_dir,
-        overwrite_output_dir=True,
-        evaluation_strategy="epoch",
-        save_strategy="epoch",
-        num_train_epochs=args.epochs,
-        per_device_train_batch_size=args.batch_size,
-        per_device_eval_batch_size=args.batch_size,
-        learning_rate=args.lr,
-        logging_steps=100,
-        save_total_limit=2,
-        fp16=torch.cuda.is_available(),
-    )
-    trainer = Trainer(
+    if args.engine == "lean":
+        training_args = LeanArguments(
+            output_dir=args.out_dir,
+            num_train_epochs=args.epochs,
+            per_device_train_batch_size=args.batch_size,
+            per_device_eval_batch_size=args.batch_size,
+            learning_rate=args.lr,
+            gradient_accumulation_steps=args.grad_accum,
+            logging_steps=args.logging_steps,
+            bf16=args.bf16,
+            compile=args.compile,
+            save_strategy="steps" if args.save_steps else "epoch",
+            save_steps=args.save_steps,
+        )
+    else:
+        training_args = TrainingArguments(
+            output_dir=args.out_dir,
+            overwrite_output_dir=True,
+            evaluation_strategy="epoch",
+            save_strategy="steps" if args.save_steps else "epoch",
+            save_steps=args.save_steps or 500,
+            num_train_epochs=args.epochs,
+            per_device_train_batch_size=args.batch_size,
+            per_device_eval_batch_size=args.batch_size,
+            learning_rate=args.lr,
+            logging_steps=args.logging_steps,
+            save_total_limit=2,
+            fp16=torch.cuda.is_available() and not args.bf16,
+            bf16=args.bf16,
+            gradient_accumulation_steps=args.grad_accum,
+            remove_unused_columns=False,
+            ddp_backend="gloo" if dist_info.enabled and not torch.cuda.is_available() else None,
+        )
+    train_lengths = sequence_lengths(train_ds)
+    log_padding_report(train_lengths, args.batch_size, max_len, seed=training_args.seed)
+    if args.engine == "lean":
+        trainer_cls, extra = LeanTrainer, {"dist_info": dist_info}
+    else:
+        # Trainer shards the batches across ranks itself (through accelerate)
+        trainer_cls, extra = BucketedTrainer, {}
+    trainer = trainer_cls(
         model=model,
         args=training_args,
         train_dataset=train_ds,
         eval_dataset=dev_ds,
         data_collator=data_collator,
+        train_lengths=train_lengths,
+        masker=data_collator.masker,
+        step_callbacks=make_step_callbacks(args.out_dir, args.metrics_file, args.metrics_window, args.profile_steps,
+                                           args.profile_start, rank=dist_info.rank),
+        **extra,
     )
-    trainer.train()
+    trainer.train(resume_from_checkpoint=args.resume)
     trainer.save_model(args.out_dir)
     logging.info("Continued pretraining complete. Model saved to %s", args.out_dir)
 
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Multi‑process data‑parallel setup for PL‑BERT training.  Launch the
+training script with `torchrun`; each process reads the standard
+`RANK`/`WORLD_SIZE`/`LOCAL_RANK`/`LOCAL_WORLD_SIZE` variables:
+
+    torchrun --standalone --nproc_per_node 4 training/train_plbert_so.py --engine lean ...
+
+On CPU‑only machines the gloo backend is used (NCCL on GPUs).  `torchrun`
+sets `OMP_NUM_THREADS=1` for every worker, which leaves most cores idle, so
+`init_distributed` sets the intra‑op thread count of each rank explicitly:
+by default the machine's cores divided evenly between the local ranks.
+"""
+import logging
+import os
+from dataclasses import dataclass
+
+import torch
+import torch.distributed as dist
+
+
+@dataclass
+class DistInfo:
+    rank: int = 0
+    world_size: int = 1
+    local_rank: int = 0
+    local_world_size: int = 1
+
+    @property
+    def is_main(self) -> bool:
+        return self.rank == 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.world_size > 1
+
+
+def threads_per_rank(local_world_size: int) -> int:
+    return max(1, (os.cpu_count() or 1) // local_world_size)
+
+
+def init_distributed(threads: int = 0) -> DistInfo:
+    """Join the process group started by `torchrun` (no‑op for a single process)."""
+    info = DistInfo(
+        rank=int(os.environ.get("RANK", 0)),
+        world_size=int(os.environ.get("WORLD_SIZE", 1)),
+        local_rank=int(os.environ.get("LOCAL_RANK", 0)),
+        local_world_size=int(os.environ.get("LOCAL_WORLD_SIZE", os.environ.get("WORLD_SIZE", 1))),
+    )
+    if not info.enabled:
+        if threads:
+            torch.set_num_threads(threads)
+        return info
+    torch.set_num_threads(threads or threads_per_rank(info.local_world_size))
+    if torch.cuda.is_available():
+        torch.cuda.set_device(info.local_rank)
+    if not dist.is_initialized():
+        dist.init_process_group(backend="nccl" if torch.cuda.is_available() else "gloo")
+    if not info.is_main:
+        # Only rank 0 reports progress.
+        logging.getLogger().setLevel(logging.WARNING)
+    logging.info("Rank %d/%d using %d threads", info.rank, info.world_size, torch.get_num_threads())
+    return info
+
+
+def all_reduce_sum(tensor: torch.Tensor) -> torch.Tensor:
+    """Sum `tensor` over all ranks in place (no‑op without a process group)."""
+    if dist.is_available() and dist.is_initialized():
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+
+def barrier():
+    if dist.is_available() and dist.is_initialized():
+        dist.barrier()
@@ -12,8 +12,31 @@ Example:
       --dev data_plbert/dev.jsonl \
       --token_maps phonemize/token_maps.pkl
 
+`--dev` also accepts a directory compiled by `training/pretokenize.py`.
+
+Evaluation does not go through `Trainer` (see `training/evaluator.py`): the
+dev set is masked once with a fixed `--seed` and the mask pattern is cached
+next to the data, so results are comparable between runs, checkpoints and
+batch sizes; batches are length‑grouped and dynamically padded and the model
+runs under `torch.inference_mode` with `--threads` intra‑op threads.  The
+loss is averaged over all masked tokens.
+
+To evaluate every checkpoint of a run, pass `--models` (globs are expanded,
+checkpoints are ordered by step).  The dev set is encoded and masked once,
+checkpoints are evaluated in turn – or concurrently with `--workers N`, the
+cores being split between the workers – and one loss/perplexity table is
+written (`--output`, CSV or JSON by extension; default
+`eval_sweep.csv` in the models' common parent directory):
+
+    python training/eval_plbert_so.py \
+      --models 'runs/plbert_so/from_scratch/checkpoint-*' \
+      --dev data_plbert/dev_tok \
+      --token_maps phonemize/token_maps.pkl --workers 4
+
 """
 import argparse
+import csv
+import glob
 import json
 import logging
 import os
@@ -22,7 +45,10 @@ from typing import Dict, List
 
 import torch
 from datasets import Dataset
-from transformers import AlbertForMaskedLM, Trainer, TrainingArguments
+from transformers import AlbertConfig
+
+from evaluator import MaskedEvalSet, checkpoint_step, sweep
+from pretokenize import PretokenizedDataset, is_pretokenized
 
 
 def load_jsonl(path: str) -> List[Dict]:
@@ -39,100 +65,85 @@ def encode_data(data: List[Dict], token_to_id: Dict[str, int]) -> List[List[int]
     return encoded
 
 
+def expand_models(patterns: List[str]) -> List[str]:
+    """Expand globs and order checkpoints of the same run by step."""
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(pattern)
+        paths.extend(sorted(matches) if matches else [pattern])
+    paths = [p.rstrip("/") for p in paths if os.path.isdir(p)]
+    paths = list(dict.fromkeys(paths))
+    return sorted(paths, key=lambda p: (os.path.dirname(p), checkpoint_step(p) or -1, p))
+
+
+def write_table(rows: List[Dict], path: str):
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Evaluate a trained PL‑BERT model.")
-    parser.add_argument("--model", type=str, required=True, help="Directory containing the saved model.")
-    parser.add_argument("--dev", type=str, required=True, help="Dev JSONL file.")
+    models = parser.add_mutually_exclusive_group(required=True)
+    models.add_argument("--model", type=str, help="Directory containing the saved model.")
+    models.add_argument("--models", type=str, nargs="+",
+                        help="Model/checkpoint directories or globs to evaluate in one sweep.")
+    parser.add_argument("--dev", type=str, required=True, help="Dev JSONL file or pre-tokenised directory.")
     parser.add_argument("--token_maps", type=str, required=True, help="Pickled token map.")
-    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--batch_size", type=int, default=128)
+    parser.add_argument("--mlm_probability", type=float, default=0.15, help="Fraction of tokens to predict.")
+    parser.add_argument("--whole_word_mask", action="store_true", help="Mask whole '_'-delimited words.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fixed evaluation mask pattern.")
+    parser.add_argument("--mask_cache", type=str, default=None,
+                        help="Mask cache file (default: next to --dev; empty string disables caching).")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default).")
+    parser.add_argument("--device", type=str, default=None, help="Device (default: cuda if available, else cpu).")
+    parser.add_argument("--workers", type=int, default=1, help="Processes evaluating checkpoints concurrently.")
+    parser.add_argument("--output", type=str, default=None, help="Result table (.csv or .json).")
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
-    # Load model
-    model = AlbertForMaskedLM.from_pretrained(args.model)
+    device = torch.device(args.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    paths = expand_models(args.models) if args.models else [args.model]
+    if not paths:
+        parser.error(f"no model directories match {args.models}")
+    workers = max(1, min(args.workers, len(paths)))
+    threads = args.threads or (max(1, (os.cpu_count() or 1) // workers) if workers > 1 else 0)
+    if threads:
+        torch.set_num_threads(threads)
+    max_length = min(AlbertConfig.from_pretrained(p).max_position_embeddings for p in paths)
     # Load token map
     with open(args.token_maps, "rb") as f:
         token_to_id = pickle.load(f)
-    # Encode dev data
-    dev_data = load_jsonl(args.dev)
-    dev_enc = encode_data(dev_data, token_to_id)
-    dev_ds = Dataset.from_dict({"input_ids": dev_enc})
-
-    # Custom data collator for masked LM (same as in training script)
-    class CustomMLMDataCollator:
-        def __init__(self, token_to_id, mlm_probability=0.15, max_length=256):
-            self.token_to_id = token_to_id
-            self.mlm_probability = mlm_probability
-            self.max_length = max_length
-            self.pad_token_id = token_to_id["<pad>"]
-            self.mask_token_id = token_to_id["<mask>"]
-
-        def __call__(self, examples):
-            # Pad sequences
-            padded_inputs = []
-            attention_masks = []
-
-            for example in examples:
-                input_ids = example["input_ids"][:self.max_length]
-                padding_length = self.max_length - len(input_ids)
-
-                padded_input = input_ids + [self.pad_token_id] * padding_length
-                attention_mask = [1] * len(input_ids) + [0] * padding_length
-
-                padded_inputs.append(padded_input)
-                attention_masks.append(attention_mask)
-
-            # Convert to tensors
-            input_ids = torch.tensor(padded_inputs, dtype=torch.long)
-            attention_mask = torch.tensor(attention_masks, dtype=torch.long)
-
-            # Create labels (copy of input_ids)
-            labels = input_ids.clone()
-
-            # Apply masking
-            probability_matrix = torch.full(input_ids.shape, self.mlm_probability)
-            # Don't mask padding tokens
-            probability_matrix.masked_fill_(input_ids == self.pad_token_id, value=0.0)
-
-            masked_indices = torch.bernoulli(probability_matrix).bool()
-            labels[~masked_indices] = -100  # Only compute loss on masked tokens
-
-            # Replace masked positions with mask token
-            input_ids[masked_indices] = self.mask_token_id
-
-            return {
-                "input_ids": input_ids,
-                "attention_mask": attention_mask,
-                "labels": labels,
-            }
-
-    data_collator = CustomMLMDataCollator(
-        token_to_id=token_to_id,
-        mlm_probability=0.15,
-        max_length=256
-    )
-
-    # Trainer in eval mode
-    training_args = TrainingArguments(
-        output_dir="/tmp/eval",
-        per_device_eval_batch_size=args.batch_size,
-        fp16=False,
-        no_cuda=True,  # Use CPU for eval
-        remove_unused_columns=False,
-    )
-
-    trainer = Trainer(
-        model=model,
-        args=training_args,
-        eval_dataset=dev_ds,
-        data_collator=data_collator,
-    )
-    eval_output = trainer.evaluate()
-    mlm_loss = eval_output.get("eval_loss")
-    perplexity = torch.exp(torch.tensor(mlm_loss)).item() if mlm_loss is not None else None
-    logging.info("Eval loss: %.4f", mlm_loss)
-    if perplexity is not None:
-        logging.info("Perplexity: %.2f", perplexity)
+    # Encode dev data (or memory‑map it if pre‑tokenised)
+    if is_pretokenized(args.dev):
+        dev_ds = PretokenizedDataset(args.dev, token_to_id)
+    else:
+        dev_data = load_jsonl(args.dev)
+        dev_enc = encode_data(dev_data, token_to_id)
+        dev_ds = Dataset.from_dict({"input_ids": dev_enc})
+
+    # Same masking scheme as training, drawn once with a fixed seed
+    eval_set = MaskedEvalSet.load_or_build(
+        dev_ds, token_to_id, mlm_probability=args.mlm_probability, whole_word=args.whole_word_mask,
+        seed=args.seed, max_length=max_length, cache_path=args.mask_cache, data_path=args.dev)
+    batches = eval_set.batches(args.batch_size)
+    rows = []
+    for metrics in sweep(paths, batches, device, workers=workers, threads=threads):
+        logging.info("%s: eval loss %.4f, perplexity %.2f (%d masked tokens, %.2fs)", metrics["model"],
+                     metrics["eval_loss"], metrics["perplexity"], metrics["eval_tokens"], metrics["eval_runtime"])
+        rows.append(metrics)
+    output = args.output
+    if output is None and args.models:
+        output = os.path.join(os.path.commonpath([os.path.abspath(p) for p in paths]), "eval_sweep.csv")
+    if output:
+        write_table(rows, output)
+        logging.info("Wrote %d results to %s", len(rows), output)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
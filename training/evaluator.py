@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""
+Deterministic, batched masked‑LM evaluation without `Trainer`
+(used by `eval_plbert_so.py`).
+
+`MaskedEvalSet` masks every dev sequence once with a fixed seed (80/10/10,
+as in training, see `masking.py`) and caches the corrupted inputs and
+labels to a safetensors file next to the data, so every evaluation – of
+any checkpoint, with any batch size, on any machine – scores exactly the
+same positions.  The mask pattern does not depend on the evaluation batch
+size: sequences are masked in fixed groups of `MASK_GROUP` in length order.
+
+`evaluate_mlm` runs the model under `torch.inference_mode` on
+length‑grouped, dynamically padded batches and only applies the MLM head
+to the masked positions.  The loss is the mean cross‑entropy over all
+masked tokens of the set (not a mean of per‑batch means), so it does not
+change with the batch size either.
+
+`sweep` evaluates many checkpoints on one set of batches, optionally in a
+pool of worker processes that each receive the batches once.  Every
+worker keeps its model and only loads the next checkpoint's weights into
+it while the architecture stays the same.
+"""
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from safetensors import safe_open
+from safetensors.torch import load_file, save_file
+from transformers import AlbertConfig, AlbertForMaskedLM
+
+from batching import CustomMLMDataCollator, LengthGroupedSampler, round_up, sequence_lengths
+from masking import MLMMasker
+from pretokenize import token_map_digest
+
+MASK_GROUP = 256
+CACHE_VERSION = 1
+
+
+def default_cache_path(data_path: str, key: str) -> str:
+    """Mask cache stored inside a pre‑tokenised directory, or beside a JSONL file."""
+    if os.path.isdir(data_path):
+        return os.path.join(data_path, f"mlm_eval_{key}.safetensors")
+    return f"{data_path}.mlm_eval_{key}.safetensors"
+
+
+def _concat(rows: List[np.ndarray]) -> np.ndarray:
+    return np.concatenate(rows).astype(np.int32) if rows else np.zeros(0, dtype=np.int32)
+
+
+class MaskedEvalSet:
+    """Fixed‑seed masked copy of a dataset: corrupted `input_ids` and `labels` per sequence."""
+
+    def __init__(self, input_ids: np.ndarray, labels: np.ndarray, offsets: np.ndarray, pad_token_id: int):
+        self.input_ids = input_ids
+        self.labels = labels
+        self.offsets = offsets
+        self.pad_token_id = pad_token_id
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def num_targets(self) -> int:
+        return int((self.labels != -100).sum())
+
+    @staticmethod
+    def cache_key(dataset, token_to_id: Dict[str, int], mlm_probability: float, whole_word: bool,
+                  seed: int, max_length: int) -> str:
+        h = hashlib.sha1()
+        h.update(json.dumps([CACHE_VERSION, token_map_digest(token_to_id), mlm_probability, whole_word, seed,
+                             max_length, len(dataset)]).encode())
+        for i in range(len(dataset)):
+            h.update(np.asarray(dataset[i]["input_ids"], dtype=np.int32).tobytes())
+            h.update(b"|")
+        return h.hexdigest()[:16]
+
+    @classmethod
+    def build(cls, dataset, token_to_id: Dict[str, int], mlm_probability: float = 0.15, whole_word: bool = False,
+              seed: int = 0, max_length: int = 512) -> "MaskedEvalSet":
+        masker = MLMMasker(token_to_id, mlm_probability, whole_word=whole_word)
+        collator = CustomMLMDataCollator(token_to_id, max_length=max_length, apply_mask=False)
+        generator = torch.Generator().manual_seed(seed)
+        lengths = np.minimum(sequence_lengths(dataset), max_length)
+        order = np.argsort(lengths, kind="stable")
+        inputs = [None] * len(dataset)
+        labels = [None] * len(dataset)
+        for start in range(0, len(order), MASK_GROUP):
+            group = order[start:start + MASK_GROUP]
+            batch = collator.pad([dataset[int(i)]["input_ids"] for i in group])
+            corrupted, target = masker(batch["input_ids"], generator)
+            for row, i in enumerate(group):
+                n = lengths[i]
+                inputs[i] = corrupted[row, :n].numpy()
+                labels[i] = target[row, :n].numpy()
+        offsets = np.zeros(len(dataset) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(_concat(inputs), _concat(labels), offsets, token_to_id["<pad>"])
+
+    @classmethod
+    def load_or_build(cls, dataset, token_to_id: Dict[str, int], mlm_probability: float = 0.15,
+                      whole_word: bool = False, seed: int = 0, max_length: int = 512,
+                      cache_path: Optional[str] = None, data_path: Optional[str] = None) -> "MaskedEvalSet":
+        """Load the cached mask pattern for these settings, building and saving it on first use.
+
+        `cache_path` defaults to a file next to `data_path` named after a
+        fingerprint of the data, token map and masking settings; pass
+        `cache_path=""` to disable caching.
+        """
+        settings = dict(mlm_probability=mlm_probability, whole_word=whole_word, seed=seed, max_length=max_length)
+        if cache_path is None and data_path is not None:
+            cache_path = default_cache_path(data_path, cls.cache_key(dataset, token_to_id, **settings))
+        if cache_path and os.path.exists(cache_path):
+            with safe_open(cache_path, framework="np") as f:
+                logging.info("Loaded evaluation masks from %s", cache_path)
+                return cls(f.get_tensor("input_ids"), f.get_tensor("labels"), f.get_tensor("offsets"),
+                           int(f.metadata()["pad_token_id"]))
+        eval_set = cls.build(dataset, token_to_id, **settings)
+        if cache_path:
+            eval_set.save(cache_path)
+            logging.info("Cached evaluation masks to %s", cache_path)
+        return eval_set
+
+    def save(self, path: str):
+        tensors = {"input_ids": torch.from_numpy(self.input_ids), "labels": torch.from_numpy(self.labels),
+                   "offsets": torch.from_numpy(self.offsets)}
+        tmp = path + ".tmp"
+        save_file(tensors, tmp, metadata={"pad_token_id": str(self.pad_token_id)})
+        os.replace(tmp, path)
+
+    def batches(self, batch_size: int) -> List[Dict[str, torch.Tensor]]:
+        """Length‑grouped batches padded to their longest sequence (multiple of 8)."""
+        lengths = self.lengths()
+        out = []
+        for group in LengthGroupedSampler(lengths, batch_size, shuffle=False).batches():
+            n = torch.as_tensor(lengths[group])
+            width = round_up(max(int(n.max()), 1), 8)
+            rows = [slice(self.offsets[i], self.offsets[i + 1]) for i in group]
+            out.append({
+                "input_ids": CustomMLMDataCollator.pad_rows([self.input_ids[r] for r in rows], n, width,
+                                                            self.pad_token_id),
+                "attention_mask": (torch.arange(width) < n[:, None]).long(),
+                "labels": CustomMLMDataCollator.pad_rows([self.labels[r] for r in rows], n, width, -100),
+            })
+        return out
+
+
+@torch.inference_mode()
+def evaluate_mlm(model, batches: List[Dict[str, torch.Tensor]], device: Optional[torch.device] = None
+                 ) -> Dict[str, float]:
+    """Token‑level MLM loss and perplexity of `model` over pre‑built `batches`."""
+    device = device or next(model.parameters()).device
+    model.eval()
+    total = torch.zeros((), dtype=torch.float64, device=device)
+    count = torch.zeros((), dtype=torch.long, device=device)
+    start = time.perf_counter()
+    for batch in batches:
+        labels = batch["labels"].to(device)
+        hidden = model.albert(input_ids=batch["input_ids"].to(device),
+                              attention_mask=batch["attention_mask"].to(device)).last_hidden_state
+        selected = labels != -100
+        # The vocabulary projection is only needed at the masked positions.
+        logits = model.predictions(hidden[selected])
+        total += F.cross_entropy(logits.float(), labels[selected], reduction="sum").double()
+        count += selected.sum()
+    loss = (total / count.clamp(min=1)).item()
+    return {"eval_loss": loss, "perplexity": math.exp(loss), "eval_tokens": int(count),
+            "eval_runtime": round(time.perf_counter() - start, 4)}
+
+
+def checkpoint_step(path: str) -> Optional[int]:
+    match = re.search(r"checkpoint-(\d+)/?$", path)
+    return int(match.group(1)) if match else None
+
+
+class CheckpointLoader:
+    """Load `AlbertForMaskedLM` checkpoints, reusing the model while the config is unchanged."""
+
+    def __init__(self, device: torch.device):
+        self.device = device
+        self.model = None
+        self._config = None
+
+    def load(self, path: str):
+        config = AlbertConfig.from_pretrained(path).to_dict()
+        weights = os.path.join(path, "model.safetensors")
+        if self.model is not None and config == self._config and os.path.exists(weights):
+            missing, unexpected = self.model.load_state_dict(load_file(weights, device=str(self.device)),
+                                                             strict=False)
+            # save_pretrained drops the decoder weights tied to the input embeddings.
+            if not unexpected and set(missing) <= set(self.model._tied_weights_keys or []):
+                self.model.tie_weights()
+                return self.model
+        self.model = AlbertForMaskedLM.from_pretrained(path).to(self.device)
+        self._config = config
+        return self.model
+
+
+_worker = {}
+
+
+def _init_worker(batches, device: str, threads: int):
+    if threads:
+        torch.set_num_threads(threads)
+    _worker["batches"] = batches
+    _worker["loader"] = CheckpointLoader(torch.device(device))
+
+
+def _evaluate_checkpoint(path: str) -> Dict:
+    model = _worker["loader"].load(path)
+    return dict(model=path, step=checkpoint_step(path), **evaluate_mlm(model, _worker["batches"]))
+
+
+def sweep(paths: List[str], batches: List[Dict[str, torch.Tensor]], device: torch.device,
+          workers: int = 1, threads: int = 0) -> Iterator[Dict]:
+    """Evaluate every checkpoint in `paths`; yields one result row per checkpoint, in order."""
+    if workers <= 1:
+        _init_worker(batches, str(device), threads)
+        for path in paths:
+            yield _evaluate_checkpoint(path)
+        return
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(batches, str(device), threads)) as pool:
+        yield from pool.imap(_evaluate_checkpoint, paths)
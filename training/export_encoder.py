@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Inference exports of the PL‑BERT encoder for TTS serving (used by
+`pack.py --export`).
+
+StyleTTS2 only consumes `last_hidden_state` of the ALBERT encoder, so the
+exported graph is `AlbertModel` without the MLM head and without the
+pooler, taking `input_ids` and `attention_mask` (both `[batch, sequence]`,
+int64) and returning `last_hidden_state` (`[batch, sequence, hidden]`).
+Batch and sequence length are dynamic:
+
+* TorchScript – `encoder.pt`, traced; load with `torch.jit.load`;
+* ONNX – `encoder.onnx`, opset 14 with dynamic axes; needs the `onnx` and
+  `onnxruntime` packages.
+
+With `quantize=True` an int8 variant of each is written as well
+(`encoder.int8.pt`, `encoder.int8.onnx`): the weights of the Linear layers
+(attention projections, feed‑forward, embedding projection) are stored as
+int8 and activations are quantised on the fly, the rest stays fp32.
+
+`check_parity` runs every exported file on real sentences of varying
+lengths and compares the unpadded hidden states with the fp32 eager model
+(max/mean absolute error, mean cosine similarity); it also times each
+variant, since CPU latency is the point of the exercise.
+"""
+import logging
+import os
+import statistics
+import time
+from typing import Dict, List
+
+import numpy as np
+import torch
+from torch import nn
+from transformers import AlbertConfig, AlbertModel
+
+EXPORT_FORMATS = ("torchscript", "onnx")
+ONNX_OPSET = 14
+
+
+class EncoderForExport(nn.Module):
+    """`AlbertModel` reduced to `(input_ids, attention_mask) -> last_hidden_state`."""
+
+    def __init__(self, albert: AlbertModel):
+        super().__init__()
+        self.albert = albert
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.albert(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+
+def build_encoder(config: AlbertConfig, state: Dict[str, torch.Tensor]) -> EncoderForExport:
+    """fp32 encoder in eval mode from packaged (`AlbertModel`‑keyed) weights."""
+    albert = AlbertModel(config, add_pooling_layer=False)
+    state = {k: v for k, v in state.items() if not k.startswith("pooler.")}
+    missing, unexpected = albert.load_state_dict(state, strict=False)
+    # position_ids / token_type_ids are buffers that the checkpoint may or may not carry.
+    missing = [k for k in missing if not k.startswith("embeddings.") or not k.endswith("_ids")]
+    if missing or unexpected:
+        raise ValueError(f"Encoder weights do not match the config: missing {missing}, unexpected {unexpected}")
+    return EncoderForExport(albert).eval()
+
+
+def quantize(encoder: EncoderForExport) -> EncoderForExport:
+    """Dynamic int8 quantisation of the Linear layers (weights int8, activations per batch)."""
+    return torch.ao.quantization.quantize_dynamic(encoder, {nn.Linear}, dtype=torch.qint8).eval()
+
+
+def example_inputs(config: AlbertConfig, batch_size: int = 2, length: int = 16):
+    input_ids = torch.randint(0, config.vocab_size, (batch_size, length))
+    attention_mask = torch.ones_like(input_ids)
+    attention_mask[-1, length // 2:] = 0
+    return input_ids, attention_mask
+
+
+@torch.no_grad()
+def export_torchscript(encoder: EncoderForExport, inputs, path: str) -> str:
+    traced = torch.jit.trace(encoder, inputs, check_trace=False)
+    traced = torch.jit.freeze(traced)
+    torch.jit.save(traced, path)
+    logging.info("Wrote TorchScript encoder %s", path)
+    return path
+
+
+def _require_onnx():
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise ImportError("ONNX export needs the `onnx` and `onnxruntime` packages "
+                          "(pip install onnx onnxruntime).") from e
+
+
+@torch.no_grad()
+def export_onnx(encoder: EncoderForExport, inputs, path: str) -> str:
+    _require_onnx()
+    axes = {0: "batch", 1: "sequence"}
+    torch.onnx.export(encoder, inputs, path, input_names=["input_ids", "attention_mask"],
+                      output_names=["last_hidden_state"], opset_version=ONNX_OPSET, do_constant_folding=True,
+                      dynamic_axes={"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes})
+    logging.info("Wrote ONNX encoder %s", path)
+    return path
+
+
+def quantize_onnx(path: str, output_path: str) -> str:
+    _require_onnx()
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(path, output_path, weight_type=QuantType.QInt8)
+    logging.info("Wrote int8 ONNX encoder %s", output_path)
+    return output_path
+
+
+def export(encoder: EncoderForExport, config: AlbertConfig, output_dir: str, formats: List[str],
+           quantize_int8: bool = False) -> Dict[str, str]:
+    """Write the requested exports to `output_dir`; returns {variant name: file}."""
+    inputs = example_inputs(config)
+    files = {}
+    if "torchscript" in formats:
+        files["torchscript"] = export_torchscript(encoder, inputs, os.path.join(output_dir, "encoder.pt"))
+        if quantize_int8:
+            files["torchscript_int8"] = export_torchscript(quantize(encoder), inputs,
+                                                           os.path.join(output_dir, "encoder.int8.pt"))
+    if "onnx" in formats:
+        files["onnx"] = export_onnx(encoder, inputs, os.path.join(output_dir, "encoder.onnx"))
+        if quantize_int8:
+            files["onnx_int8"] = quantize_onnx(files["onnx"], os.path.join(output_dir, "encoder.int8.onnx"))
+    return files
+
+
+def _runner(path: str):
+    """Callable `(input_ids, attention_mask) -> np.ndarray` for an exported file."""
+    if path.endswith(".onnx"):
+        import onnxruntime
+        session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        return lambda ids, mask: session.run(None, {"input_ids": ids.numpy(), "attention_mask": mask.numpy()})[0]
+    module = torch.jit.load(path)
+    return lambda ids, mask: module(ids, mask).numpy()
+
+
+def check_parity(encoder: EncoderForExport, files: Dict[str, str], batches: List[Dict[str, torch.Tensor]],
+                 repeats: int = 3) -> Dict[str, Dict[str, float]]:
+    """Compare every exported file with the fp32 eager `encoder` on `batches`.
+
+    Errors are measured on real (unpadded) tokens only.  Latency is the
+    median over `repeats` passes of the mean time per batch.
+    """
+    runners = {"eager_fp32": lambda ids, mask: encoder(ids, mask).numpy()}
+    runners.update({name: _runner(path) for name, path in files.items()})
+    with torch.inference_mode():
+        reference = [runners["eager_fp32"](b["input_ids"], b["attention_mask"]) for b in batches]
+        report = {}
+        for name, run in runners.items():
+            max_err, abs_sum, cos_sum, count = 0.0, 0.0, 0.0, 0
+            for batch, ref in zip(batches, reference):
+                out = run(batch["input_ids"], batch["attention_mask"])
+                real = batch["attention_mask"].numpy().astype(bool)
+                a, b = out[real].astype(np.float64), ref[real].astype(np.float64)
+                diff = np.abs(a - b)
+                max_err = max(max_err, float(diff.max(initial=0.0)))
+                abs_sum += float(diff.sum())
+                norms = np.linalg.norm(a, axis=-1) * np.linalg.norm(b, axis=-1)
+                cos_sum += float(((a * b).sum(-1) / np.maximum(norms, 1e-12)).sum())
+                count += len(a)
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                for batch in batches:
+                    run(batch["input_ids"], batch["attention_mask"])
+                times.append((time.perf_counter() - start) / max(len(batches), 1))
+            hidden = reference[0].shape[-1] if reference else 1
+            report[name] = {"max_abs_err": max_err, "mean_abs_err": abs_sum / max(count * hidden, 1),
+                            "mean_cosine": cos_sum / max(count, 1),
+                            "ms_per_batch": round(1e3 * statistics.median(times), 3)}
+    return report
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+"""
+Lean training loop for the small PL‑BERT models (`--engine lean` in
+`train_plbert_so.py`).  HuggingFace `Trainer` does a lot of per‑step
+bookkeeping that is noticeable for a 6‑layer ALBERT, especially on CPU.
+`LeanTrainer` keeps the same interface as `BucketedTrainer` (`train`,
+`evaluate`, `save_model`) and the same data path (length‑grouped batches,
+dynamic padding, on‑device masking) but runs a plain PyTorch loop with:
+
+* optional `torch.compile` of the model;
+* bf16 autocast on CPU and GPU;
+* AdamW with the fused kernel on CUDA and the foreach implementation on CPU;
+* gradient accumulation and gradient clipping;
+* pinned host memory and non‑blocking copies, with the next batch copied
+  to the GPU on a side stream while the current step runs;
+* the same `step_callbacks` instrumentation as `BucketedTrainer` (see
+  `metrics.py`), with forward/backward/optimiser/data regions labelled for
+  `torch.profiler` traces;
+* data‑parallel training under `torchrun` (see `distributed.py`): the model
+  is wrapped in `DistributedDataParallel`, every rank reads only its own
+  share of the length‑grouped batches, gradients are only synchronised on
+  the last micro‑batch of an accumulation, logged throughput and eval loss
+  are summed over ranks, and only rank 0 writes checkpoints.
+
+The learning rate decays linearly to zero after an optional warmup, as with
+`Trainer`'s defaults.  Checkpoints (`checkpoint-<step>`, see
+`checkpointing.py`) are taken every `save_steps` optimisation steps
+(`save_strategy="steps"`) or at the end of every epoch, written as
+safetensors on a background thread, and only the newest `save_total_limit`
+are kept.  `train(resume_from_checkpoint=...)` restores model, optimiser,
+scheduler, RNG and the position in the epoch's batch order, so a resumed
+run continues bit‑exactly where the checkpoint was taken.
+"""
+import logging
+import math
+import os
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Union
+
+import torch
+from torch.nn.parallel import DistributedDataParallel
+from torch.profiler import record_function
+from torch.utils.data import DataLoader
+from transformers import get_linear_schedule_with_warmup
+
+from batching import LengthGroupedSampler, sequence_lengths
+from checkpointing import AsyncCheckpointer, latest_checkpoint, load_checkpoint, set_rng_state
+from distributed import DistInfo, all_reduce_sum, barrier
+from masking import fixed_mask_seed
+from metrics import call_callbacks
+
+
+@dataclass
+class LeanArguments:
+    output_dir: str
+    num_train_epochs: float = 3
+    per_device_train_batch_size: int = 64
+    per_device_eval_batch_size: int = 64
+    learning_rate: float = 5e-5
+    weight_decay: float = 0.0
+    warmup_steps: int = 0
+    gradient_accumulation_steps: int = 1
+    max_grad_norm: float = 1.0
+    max_steps: int = -1
+    logging_steps: int = 100
+    save_total_limit: Optional[int] = 2
+    save_strategy: str = "epoch"  # "steps", "epoch" or "no"
+    save_steps: int = 500
+    evaluation_strategy: str = "epoch"
+    bf16: bool = False
+    compile: bool = False
+    dataloader_num_workers: int = 0
+    seed: int = 42
+
+
+class DevicePrefetcher:
+    """Iterate a DataLoader, copying each batch to `device` one step ahead."""
+
+    def __init__(self, loader: DataLoader, device: torch.device):
+        self.loader = loader
+        self.device = device
+
+    def __len__(self) -> int:
+        return len(self.loader)
+
+    def _to_device(self, batch: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        return {k: v.to(self.device, non_blocking=True) for k, v in batch.items()}
+
+    def __iter__(self) -> Iterator[Dict[str, torch.Tensor]]:
+        if self.device.type != "cuda":
+            for batch in self.loader:
+                yield self._to_device(batch)
+            return
+        stream = torch.cuda.Stream()
+        batches = iter(self.loader)
+
+        def preload():
+            batch = next(batches, None)
+            if batch is None:
+                return None
+            with torch.cuda.stream(stream):
+                return self._to_device(batch)
+
+        upcoming = preload()
+        while upcoming is not None:
+            torch.cuda.current_stream().wait_stream(stream)
+            batch = upcoming
+            for tensor in batch.values():
+                tensor.record_stream(torch.cuda.current_stream())
+            upcoming = preload()
+            yield batch
+
+
+def make_optimizer(model, lr: float, weight_decay: float, device: torch.device) -> torch.optim.AdamW:
+    """AdamW without decay on biases/LayerNorm, fused on CUDA and foreach on CPU."""
+    decay, no_decay = [], []
+    for name, param in model.named_parameters():
+        if param.requires_grad:
+            (no_decay if param.ndim < 2 or "LayerNorm" in name else decay).append(param)
+    groups = [{"params": decay, "weight_decay": weight_decay}, {"params": no_decay, "weight_decay": 0.0}]
+    if device.type == "cuda":
+        return torch.optim.AdamW(groups, lr=lr, fused=True)
+    return torch.optim.AdamW(groups, lr=lr, foreach=True)
+
+
+class LeanTrainer:
+    def __init__(self, model, args: LeanArguments, train_dataset=None, eval_dataset=None, data_collator=None,
+                 train_lengths=None, eval_lengths=None, masker=None, device: Optional[torch.device] = None,
+                 dist_info: Optional[DistInfo] = None, step_callbacks=None):
+        self.args = args
+        self.dist = dist_info or DistInfo()
+        if device is None:
+            device = torch.device(f"cuda:{self.dist.local_rank}" if torch.cuda.is_available() else "cpu")
+        self.device = device
+        self.model = model.to(self.device)
+        self.train_dataset = train_dataset
+        self.eval_dataset = eval_dataset
+        self.data_collator = data_collator
+        self.train_lengths = train_lengths
+        self.eval_lengths = eval_lengths
+        self.masker = masker
+        self.step_callbacks = list(step_callbacks or [])
+        self.global_step = 0
+        self.log_history = []
+        self._checkpointer = AsyncCheckpointer(args.output_dir, args.save_total_limit, self.dist.is_main)
+        self._saved_step = None
+        self._ddp_model = None
+        step_model = self.model
+        if self.dist.enabled:
+            device_ids = [self.device.index] if self.device.type == "cuda" else None
+            step_model = self._ddp_model = DistributedDataParallel(self.model, device_ids=device_ids)
+        self._step_model = torch.compile(step_model, dynamic=True) if args.compile else step_model
+
+    def _autocast(self):
+        if not self.args.bf16:
+            return nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16)
+
+    def _loader(self, dataset, lengths, batch_size: int, shuffle: bool) -> DevicePrefetcher:
+        if lengths is None:
+            lengths = sequence_lengths(dataset)
+        sampler = LengthGroupedSampler(lengths, batch_size, shuffle=shuffle, seed=self.args.seed,
+                                       num_replicas=self.dist.world_size, rank=self.dist.rank)
+        # A private generator keeps DataLoader iterators from drawing on the global RNG.
+        loader = DataLoader(dataset, batch_size=batch_size, sampler=sampler, collate_fn=self.data_collator,
+                            num_workers=self.args.dataloader_num_workers,
+                            pin_memory=self.device.type == "cuda",
+                            generator=torch.Generator().manual_seed(self.args.seed))
+        return DevicePrefetcher(loader, self.device)
+
+    def _fetch(self, loader: DevicePrefetcher) -> Iterator[Dict[str, torch.Tensor]]:
+        """Iterate `loader`, reporting the wait for every batch to the step callbacks."""
+        batches = iter(loader)
+        while True:
+            call_callbacks(self.step_callbacks, "on_fetch_begin")
+            with record_function("data"):
+                batch = next(batches, None)
+            if batch is None:
+                return
+            call_callbacks(self.step_callbacks, "on_batch_ready", batch)
+            yield batch
+
+    def _prepare(self, batch: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        if self.masker is not None and "labels" not in batch:
+            batch = self.masker.apply(batch)
+        return batch
+
+    def train(self, resume_from_checkpoint: Union[str, bool, None] = None) -> Dict[str, float]:
+        """Train; `resume_from_checkpoint` is a checkpoint path or True for the latest in `output_dir`."""
+        args = self.args
+        torch.manual_seed(args.seed)
+        loader = self._loader(self.train_dataset, self.train_lengths, args.per_device_train_batch_size, True)
+        # An optimiser step is also taken on the last (partial) accumulation of each epoch.
+        updates_per_epoch = max(math.ceil(len(loader) / args.gradient_accumulation_steps), 1)
+        if args.max_steps > 0:
+            total_steps = args.max_steps
+        else:
+            total_steps = math.ceil(args.num_train_epochs * updates_per_epoch)
+        epochs = math.ceil(total_steps / updates_per_epoch)
+        optimizer = make_optimizer(self.model, args.learning_rate, args.weight_decay, self.device)
+        scheduler = get_linear_schedule_with_warmup(optimizer, args.warmup_steps, total_steps)
+        logging.info("Lean training: %d epochs, %d optimisation steps, device=%s, bf16=%s, compile=%s, ranks=%d",
+                     epochs, total_steps, self.device, args.bf16, args.compile, self.dist.world_size)
+        start_epoch = skip = 0
+        if resume_from_checkpoint:
+            start_epoch, skip = self._resume(resume_from_checkpoint, optimizer, scheduler)
+
+        # Rates and the mean loss below cover only the steps taken by this call, not the resumed ones.
+        start_step = self.global_step
+        self.model.train()
+        call_callbacks(self.step_callbacks, "on_train_begin")
+        start = window_start = time.perf_counter()
+        # Running sums stay on the device so logging does not force a sync every step.
+        window_loss = torch.zeros((), device=self.device)
+        total_loss = torch.zeros((), device=self.device)
+        window_micro = total_micro = 0
+        epoch = start_epoch
+        for epoch in range(start_epoch, epochs):
+            sampler = loader.loader.sampler
+            sampler.set_epoch(epoch)
+            # After a resume, the batches of this epoch that were already trained on are skipped.
+            sampler.skip_batches, skip = skip, 0
+            steps_in_epoch = len(loader) + sampler.skip_batches
+            micro_step = sampler.skip_batches - 1
+            for micro_step, batch in enumerate(self._fetch(loader), start=sampler.skip_batches):
+                batch = self._prepare(batch)
+                sync = (micro_step + 1) % args.gradient_accumulation_steps == 0 or micro_step + 1 == steps_in_epoch
+                # Skip the gradient all-reduce on micro-batches that do not end an accumulation.
+                no_sync = self._ddp_model.no_sync() if self._ddp_model is not None and not sync else nullcontext()
+                with no_sync:
+                    with record_function("forward"), self._autocast():
+                        loss = self._step_model(**batch).loss / args.gradient_accumulation_steps
+                    with record_function("backward"):
+                        loss.backward()
+                window_loss += loss.detach()
+                window_micro += 1
+                if not sync:
+                    continue
+                with record_function("optimizer"):
+                    if args.max_grad_norm:
+                        torch.nn.utils.clip_grad_norm_(self.model.parameters(), args.max_grad_norm)
+                    optimizer.step()
+                    scheduler.step()
+                    optimizer.zero_grad(set_to_none=True)
+                self.global_step += 1
+                call_callbacks(self.step_callbacks, "on_step_end", self.global_step)
+                if self.global_step % args.logging_steps == 0:
+                    elapsed = time.perf_counter() - window_start
+                    # Loss averaged over all ranks; throughput is added by the step callbacks.
+                    mean_loss = all_reduce_sum(window_loss.double()).item() / self.dist.world_size
+                    self.log({
+                        "loss": round(mean_loss * args.gradient_accumulation_steps / window_micro, 4),
+                        "learning_rate": scheduler.get_last_lr()[0],
+                        "epoch": round(epoch + (micro_step + 1) / steps_in_epoch, 2),
+                        "steps_per_sec": round(args.logging_steps / elapsed, 3),
+                    })
+                    total_loss += window_loss
+                    total_micro += window_micro
+                    window_loss.zero_()
+                    window_micro = 0
+                    window_start = time.perf_counter()
+                if args.save_strategy == "steps" and self.global_step % args.save_steps == 0:
+                    self._save_checkpoint(optimizer, scheduler, epoch, micro_step + 1, steps_in_epoch)
+                if self.global_step >= total_steps:
+                    break
+            if args.evaluation_strategy == "epoch" and self.eval_dataset is not None:
+                self.evaluate()
+            if args.save_strategy == "epoch":
+                self._save_checkpoint(optimizer, scheduler, epoch, micro_step + 1, steps_in_epoch)
+            if self.global_step >= total_steps:
+                break
+        self._checkpointer.wait()
+        call_callbacks(self.step_callbacks, "on_train_end")
+        runtime = time.perf_counter() - start
+        total_loss += window_loss
+        total_micro += window_micro
+        steps_run = self.global_step - start_step
+        metrics = {
+            "train_runtime": round(runtime, 4),
+            "train_steps": steps_run,
+            "train_steps_per_second": round(steps_run / runtime, 3),
+            "train_loss": total_loss.item() * args.gradient_accumulation_steps / max(total_micro, 1),
+            "epoch": epoch + 1,
+        }
+        if start_step:
+            metrics["resumed_from_step"] = start_step
+        self.log(metrics)
+        return metrics
+
+    def _resume(self, checkpoint: Union[str, bool], optimizer, scheduler):
+        """Load `checkpoint` and return the (epoch, batches to skip) to continue from."""
+        path = latest_checkpoint(self.args.output_dir) if checkpoint is True else checkpoint
+        if path is None:
+            raise ValueError(f"No checkpoint found in {self.args.output_dir}")
+        state = load_checkpoint(path, self.model, optimizer, scheduler, self.device, self.dist.rank)
+        if state["world_size"] != self.dist.world_size:
+            raise ValueError(f"{path} was written by {state['world_size']} ranks; resume with the same number "
+                             f"(got {self.dist.world_size}) to keep the batch order")
+        self.global_step = self._saved_step = state["global_step"]
+        self.log_history = state["log_history"]
+        epoch, done = state["epoch"], state["batches_done"]
+        if done >= state["batches_in_epoch"]:
+            epoch, done = epoch + 1, 0
+        set_rng_state(state["rng"], self.device)
+        logging.info("Resumed from %s at step %d (epoch %d, %d batches in)", path, self.global_step, epoch, done)
+        return epoch, done
+
+    @torch.inference_mode()
+    def evaluate(self) -> Dict[str, float]:
+        # Same masks on every evaluation, without advancing the training RNG.
+        with fixed_mask_seed(self.args.seed, self.device):
+            return self._evaluate()
+
+    def _evaluate(self) -> Dict[str, float]:
+        self.model.eval()
+        loader = self._loader(self.eval_dataset, self.eval_lengths, self.args.per_device_eval_batch_size, False)
+        total = torch.zeros((), device=self.device)
+        count = 0
+        start = time.perf_counter()
+        for batch in loader:
+            batch = self._prepare(batch)
+            with self._autocast():
+                loss = self.model(**batch).loss
+            # Weighted by batch size, as `Trainer.evaluate` does
+            n = batch["input_ids"].size(0)
+            total += loss.float() * n
+            count += n
+        self.model.train()
+        stats = all_reduce_sum(torch.stack([total, torch.tensor(float(count), device=self.device)]))
+        metrics = {"eval_loss": (stats[0] / stats[1].clamp(min=1)).item(), "eval_runtime": round(time.perf_counter() - start, 4)}
+        self.log(metrics)
+        return metrics
+
+    def log(self, logs: Dict[str, float]):
+        logs = dict(logs)
+        call_callbacks(self.step_callbacks, "on_log", logs, self.global_step)
+        logs["step"] = self.global_step
+        self.log_history.append(logs)
+        if self.dist.is_main:
+            logging.info("%s", logs)
+
+    def _save_checkpoint(self, optimizer, scheduler, epoch: int, batches_done: int, batches_in_epoch: int):
+        if self._saved_step == self.global_step:
+            return
+        self._saved_step = self.global_step
+        state = {"epoch": epoch, "batches_done": batches_done, "batches_in_epoch": batches_in_epoch,
+                 "world_size": self.dist.world_size, "log_history": list(self.log_history)}
+        self._checkpointer.save(self.global_step, self.model, optimizer, scheduler, self.device, state)
+
+    def save_model(self, output_dir: Optional[str] = None):
+        """Write the model with `save_pretrained` from rank 0; other ranks wait for it."""
+        output_dir = output_dir or self.args.output_dir
+        self._checkpointer.wait()
+        if self.dist.is_main:
+            os.makedirs(output_dir, exist_ok=True)
+            self.model.save_pretrained(output_dir)
+        barrier()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Vectorised masked‑LM corruption for PL‑BERT.  `MLMMasker` selects positions
+and corrupts them in a handful of whole‑tensor operations on whatever device
+`input_ids` lives on, so when training on a GPU the masking runs there
+rather than in the data loader:
+
+* special tokens (`<pad>`, `<mask>`, `<unk>`, …) and the word separator `_`
+  are never selected;
+* selected positions follow the standard 80/10/10 scheme – replaced by
+  `<mask>`, by a random non‑special token, or left unchanged;
+* with `whole_word=True` the selection is drawn per `_`‑delimited word, so
+  all phonemes of a word are masked together.
+
+Labels are the original IDs at selected positions and -100 elsewhere.
+
+Masks are drawn from the global torch RNG.  Evaluation runs inside
+`fixed_mask_seed`, so every evaluation scores the same masks and does not
+advance the training RNG (which keeps resumed runs bit‑exact).
+"""
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import torch
+
+
+class MLMMasker:
+    def __init__(self, token_to_id: Dict[str, int], mlm_probability: float = 0.15,
+                 mask_replace_prob: float = 0.8, random_replace_prob: float = 0.1,
+                 whole_word: bool = False, word_separator: str = "_"):
+        self.mlm_probability = mlm_probability
+        self.mask_replace_prob = mask_replace_prob
+        self.random_replace_prob = random_replace_prob
+        self.whole_word = whole_word
+        self.mask_token_id = token_to_id["<mask>"]
+        self.separator_id = token_to_id.get(word_separator, -1)
+        vocab_size = max(token_to_id.values()) + 1
+        protected = torch.zeros(vocab_size, dtype=torch.bool)
+        for tok, idx in token_to_id.items():
+            if (tok.startswith("<") and tok.endswith(">")) or tok == word_separator:
+                protected[idx] = True
+        self._protected = protected
+        self._random_ids = (~protected).nonzero().flatten()
+        self._device_tables = {}
+
+    def _tables(self, device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+        if device not in self._device_tables:
+            self._device_tables[device] = (self._protected.to(device), self._random_ids.to(device))
+        return self._device_tables[device]
+
+    def select(self, input_ids: torch.Tensor, generator: Optional[torch.Generator] = None) -> torch.Tensor:
+        """Boolean mask of the positions to predict."""
+        protected, _ = self._tables(input_ids.device)
+        can_mask = ~protected[input_ids]
+        draw = torch.rand(input_ids.shape, device=input_ids.device, generator=generator)
+        if self.whole_word:
+            # Word index of every position: separators start a new word.
+            word_ids = torch.cumsum(input_ids == self.separator_id, dim=1)
+            draw = draw.gather(1, word_ids.clamp_(max=input_ids.size(1) - 1))
+        return (draw < self.mlm_probability) & can_mask
+
+    def __call__(self, input_ids: torch.Tensor, generator: Optional[torch.Generator] = None
+                 ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Return (corrupted input_ids, labels); `input_ids` is not modified."""
+        _, random_ids = self._tables(input_ids.device)
+        selected = self.select(input_ids, generator)
+        labels = torch.where(selected, input_ids, torch.full_like(input_ids, -100))
+        action = torch.rand(input_ids.shape, device=input_ids.device, generator=generator)
+        random_tokens = random_ids[torch.randint(len(random_ids), input_ids.shape, device=input_ids.device,
+                                                 generator=generator)]
+        corrupted = torch.where(action < self.mask_replace_prob, self.mask_token_id, random_tokens)
+        keep = action >= self.mask_replace_prob + self.random_replace_prob
+        corrupted = torch.where(selected & ~keep, corrupted, input_ids)
+        return corrupted, labels
+
+    def apply(self, batch: Dict[str, torch.Tensor], generator: Optional[torch.Generator] = None
+              ) -> Dict[str, torch.Tensor]:
+        """Mask `batch["input_ids"]` and add `labels`, on the batch's device."""
+        batch = dict(batch)
+        batch["input_ids"], batch["labels"] = self(batch["input_ids"], generator)
+        return batch
+
+
+@contextmanager
+def fixed_mask_seed(seed: int, device: torch.device):
+    """Run the block on a private RNG seeded with `seed`; the outer RNG state is restored afterwards."""
+    with torch.random.fork_rng(devices=[device] if device.type == "cuda" else []):
+        torch.manual_seed(seed)
+        yield
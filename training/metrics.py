@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+Training instrumentation shared by both engines.  `LeanTrainer` and
+`BucketedTrainer` accept `step_callbacks`, a list of `TrainingCallback`
+objects, and drive them through the same hooks:
+
+* `on_fetch_begin()` – the loop is about to wait for the next batch;
+* `on_batch_ready(batch)` – a micro‑batch has arrived and compute starts;
+* `on_step_end(step)` – an optimisation step has finished;
+* `on_log(logs, step)` – a log record is about to be emitted (callbacks may
+  add entries);
+* `on_train_begin()` / `on_train_end()`.
+
+`ThroughputMetrics` turns these into rolling averages over the last
+`window` optimisation steps – tokens/sec, sequences/sec, padding ratio,
+data‑loading wait vs compute time per step and peak memory – adds them to
+every training log record and appends every record to a JSONL file.  Times
+are host wall‑clock; on a GPU, compute therefore includes any wait for
+queued kernels.  Evaluation, logging and checkpointing between steps are
+not counted.  Token and sequence counts are summed over ranks under
+`torchrun`.
+
+`ProfilerWindow` records `num_steps` optimisation steps with
+`torch.profiler` starting after step `start_step` and writes a Chrome trace
+(open in `chrome://tracing` or https://ui.perfetto.dev).
+"""
+import json
+import logging
+import os
+import resource
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import torch
+
+from distributed import all_reduce_sum
+
+
+class TrainingCallback:
+    def on_train_begin(self):
+        pass
+
+    def on_fetch_begin(self):
+        pass
+
+    def on_batch_ready(self, batch: Dict[str, torch.Tensor]):
+        pass
+
+    def on_step_end(self, step: int):
+        pass
+
+    def on_log(self, logs: Dict[str, float], step: int):
+        pass
+
+    def on_train_end(self):
+        pass
+
+
+def call_callbacks(callbacks: List[TrainingCallback], hook: str, *args):
+    for callback in callbacks:
+        getattr(callback, hook)(*args)
+
+
+def peak_memory_mb() -> float:
+    """CUDA peak allocation if on a GPU, otherwise the process's peak RSS."""
+    if torch.cuda.is_available():
+        return torch.cuda.max_memory_allocated() / 2**20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def count_sequences(batch: Dict[str, torch.Tensor]):
+    """Sentences in `batch`; packed rows hold several (one per `sequence_ids` run)."""
+    seq = batch.get("sequence_ids")
+    if seq is None:
+        return batch["input_ids"].size(0)
+    starts = (seq[:, 1:] != seq[:, :-1]) & (seq[:, 1:] >= 0)
+    return seq.size(0) + starts.sum()
+
+
+class ThroughputMetrics(TrainingCallback):
+    def __init__(self, output_file: Optional[str] = None, window: int = 100, is_main: bool = True):
+        self.output_file = output_file
+        self.window = window
+        self.is_main = is_main
+        self._steps = deque(maxlen=window)
+        self._reset_step()
+        self._fetch_start = None
+        self._compute_start = None
+
+    def _reset_step(self):
+        self._wait = self._compute = 0.0
+        # Counts may be tensors (possibly on the GPU) so that counting never forces a sync.
+        self._tokens = self._padded = self._sequences = 0
+
+    def on_train_begin(self):
+        if self.output_file and self.is_main:
+            os.makedirs(os.path.dirname(os.path.abspath(self.output_file)), exist_ok=True)
+
+    def _close_compute(self, now: float):
+        if self._compute_start is not None:
+            self._compute += now - self._compute_start
+            self._compute_start = None
+
+    def on_fetch_begin(self):
+        now = time.perf_counter()
+        self._close_compute(now)
+        self._fetch_start = now
+
+    def on_batch_ready(self, batch):
+        now = time.perf_counter()
+        if self._fetch_start is not None:
+            self._wait += now - self._fetch_start
+            self._fetch_start = None
+        self._compute_start = now
+        mask = batch.get("attention_mask")
+        self._tokens += mask.sum() if mask is not None else batch["input_ids"].numel()
+        self._padded += batch["input_ids"].numel()
+        self._sequences += count_sequences(batch)
+
+    def on_step_end(self, step: int):
+        now = time.perf_counter()
+        self._close_compute(now)
+        self._steps.append((self._wait, self._compute, self._tokens, self._padded, self._sequences))
+        self._reset_step()
+        # Until the loop asks for the next batch, anything else (logging, eval, saving) is not measured.
+        self._fetch_start = now
+
+    def summary(self) -> Dict[str, float]:
+        """Rolling averages over the last `window` steps (sums over ranks for counts)."""
+        if not self._steps:
+            return {}
+        wait = sum(s[0] for s in self._steps)
+        compute = sum(s[1] for s in self._steps)
+        counts = torch.tensor([float(sum(s[i] for s in self._steps)) for i in (2, 3, 4)], dtype=torch.float64,
+                              device="cuda" if torch.cuda.is_available() else "cpu")
+        tokens, padded, sequences = all_reduce_sum(counts).tolist()
+        n, elapsed = len(self._steps), wait + compute
+        return {
+            "tokens_per_sec": round(tokens / elapsed, 1) if elapsed else 0.0,
+            "sequences_per_sec": round(sequences / elapsed, 2) if elapsed else 0.0,
+            "padding_ratio": round(1 - tokens / padded, 4) if padded else 0.0,
+            "data_wait_ms": round(1e3 * wait / n, 2),
+            "compute_ms": round(1e3 * compute / n, 2),
+            "data_wait_fraction": round(wait / elapsed, 4) if elapsed else 0.0,
+            "peak_memory_mb": round(peak_memory_mb(), 1),
+        }
+
+    def on_log(self, logs, step):
+        if "loss" in logs:
+            # Called on every rank, so the all-reduce in summary() is matched.
+            logs.update(self.summary())
+        if self.output_file and self.is_main:
+            with open(self.output_file, "a") as f:
+                f.write(json.dumps(dict(logs, step=step, time=time.time())) + "\n")
+
+
+class ProfilerWindow(TrainingCallback):
+    def __init__(self, output_dir: str, start_step: int = 10, num_steps: int = 5, rank: int = 0):
+        self.output_dir = output_dir
+        self.start_step = start_step
+        self.num_steps = num_steps
+        self.rank = rank
+        self._profiler = None
+
+    def on_step_end(self, step: int):
+        if self._profiler is None and step == self.start_step:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._profiler = torch.profiler.profile(activities=activities, record_shapes=True,
+                                                    profile_memory=True)
+            self._profiler.__enter__()
+        elif self._profiler is not None and step >= self.start_step + self.num_steps:
+            self._stop(step)
+
+    def on_train_end(self):
+        if self._profiler is not None:
+            self._stop(None)
+
+    def _stop(self, step: Optional[int]):
+        self._profiler.__exit__(None, None, None)
+        os.makedirs(self.output_dir, exist_ok=True)
+        end = step if step is not None else "end"
+        path = os.path.join(self.output_dir, f"trace_rank{self.rank}_steps{self.start_step + 1}-{end}.json")
+        self._profiler.export_chrome_trace(path)
+        logging.info("Wrote profiler trace %s", path)
+        self._profiler = None
+
+
+def make_step_callbacks(out_dir: str, metrics_file: Optional[str] = None, window: int = 100,
+                        profile_steps: int = 0, profile_start: int = 10, rank: int = 0) -> List[TrainingCallback]:
+    """The callbacks behind the training scripts' `--metrics_*` and `--profile_*` options."""
+    callbacks = [ThroughputMetrics(metrics_file or os.path.join(out_dir, "metrics.jsonl"), window, is_main=rank == 0)]
+    if profile_steps:
+        callbacks.append(ProfilerWindow(os.path.join(out_dir, "profile"), profile_start, profile_steps, rank))
+    return callbacks
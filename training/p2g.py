@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Joint MLM + phoneme‑to‑grapheme (P2G) pre‑training model for PL‑BERT.  The
+original PL‑BERT trains the encoder on two objectives: masked phoneme
+prediction and predicting the grapheme of every phoneme position.  Both
+heads read the same encoder output, so the P2G objective costs one extra
+linear layer and softmax per step, not a second forward pass.
+
+`AlbertForMLMAndP2G` extends `PackedAlbertForMaskedLM`, so it also trains on
+packed windows.  P2G targets come from the `graphemes` field of the
+pre‑tokenised data (`grapheme_ids`, aligned with `input_ids`); the collator
+turns them into `p2g_labels` with unaligned and padded positions set to
+-100.  The grapheme vocabulary is the shared token map.
+
+The MLM weights keep their `AlbertForMaskedLM` names, so checkpoints still
+load with `AlbertForMaskedLM.from_pretrained` (the P2G head is skipped).
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import torch
+from torch import nn
+from transformers.utils import ModelOutput
+
+from packing import PackedAlbertForMaskedLM
+
+
+@dataclass
+class JointPretrainingOutput(ModelOutput):
+    loss: Optional[torch.FloatTensor] = None
+    logits: torch.FloatTensor = None
+    p2g_logits: torch.FloatTensor = None
+    mlm_loss: Optional[torch.FloatTensor] = None
+    p2g_loss: Optional[torch.FloatTensor] = None
+
+
+class AlbertForMLMAndP2G(PackedAlbertForMaskedLM):
+    """ALBERT encoder with an MLM head and a linear P2G head over one forward pass."""
+
+    def __init__(self, config, p2g_weight: float = 1.0):
+        super().__init__(config)
+        self.p2g_head = nn.Linear(config.hidden_size, config.vocab_size)
+        self.p2g_weight = p2g_weight
+        self.post_init()
+
+    def forward(self, input_ids=None, attention_mask=None, labels=None, p2g_labels=None,
+                sequence_ids: Optional[torch.Tensor] = None, position_ids=None, **kwargs):
+        hidden = self.encode(input_ids, attention_mask=attention_mask, sequence_ids=sequence_ids,
+                             position_ids=position_ids)
+        logits = self.predictions(hidden)
+        p2g_logits = self.p2g_head(hidden)
+        loss_fct = nn.CrossEntropyLoss()
+        mlm_loss = p2g_loss = loss = None
+        if labels is not None:
+            mlm_loss = loss_fct(logits.view(-1, self.config.vocab_size), labels.view(-1))
+            loss = mlm_loss
+        if p2g_labels is not None:
+            # Summed and divided by the target count, so a batch without any
+            # aligned graphemes contributes 0 instead of NaN.
+            p2g_loss = (nn.functional.cross_entropy(p2g_logits.view(-1, self.config.vocab_size),
+                                                    p2g_labels.view(-1), reduction="sum")
+                        / (p2g_labels != -100).sum().clamp(min=1))
+            loss = self.p2g_weight * p2g_loss if loss is None else loss + self.p2g_weight * p2g_loss
+        return JointPretrainingOutput(loss=loss, logits=logits, p2g_logits=p2g_logits,
+                                      mlm_loss=mlm_loss, p2g_loss=p2g_loss)
@@ -5,6 +5,12 @@ weights, configuration and token maps into a target directory with names
 expected by the StyleTTS2 codebase.  A minimal `config.yml` and `util.py`
 are generated to mirror the format used by the official PL‑BERT release.
 
+The weights are written as `step_000001.safetensors`: only the ALBERT
+encoder that StyleTTS2 uses, with the `albert.` prefix removed.  Unlike a
+pickled `.pt` file, it can be memory‑mapped and read tensor by tensor
+(`util.load_weights`), so loading is faster, needs no second full copy of
+the weights in RAM and cannot execute code.
+
 Example:
 
     python training/pack.py \
@@ -12,6 +18,19 @@ Example:
       --token_maps phonemize/token_maps.pkl \
       --output_dir runs/plbert_so/packaged
 
+For serving, `--export torchscript onnx` additionally writes the encoder
+alone (no MLM head, no pooler) as `encoder.pt` / `encoder.onnx` with
+dynamic batch and sequence axes, and `--quantize` adds dynamic int8
+variants (see `export_encoder.py`).  Every export is checked against the
+fp32 model on `--parity_data` (dev sentences; random sequences if not
+given) and the errors and CPU latencies are written to
+`export_report.json`; packaging fails if an fp32 export differs by more
+than `--atol` or an int8 export has a mean cosine similarity below
+`--min_cosine`:
+
+    python training/pack.py ... --export torchscript --quantize \
+      --parity_data data_plbert/dev_tok
+
 """
 import argparse
 import json
@@ -20,26 +39,83 @@ import os
 import shutil
 import pickle
 
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+from transformers import AlbertConfig
+
+from export_encoder import EXPORT_FORMATS, build_encoder, check_parity, export
+
+WEIGHTS_NAME = "step_000001.safetensors"
+ENCODER_PREFIX = "albert."
+
+
+def load_encoder_state(input_dir: str):
+    """Encoder tensors of the checkpoint in `input_dir`, keyed as in `AlbertModel`."""
+    src = os.path.join(input_dir, "model.safetensors")
+    if os.path.exists(src):
+        # Memory-mapped: only the encoder tensors are read.
+        with safe_open(src, framework="pt") as f:
+            state = {k: f.get_tensor(k) for k in f.keys() if k.startswith(ENCODER_PREFIX)}
+    else:
+        src = os.path.join(input_dir, "pytorch_model.bin")
+        if not os.path.exists(src):
+            raise FileNotFoundError(f"No model.safetensors or pytorch_model.bin in {input_dir}")
+        full = torch.load(src, map_location="cpu", weights_only=True)
+        state = {k: v for k, v in full.items() if k.startswith(ENCODER_PREFIX)}
+    if not state:
+        raise ValueError(f"{src} contains no '{ENCODER_PREFIX}*' encoder weights")
+    logging.info("Read %d encoder tensors from %s", len(state), src)
+    # clone() also separates tensors that share storage, which safetensors refuses to save.
+    return {k[len(ENCODER_PREFIX):]: v.contiguous().clone() for k, v in state.items()}
+
+
+def parity_batches(config: AlbertConfig, token_to_id, data_path=None, samples: int = 64, batch_size: int = 8):
+    """Length‑grouped, padded batches of the first `samples` sentences of `data_path`.
+
+    Without data, random sequences of lengths spread over the model's range
+    are used instead, so the dynamic sequence axis is still exercised.
+    """
+    from batching import CustomMLMDataCollator, LengthGroupedSampler
+
+    max_len = config.max_position_embeddings
+    if data_path:
+        from train_plbert_so import load_split
+        dataset = load_split(data_path, token_to_id)
+        sequences = [dataset[i]["input_ids"] for i in range(min(samples, len(dataset)))]
+    else:
+        logging.warning("No --parity_data given; checking the exports on random sequences")
+        generator = torch.Generator().manual_seed(0)
+        lengths = torch.linspace(2, max_len, samples).long()
+        sequences = [torch.randint(0, config.vocab_size, (int(n),), generator=generator).tolist() for n in lengths]
+    collator = CustomMLMDataCollator(token_to_id, max_length=max_len, apply_mask=False)
+    lengths = [min(len(seq), max_len) for seq in sequences]
+    return [collator.pad([sequences[i] for i in group])
+            for group in LengthGroupedSampler(lengths, batch_size, shuffle=False).batches()]
+
 
 def main():
     parser = argparse.ArgumentParser(description="Package a PL‑BERT model for StyleTTS2.")
     parser.add_argument("--input_dir", type=str, required=True, help="Directory containing the trained PL‑BERT model.")
     parser.add_argument("--token_maps", type=str, required=True, help="Pickled token map.")
     parser.add_argument("--output_dir", type=str, required=True, help="Directory to write packaged model.")
+    parser.add_argument("--export", type=str, nargs="+", choices=EXPORT_FORMATS, default=[],
+                        help="Also export the encoder for inference (TorchScript and/or ONNX).")
+    parser.add_argument("--quantize", action="store_true", help="Also write dynamic int8 variants of the exports.")
+    parser.add_argument("--parity_data", type=str, default=None,
+                        help="Dev JSONL file or pre-tokenised directory for the export parity check.")
+    parser.add_argument("--parity_samples", type=int, default=64, help="Sentences used for the parity check.")
+    parser.add_argument("--parity_batch_size", type=int, default=8)
+    parser.add_argument("--atol", type=float, default=1e-4, help="Max abs error allowed for fp32 exports.")
+    parser.add_argument("--min_cosine", type=float, default=0.99,
+                        help="Minimum mean cosine similarity to fp32 for int8 exports.")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads for the latency measurement.")
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
     os.makedirs(args.output_dir, exist_ok=True)
-    # Copy model weight file (pytorch_model.bin) as step_000001.pt
-    # or .t7 to mimic Torch; we simply copy the binary.
-    src_weights = os.path.join(args.input_dir, "pytorch_model.bin")
-    if not os.path.exists(src_weights):
-        # try HuggingFace safe tensor file
-        for fname in os.listdir(args.input_dir):
-            if fname.endswith(".bin"):
-                src_weights = os.path.join(args.input_dir, fname)
-                break
-    dst_weights = os.path.join(args.output_dir, "step_000001.pt")
-    shutil.copy(src_weights, dst_weights)
+    # Encoder weights as safetensors (memory-mappable, no pickle)
+    encoder_state = load_encoder_state(args.input_dir)
+    save_file(encoder_state, os.path.join(args.output_dir, WEIGHTS_NAME), metadata={"format": "pt"})
     # Copy config.json to config.yml (YAML format expected by StyleTTS2)
     src_config = os.path.join(args.input_dir, "config.json")
     with open(src_config, "r", encoding="utf-8") as f:
@@ -63,17 +139,66 @@ Utility functions for Somali PL-BERT integration with StyleTTS2.
 This module exposes `load_token_map` to load the token dictionary and
 `map_tokens` to convert phoneme strings into integer sequences.  It also
 provides a `get_config` helper to return the model hyperparameters as a
-dictionary.  Adjust these functions as needed to align with the StyleTTS2
-frontend.
+dictionary, and `load_weights` to copy the memory-mapped safetensors
+weights into an `AlbertModel` one tensor at a time.  Adjust these functions
+as needed to align with the StyleTTS2 frontend.
 """''')
-        f.write("\n\nimport pickle\n\n")
+        f.write("\n\nimport os\nimport pickle\n\n")
         f.write("def load_token_map(path: str):\n")
         f.write("    with open(path, 'rb') as f:\n        return pickle.load(f)\n\n")
         f.write("def map_tokens(text: str, token_map: dict):\n")
         f.write("    return [token_map.get(tok, token_map.get('<unk>')) for tok in text.split()]\n\n")
         f.write("def get_config():\n")
-        f.write(f"    return {{'vocab_size': {cfg['vocab_size']}, 'hidden_size': {cfg['hidden_size']}}}\n")
+        f.write(f"    return {{'vocab_size': {cfg['vocab_size']}, 'hidden_size': {cfg['hidden_size']}}}\n\n")
+        f.write(f"def load_weights(model, path=os.path.join(os.path.dirname(__file__), '{WEIGHTS_NAME}')):\n")
+        f.write("    from safetensors import safe_open\n")
+        f.write("    import torch\n")
+        f.write("    state = model.state_dict()\n")
+        f.write("    with safe_open(path, framework='pt') as f, torch.no_grad():\n")
+        f.write("        keys = set(f.keys())\n")
+        f.write("        # The MLM model has no pooler, and position_ids / token_type_ids buffers may or may not\n")
+        f.write("        # be saved; neither is needed for last_hidden_state.\n")
+        f.write("        optional = {k for k in keys | set(state)\n")
+        f.write("                    if k.startswith('pooler.') or k.startswith('embeddings.') and k.endswith('_ids')}\n")
+        f.write("        missing = sorted(set(state) - keys - optional)\n")
+        f.write("        unexpected = sorted(keys - set(state) - optional)\n")
+        f.write("        if missing or unexpected:\n")
+        f.write("            raise ValueError(f'{path} does not match the model: missing {missing}, '\n")
+        f.write("                             f'unexpected {unexpected}')\n")
+        f.write("        for key in sorted(keys & set(state)):\n")
+        f.write("            shape = tuple(f.get_slice(key).get_shape())\n")
+        f.write("            if shape != tuple(state[key].shape):\n")
+        f.write("                raise ValueError(f'{key}: checkpoint shape {shape} does not match model '\n")
+        f.write("                                 f'{tuple(state[key].shape)}')\n")
+        f.write("        for key in sorted(keys & set(state)):\n")
+        f.write("            state[key].copy_(f.get_tensor(key))\n")
+        f.write("    return model\n")
     logging.info("Packaged PL‑BERT into %s", args.output_dir)
+    if args.export:
+        export_and_check(args, encoder_state)
+
+
+def export_and_check(args, encoder_state):
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    config = AlbertConfig.from_pretrained(args.input_dir)
+    encoder = build_encoder(config, encoder_state)
+    files = export(encoder, config, args.output_dir, args.export, quantize_int8=args.quantize)
+    with open(args.token_maps, "rb") as f:
+        token_to_id = pickle.load(f)
+    batches = parity_batches(config, token_to_id, args.parity_data, args.parity_samples, args.parity_batch_size)
+    report = check_parity(encoder, files, batches)
+    with open(os.path.join(args.output_dir, "export_report.json"), "w") as f:
+        json.dump({"files": {k: os.path.basename(v) for k, v in files.items()}, "threads": torch.get_num_threads(),
+                   "sentences": sum(len(b["input_ids"]) for b in batches), "results": report}, f, indent=2)
+    print(f"{'variant':<18} {'max_abs_err':>12} {'mean_abs_err':>12} {'cosine':>8} {'ms/batch':>9}")
+    for name, r in report.items():
+        print(f"{name:<18} {r['max_abs_err']:>12.2e} {r['mean_abs_err']:>12.2e} {r['mean_cosine']:>8.5f} "
+              f"{r['ms_per_batch']:>9.2f}")
+    failed = [name for name, r in report.items()
+              if (r["mean_cosine"] < args.min_cosine if name.endswith("_int8") else r["max_abs_err"] > args.atol)]
+    if failed:
+        raise ValueError(f"Exported encoder(s) {failed} do not match the fp32 model (see export_report.json)")
 
 
 if __name__ == "__main__":
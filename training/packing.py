@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Sequence packing for PL‑BERT masked LM pre‑training.  Most Somali
+sentences are short, so even length‑bucketed batches carry a fair amount of
+padding.  In packing mode the encoded sentences are treated as one token
+stream, with the word separator `_` inserted between consecutive sentences,
+and cut into consecutive `max_len` windows:
+
+    stream:   s0 _ s1 _ s2 _ s3 _ …
+    windows:  [s0 _ s1 _ s2a] [s2b _ s3 _ …] …
+
+Window `i` is sliced from the memory‑mapped `PretokenizedDataset` arrays on
+demand (a binary search over the offsets index), so the packed dataset
+holds no tokens in RAM.  Alongside `input_ids` (and `grapheme_ids` when the
+dataset has P2G targets) each window carries a `sequence_ids` row (which
+sentence each position belongs to) and `position_ids` that restart at 0 for
+every sentence.  `PackedAlbertForMaskedLM`
+turns `sequence_ids` into a block‑diagonal attention mask, so sentences
+packed into the same window do not attend to each other.  A sentence cut at
+a window edge is trained as two independent fragments.
+"""
+import bisect
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+from torch.nn import CrossEntropyLoss
+from torch.utils.data import Dataset
+from transformers import AlbertForMaskedLM
+from transformers.modeling_outputs import MaskedLMOutput
+
+from pretokenize import ITEM_KEYS
+
+
+class _StreamStarts:
+    """Lazy sequence of the stream offset of every sentence (for `bisect`)."""
+
+    def __init__(self, offsets: np.ndarray):
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, j: int) -> int:
+        # Every earlier sentence is followed by one separator.
+        return int(self.offsets[j]) + j
+
+
+class PackedDataset(Dataset):
+    """Fixed‑length windows over the separator‑joined token stream of `dataset`."""
+
+    def __init__(self, dataset, max_length: int, separator_id: int):
+        if hasattr(dataset, "offsets"):
+            # PretokenizedDataset: slice the memory-mapped arrays directly.
+            # Grapheme IDs are aligned with the phonemes, so they share offsets.
+            self.offsets = dataset.offsets["phonemes"]
+            self.tokens = {ITEM_KEYS[f]: dataset.tokens[f] for f in dataset.meta["fields"]}
+        else:
+            sequences = dataset["input_ids"]
+            self.offsets = np.concatenate([[0], np.cumsum([len(seq) for seq in sequences])]).astype(np.int64)
+            self.tokens = {}
+            for key in ("input_ids", "grapheme_ids"):
+                if key in dataset.column_names:
+                    self.tokens[key] = np.fromiter((tok for seq in dataset[key] for tok in seq), dtype=np.int64,
+                                                   count=int(self.offsets[-1]))
+        self.max_length = max_length
+        self.separator_id = separator_id
+        self.num_sentences = len(self.offsets) - 1
+        self._starts = _StreamStarts(self.offsets)
+        # The trailing separator after the last sentence is dropped.
+        self.stream_length = max(int(self.offsets[-1]) + self.num_sentences - 1, 0)
+
+    def __len__(self) -> int:
+        return -(-self.stream_length // self.max_length)
+
+    def lengths(self) -> np.ndarray:
+        lengths = np.full(len(self), self.max_length, dtype=np.int64)
+        if len(lengths):
+            lengths[-1] = self.stream_length - (len(self) - 1) * self.max_length
+        return lengths
+
+    def __getitem__(self, idx: int) -> Dict[str, np.ndarray]:
+        a = idx * self.max_length
+        b = min(a + self.max_length, self.stream_length)
+        j0 = bisect.bisect_right(self._starts, a) - 1
+        j1 = bisect.bisect_left(self._starts, b, lo=j0)
+        offsets = np.asarray(self.offsets[j0:j1 + 1], dtype=np.int64)
+        starts = offsets + np.arange(j0, j0 + len(offsets))
+        pos = np.arange(a, b)
+        rel = np.searchsorted(starts, pos, side="right") - 1
+        local = pos - starts[rel]
+        is_sep = local >= offsets[rel + 1] - offsets[rel]
+        src = np.where(is_sep, 0, offsets[rel] + local)
+        item = {}
+        for key, tokens in self.tokens.items():
+            ids = np.where(is_sep, self.separator_id, tokens[src] if len(src) else src)
+            item[key] = ids.astype(np.int64)
+        item["sequence_ids"] = rel
+        # Positions restart at every sentence, and at the window edge for a cut sentence.
+        item["position_ids"] = pos - np.maximum(starts[rel], a)
+        return item
+
+
+def block_attention_mask(sequence_ids: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+    """Additive (batch, 1, L, L) mask allowing attention only within a sentence; -1 marks padding."""
+    allowed = (sequence_ids[:, :, None] == sequence_ids[:, None, :]) & (sequence_ids[:, None, :] >= 0)
+    return (1.0 - allowed[:, None].to(dtype)) * torch.finfo(dtype).min
+
+
+class PackedAlbertForMaskedLM(AlbertForMaskedLM):
+    """`AlbertForMaskedLM` that also accepts packed batches with `sequence_ids`.
+
+    Without `sequence_ids` it behaves exactly like the parent class; the
+    weights are identical, so checkpoints load with `AlbertForMaskedLM`.
+    """
+
+    def encode(self, input_ids, attention_mask=None, sequence_ids: Optional[torch.Tensor] = None,
+               position_ids=None) -> torch.Tensor:
+        """Final encoder hidden states, with block‑diagonal attention if `sequence_ids` is given."""
+        albert = self.albert
+        if sequence_ids is None:
+            return albert(input_ids, attention_mask=attention_mask, position_ids=position_ids)[0]
+        embeddings = albert.embeddings(input_ids, position_ids=position_ids)
+        mask = block_attention_mask(sequence_ids, embeddings.dtype)
+        head_mask = albert.get_head_mask(None, self.config.num_hidden_layers)
+        return albert.encoder(embeddings, mask, head_mask=head_mask, return_dict=True)[0]
+
+    def forward(self, input_ids=None, attention_mask=None, labels=None,
+                sequence_ids: Optional[torch.Tensor] = None, position_ids=None, **kwargs):
+        if sequence_ids is None:
+            return super().forward(input_ids=input_ids, attention_mask=attention_mask, labels=labels,
+                                   position_ids=position_ids, **kwargs)
+        hidden = self.encode(input_ids, sequence_ids=sequence_ids, position_ids=position_ids)
+        logits = self.predictions(hidden)
+        loss = None
+        if labels is not None:
+            loss = CrossEntropyLoss()(logits.view(-1, self.config.vocab_size), labels.view(-1))
+        return MaskedLMOutput(loss=loss, logits=logits)
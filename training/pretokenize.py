@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""
+Compile a phoneme/grapheme JSONL file into a binary pre‑tokenised dataset.
+Reading the JSONL, mapping tokens to IDs and building a HuggingFace
+`Dataset` on every training launch is slow and keeps the whole corpus in
+memory.  This script does the encoding once and writes, for each field, a
+flat token array plus an offsets index:
+
+    <output>/meta.json              vocab size, dtype, sequence/token counts
+    <output>/phonemes.bin           all token IDs back to back (uint8/uint16)
+    <output>/phonemes.offsets.npy   int64 start offset of every sequence (+ end)
+
+    <output>/graphemes.bin          grapheme IDs aligned with the phonemes
+    <output>/graphemes.offsets.npy
+
+Sequence `i` is `tokens[offsets[i]:offsets[i + 1]]`.  Both files are
+memory‑mapped by `PretokenizedDataset`, so training starts immediately and
+resident memory does not grow with corpus size.  The training and
+evaluation scripts accept such a directory wherever they accept a JSONL
+file.
+
+The `graphemes` field holds the P2G targets: one grapheme ID per phoneme
+position.  Words whose phoneme and grapheme token counts differ (e.g. with
+eSpeak phonemes) cannot be aligned position by position; their positions
+hold `<pad>` and are ignored by the P2G loss.
+
+Example:
+
+    python training/pretokenize.py \
+      --input data_plbert/train.jsonl \
+      --token_maps phonemize/token_maps.pkl \
+      --output data_plbert/train_tok
+
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from torch.utils.data import Dataset
+
+FIELDS = ("phonemes", "graphemes")
+META_FILE = "meta.json"
+# Dataset item key for each compiled field.
+ITEM_KEYS = {"phonemes": "input_ids", "graphemes": "grapheme_ids"}
+
+
+def token_map_digest(token_to_id: Dict[str, int]) -> str:
+    """Stable fingerprint of a token map, stored with the compiled data."""
+    items = json.dumps(sorted(token_to_id.items()), ensure_ascii=False)
+    return hashlib.sha1(items.encode("utf-8")).hexdigest()
+
+
+def token_dtype(vocab_size: int) -> np.dtype:
+    if vocab_size <= np.iinfo(np.uint8).max + 1:
+        return np.dtype(np.uint8)
+    if vocab_size <= np.iinfo(np.uint16).max + 1:
+        return np.dtype(np.uint16)
+    return np.dtype(np.int32)
+
+
+def is_pretokenized(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def align_graphemes(phonemes: List[str], graphemes: List[str], separator: str = "_") -> List[Optional[str]]:
+    """Grapheme token for every phoneme position, or None where a word cannot be aligned."""
+    phone_words = " ".join(phonemes).split(f" {separator} ")
+    graph_words = " ".join(graphemes).split(f" {separator} ")
+    if len(phone_words) != len(graph_words):
+        return [None] * len(phonemes)
+    aligned: List[Optional[str]] = []
+    for i, (p_word, g_word) in enumerate(zip(phone_words, graph_words)):
+        if i:
+            aligned.append(separator)
+        p_toks, g_toks = p_word.split(), g_word.split()
+        aligned.extend(g_toks if len(p_toks) == len(g_toks) else [None] * len(p_toks))
+    return aligned
+
+
+def encode_example(obj: Dict, token_to_id: Dict[str, int], fields: Sequence[str] = FIELDS) -> Dict[str, List[int]]:
+    """Token IDs of each field of one JSONL record."""
+    unk = token_to_id["<unk>"]
+    phonemes = obj["phonemes"].split()
+    encoded = {"phonemes": [token_to_id.get(tok, unk) for tok in phonemes]}
+    if "graphemes" in fields:
+        pad = token_to_id["<pad>"]
+        aligned = align_graphemes(phonemes, obj.get("graphemes", "").split())
+        encoded["graphemes"] = [pad if g is None else token_to_id.get(g, unk) for g in aligned]
+    return encoded
+
+
+def encode_columns(data: List[Dict], token_to_id: Dict[str, int], fields: Sequence[str] = FIELDS
+                   ) -> Dict[str, List[List[int]]]:
+    """Encode JSONL records into dataset columns keyed like `PretokenizedDataset` items."""
+    columns = {ITEM_KEYS[f]: [] for f in fields}
+    for obj in data:
+        for f, ids in encode_example(obj, token_to_id, fields).items():
+            columns[ITEM_KEYS[f]].append(ids)
+    return columns
+
+
+def compile_jsonl(in_path: str, out_dir: str, token_to_id: Dict[str, int],
+                  fields: Sequence[str] = FIELDS, flush_tokens: int = 1 << 22) -> Dict:
+    """Encode every `fields` entry of `in_path` into flat memory‑mappable arrays."""
+    os.makedirs(out_dir, exist_ok=True)
+    dtype = token_dtype(len(token_to_id))
+    writers = {f: open(os.path.join(out_dir, f"{f}.bin"), "wb") for f in fields}
+    offsets: Dict[str, List[int]] = {f: [0] for f in fields}
+    buffers: Dict[str, List[int]] = {f: [] for f in fields}
+    try:
+        with open(in_path, encoding="utf-8") as f_in:
+            for line in f_in:
+                encoded = encode_example(json.loads(line), token_to_id, fields)
+                for f in fields:
+                    ids = encoded[f]
+                    buffers[f].extend(ids)
+                    offsets[f].append(offsets[f][-1] + len(ids))
+                    if len(buffers[f]) >= flush_tokens:
+                        np.asarray(buffers[f], dtype=dtype).tofile(writers[f])
+                        buffers[f] = []
+        for f in fields:
+            np.asarray(buffers[f], dtype=dtype).tofile(writers[f])
+    finally:
+        for w in writers.values():
+            w.close()
+    for f in fields:
+        np.save(os.path.join(out_dir, f"{f}.offsets.npy"), np.asarray(offsets[f], dtype=np.int64))
+    meta = {
+        "source": os.path.abspath(in_path),
+        "fields": list(fields),
+        "dtype": dtype.name,
+        "vocab_size": len(token_to_id),
+        "token_map_sha1": token_map_digest(token_to_id),
+        "num_sequences": len(offsets[fields[0]]) - 1,
+        "num_tokens": {f: offsets[f][-1] for f in fields},
+    }
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as f_meta:
+        json.dump(meta, f_meta, indent=2)
+    return meta
+
+
+class PretokenizedDataset(Dataset):
+    """Memory‑mapped view of a directory written by `compile_jsonl`.
+
+    Items are dicts with an `input_ids` list (the phoneme IDs) and, if the
+    directory has a `graphemes` field, a `grapheme_ids` list aligned with
+    it – the same columns `encode_columns` produces from JSONL.
+    """
+
+    def __init__(self, path: str, token_to_id: Dict[str, int] = None):
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if token_to_id is not None and self.meta["token_map_sha1"] != token_map_digest(token_to_id):
+            raise ValueError(f"{path} was compiled with a different token map; re-run pretokenize.py")
+        self.path = path
+        dtype = np.dtype(self.meta["dtype"])
+        self.tokens = {}
+        self.offsets = {}
+        for f in self.meta["fields"]:
+            bin_path = os.path.join(path, f"{f}.bin")
+            n_tokens = self.meta["num_tokens"][f]
+            # np.memmap cannot map an empty file
+            self.tokens[f] = (np.memmap(bin_path, dtype=dtype, mode="r") if n_tokens
+                              else np.empty(0, dtype=dtype))
+            self.offsets[f] = np.load(os.path.join(path, f"{f}.offsets.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return self.meta["num_sequences"]
+
+    def sequence(self, idx: int, field: str = "phonemes") -> np.ndarray:
+        offsets = self.offsets[field]
+        return self.tokens[field][offsets[idx]:offsets[idx + 1]]
+
+    def lengths(self, field: str = "phonemes") -> np.ndarray:
+        return np.diff(self.offsets[field])
+
+    def __getitem__(self, idx: int) -> Dict[str, List[int]]:
+        return {ITEM_KEYS[f]: self.sequence(idx, f).tolist() for f in self.meta["fields"]}
+
+
+def load_token_map(path: str) -> Dict[str, int]:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile phoneme JSONL into a memory-mapped token dataset.")
+    parser.add_argument("--input", type=str, required=True, help="Input JSONL file with phonemes/graphemes.")
+    parser.add_argument("--token_maps", type=str, required=True, help="Pickled token_to_id mapping.")
+    parser.add_argument("--output", type=str, required=True, help="Output directory for the compiled dataset.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    token_to_id = load_token_map(args.token_maps)
+    meta = compile_jsonl(args.input, args.output, token_to_id)
+    logging.info("Compiled %d sequences (%s tokens, %s) from %s to %s", meta["num_sequences"],
+                 meta["num_tokens"], meta["dtype"], args.input, args.output)
+
+
+if __name__ == "__main__":
+    main()
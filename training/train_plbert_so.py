@@ -3,11 +3,11 @@
 Train a Somali PL‑BERT model from scratch.  This script uses the HuggingFace
 Transformers library to instantiate an ALBERT configuration with a
 vocabulary based on the generated token map and trains it on masked
-language modelling (MLM).  Although the original PL‑BERT objective includes
-grapheme prediction (P2G)【657986872986870†L71-L80】, this simplified trainer focuses
-on the phoneme MLM component for clarity.  Implementing P2G would require
-customising the model head to jointly predict grapheme tokens for the
-masked positions, which can be added later.
+language modelling (MLM).  The original PL‑BERT objective also includes
+grapheme prediction (P2G)【657986872986870†L71-L80】; pass `--p2g` to train
+both objectives jointly (see `training/p2g.py`).  The P2G head shares the
+encoder forward pass with the MLM head, so it only adds a linear layer per
+step.
 
 Example usage:
 
@@ -17,6 +17,31 @@ Example usage:
       --token_maps phonemize/token_maps.pkl \
       --out_dir runs/plbert_so/from_scratch
 
+`--train` and `--dev` also accept directories compiled by
+`training/pretokenize.py`, which are memory‑mapped instead of being parsed
+and encoded on every launch.  Batches are grouped by length and padded
+only to the longest sequence in the batch (see `training/batching.py`);
+the padding ratio and tokens/sec are logged with the loss.  With
+`--packing`, consecutive sentences are instead packed into full `max_len`
+windows with a block‑diagonal attention mask (see `training/packing.py`),
+which removes nearly all padding on short‑sentence corpora.  Masking
+(`training/masking.py`) follows the 80/10/10 scheme, never selects special
+tokens or word separators, optionally masks whole words, and runs on the
+model's device.  The default `--engine lean` trains with the plain PyTorch
+loop in `training/lean_loop.py` (optional `--compile`, `--bf16` autocast,
+fused/foreach AdamW, `--grad_accum`, pinned‑memory prefetch), which writes
+step checkpoints as safetensors on a background thread and resumes
+bit‑exactly, data order included; `--engine trainer` uses the HuggingFace
+`Trainer` instead.
+
+For data‑parallel training on one machine, launch with `torchrun` (gloo
+backend on CPU, see `training/distributed.py`); each rank trains on its
+own share of the batches and only rank 0 writes checkpoints:
+
+    torchrun --standalone --nproc_per_node 4 training/train_plbert_so.py \
+      --engine lean --train data_plbert/train_tok --dev data_plbert/dev_tok \
+      --token_maps phonemize/token_maps.pkl --out_dir runs/plbert_so/from_scratch
+
 """
 import argparse
 import json
@@ -29,10 +54,17 @@ from typing import List, Dict
 import torch
 from datasets import Dataset
 from torch.utils.data import DataLoader
-from transformers import (AlbertConfig, AlbertForMaskedLM, Trainer,
-                          TrainingArguments)
+from transformers import AlbertConfig, AlbertForMaskedLM, TrainingArguments
 import random
 
+from batching import BucketedTrainer, CustomMLMDataCollator, log_padding_report, sequence_lengths
+from distributed import init_distributed
+from lean_loop import LeanArguments, LeanTrainer
+from metrics import make_step_callbacks
+from packing import PackedAlbertForMaskedLM, PackedDataset
+from p2g import AlbertForMLMAndP2G
+from pretokenize import PretokenizedDataset, encode_columns, is_pretokenized
+
 
 def load_jsonl(path: str) -> List[Dict]:
     with open(path, encoding="utf-8") as f:
@@ -49,18 +81,56 @@ def encode_data(data: List[Dict], token_to_id: Dict[str, int]) -> List[List[int]
     return encoded
 
 
+def load_split(path: str, token_to_id: Dict[str, int], p2g: bool = False):
+    """Memory‑map a pre‑tokenised directory, or encode a JSONL file into a Dataset."""
+    if is_pretokenized(path):
+        dataset = PretokenizedDataset(path, token_to_id)
+        if p2g and "graphemes" not in dataset.meta["fields"]:
+            raise ValueError(f"{path} has no graphemes field; re-run pretokenize.py to train with --p2g")
+        return dataset
+    if p2g:
+        return Dataset.from_dict(encode_columns(load_jsonl(path), token_to_id))
+    return Dataset.from_dict({"input_ids": encode_data(load_jsonl(path), token_to_id)})
+
+
 def main():
-    parser = argparse.ArgumentParser(description="Train PL‑BERT from scratch (phoneme MLM only).")
-    parser.add_argument("--train", type=str, required=True, help="Path to training JSONL file.")
-    parser.add_argument("--dev", type=str, required=True, help="Path to dev JSONL file.")
+    parser = argparse.ArgumentParser(description="Train PL‑BERT from scratch (phoneme MLM, optionally + P2G).")
+    parser.add_argument("--train", type=str, required=True, help="Path to training JSONL file or pre-tokenised directory.")
+    parser.add_argument("--dev", type=str, required=True, help="Path to dev JSONL file or pre-tokenised directory.")
     parser.add_argument("--token_maps", type=str, required=True, help="Pickled token_to_id mapping.")
     parser.add_argument("--out_dir", type=str, required=True, help="Output directory for checkpoints.")
     parser.add_argument("--epochs", type=int, default=3, help="Number of training epochs.")
     parser.add_argument("--batch_size", type=int, default=64, help="Batch size per device.")
     parser.add_argument("--max_len", type=int, default=256, help="Maximum sequence length.")
     parser.add_argument("--lr", type=float, default=5e-5, help="Learning rate.")
+    parser.add_argument("--mlm_probability", type=float, default=0.15, help="Fraction of tokens to predict.")
+    parser.add_argument("--whole_word_mask", action="store_true", help="Mask whole '_'-delimited words.")
+    parser.add_argument("--p2g", action="store_true", help="Add the phoneme-to-grapheme objective.")
+    parser.add_argument("--p2g_weight", type=float, default=1.0, help="Weight of the P2G loss.")
+    parser.add_argument("--engine", choices=["trainer", "lean"], default="lean",
+                        help="HuggingFace Trainer or the lean PyTorch loop in lean_loop.py.")
+    parser.add_argument("--grad_accum", type=int, default=1, help="Gradient accumulation steps.")
+    parser.add_argument("--bf16", action="store_true", help="bf16 autocast (CPU or GPU).")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the model (lean engine only).")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="torch threads per process (default: cores divided between local ranks under torchrun).")
+    parser.add_argument("--packing", action="store_true",
+                        help="Pack consecutive sentences into full max_len windows (block-diagonal attention).")
+    parser.add_argument("--logging_steps", type=int, default=100, help="Log every N optimisation steps.")
+    parser.add_argument("--metrics_file", type=str, default=None,
+                        help="JSONL file for every log record (default: <out_dir>/metrics.jsonl).")
+    parser.add_argument("--metrics_window", type=int, default=100,
+                        help="Steps averaged for the logged throughput and timing metrics.")
+    parser.add_argument("--profile_steps", type=int, default=0,
+                        help="Record N steps with torch.profiler and write a Chrome trace to <out_dir>/profile.")
+    parser.add_argument("--profile_start", type=int, default=10, help="Step after which profiling starts.")
+    parser.add_argument("--save_steps", type=int, default=500,
+                        help="Checkpoint every N optimisation steps (0 = at the end of every epoch).")
+    parser.add_argument("--resume", nargs="?", const=True, default=None,
+                        help="Resume from a checkpoint directory (without a value: the latest in --out_dir).")
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
+    dist_info = init_distributed(args.threads)
 
     # Load vocabulary
     with open(args.token_maps, "rb") as f:
@@ -69,15 +139,9 @@ def main():
     logging.info("Loaded vocabulary of size %d", vocab_size)
 
     # Load data
-    train_data = load_jsonl(args.train)
-    dev_data = load_jsonl(args.dev)
-    train_enc = encode_data(train_data, token_to_id)
-    dev_enc = encode_data(dev_data, token_to_id)
-    logging.info("Loaded %d train and %d dev examples", len(train_enc), len(dev_enc))
-
-    # Wrap in HuggingFace Dataset
-    train_ds = Dataset.from_dict({"input_ids": train_enc})
-    dev_ds = Dataset.from_dict({"input_ids": dev_enc})
+    train_ds = load_split(args.train, token_to_id, p2g=args.p2g)
+    dev_ds = load_split(args.dev, token_to_id, p2g=args.p2g)
+    logging.info("Loaded %d train and %d dev examples", len(train_ds), len(dev_ds))
 
     # Define config
     config = AlbertConfig(
@@ -93,91 +157,90 @@ def main():
         bos_token_id=None,
         eos_token_id=None,
     )
-    model = AlbertForMaskedLM(config)
-
-    # Custom data collator for masked LM
-    class CustomMLMDataCollator:
-        def __init__(self, token_to_id, mlm_probability=0.15, max_length=256):
-            self.token_to_id = token_to_id
-            self.mlm_probability = mlm_probability
-            self.max_length = max_length
-            self.pad_token_id = token_to_id["<pad>"]
-            self.mask_token_id = token_to_id["<mask>"]
-
-        def __call__(self, examples):
-            # Pad sequences
-            batch_size = len(examples)
-            padded_inputs = []
-            attention_masks = []
-
-            for example in examples:
-                input_ids = example["input_ids"][:self.max_length]
-                padding_length = self.max_length - len(input_ids)
-
-                padded_input = input_ids + [self.pad_token_id] * padding_length
-                attention_mask = [1] * len(input_ids) + [0] * padding_length
-
-                padded_inputs.append(padded_input)
-                attention_masks.append(attention_mask)
-
-            # Convert to tensors
-            input_ids = torch.tensor(padded_inputs, dtype=torch.long)
-            attention_mask = torch.tensor(attention_masks, dtype=torch.long)
-
-            # Create labels (copy of input_ids)
-            labels = input_ids.clone()
-
-            # Apply masking
-            probability_matrix = torch.full(input_ids.shape, self.mlm_probability)
-            # Don't mask padding tokens
-            probability_matrix.masked_fill_(input_ids == self.pad_token_id, value=0.0)
-
-            masked_indices = torch.bernoulli(probability_matrix).bool()
-            labels[~masked_indices] = -100  # Only compute loss on masked tokens
-
-            # Replace masked positions with mask token
-            input_ids[masked_indices] = self.mask_token_id
-
-            return {
-                "input_ids": input_ids,
-                "attention_mask": attention_mask,
-                "labels": labels,
-            }
-
+    if args.p2g:
+        model = AlbertForMLMAndP2G(config, p2g_weight=args.p2g_weight)
+    elif args.packing:
+        model = PackedAlbertForMaskedLM(config)
+    else:
+        model = AlbertForMaskedLM(config)
+
+    # The collator only pads; BucketedTrainer masks each batch on the model's device
     data_collator = CustomMLMDataCollator(
         token_to_id=token_to_id,
-        mlm_probability=0.15,
-        max_length=args.max_len
+        mlm_probability=args.mlm_probability,
+        max_length=args.max_len,
+        whole_word_mask=args.whole_word_mask,
+        apply_mask=False,
+        p2g=args.p2g,
     )
 
     # Prepare training arguments
     os.makedirs(args.out_dir, exist_ok=True)
-    training_args = TrainingArguments(
-        output_dir=args.out_dir,
-        overwrite_output_dir=True,
-        evaluation_strategy="epoch",
-        save_strategy="epoch",
-        num_train_epochs=args.epochs,
-        per_device_train_batch_size=args.batch_size,
-        per_device_eval_batch_size=args.batch_size,
-        learning_rate=args.lr,
-        logging_steps=100,
-        save_total_limit=2,
-        fp16=False,  # Disable FP16 due to GPU compatibility issues
-        no_cuda=not torch.cuda.is_available(),  # Use CPU if CUDA not available
-        remove_unused_columns=False,  # Keep all columns in dataset
-    )
+    if args.engine == "lean":
+        training_args = LeanArguments(
+            output_dir=args.out_dir,
+            num_train_epochs=args.epochs,
+            per_device_train_batch_size=args.batch_size,
+            per_device_eval_batch_size=args.batch_size,
+            learning_rate=args.lr,
+            gradient_accumulation_steps=args.grad_accum,
+            logging_steps=args.logging_steps,
+            bf16=args.bf16,
+            compile=args.compile,
+            save_strategy="steps" if args.save_steps else "epoch",
+            save_steps=args.save_steps,
+        )
+    else:
+        training_args = TrainingArguments(
+            output_dir=args.out_dir,
+            overwrite_output_dir=True,
+            evaluation_strategy="epoch",
+            save_strategy="steps" if args.save_steps else "epoch",
+            save_steps=args.save_steps or 500,
+            num_train_epochs=args.epochs,
+            per_device_train_batch_size=args.batch_size,
+            per_device_eval_batch_size=args.batch_size,
+            learning_rate=args.lr,
+            logging_steps=args.logging_steps,
+            save_total_limit=2,
+            fp16=False,  # Disable FP16 due to GPU compatibility issues
+            bf16=args.bf16,
+            gradient_accumulation_steps=args.grad_accum,
+            no_cuda=not torch.cuda.is_available(),  # Use CPU if CUDA not available
+            remove_unused_columns=False,  # Keep all columns in dataset
+            prediction_loss_only=True,  # Eval only needs the loss, not gathered logits
+            ddp_backend="gloo" if dist_info.enabled and not torch.cuda.is_available() else None,
+        )
+
+    if args.packing:
+        n_sentences = len(train_ds)
+        train_ds = PackedDataset(train_ds, args.max_len, separator_id=token_to_id["_"])
+        logging.info("Packed %d sentences into %d windows of %d tokens", n_sentences, len(train_ds), args.max_len)
+
+    # Batches are grouped by length and padded only to their longest sequence
+    train_lengths = sequence_lengths(train_ds)
+    log_padding_report(train_lengths, args.batch_size, args.max_len, seed=training_args.seed)
 
     # Trainer
-    trainer = Trainer(
+    if args.engine == "lean":
+        trainer_cls, extra = LeanTrainer, {"dist_info": dist_info}
+    else:
+        # Trainer shards the batches across ranks itself (through accelerate)
+        trainer_cls, extra = BucketedTrainer, {}
+    trainer = trainer_cls(
         model=model,
         args=training_args,
         train_dataset=train_ds,
         eval_dataset=dev_ds,
         data_collator=data_collator,
+        train_lengths=train_lengths,
+        masker=data_collator.masker,
+        step_callbacks=make_step_callbacks(args.out_dir, args.metrics_file, args.metrics_window,
+                                           args.profile_steps, args.profile_start, rank=dist_info.rank),
+        **extra,
     )
 
-    trainer.train()
+    trainer.train(resume_from_checkpoint=args.resume)
     trainer.save_model(args.out_dir)
     logging.info("Training complete. Model saved to %s", args.out_dir)
 